@@ -0,0 +1,45 @@
+"""
+    Helpers for the batched CAN frame messages published on `can.frame.<MessageName>`.
+
+    A frame message carries every decoded signal of one CAN frame (or the latest
+    values seen during a publish window) in a single payload, encoded with the
+    codec of the `can.frame` subject family (JSON by default):
+
+        {"ts": <timestamp>, "signals": {"<SignalName>": <value>, ...}}
+
+    Consumers that work with the per-signal view (`can.data.<SignalName>`) can use
+    `fan_out_frame` to derive it from a frame message.
+"""
+import json
+from typing import Iterator, Tuple
+
+FRAME_SUBJECT_PREFIX = "can.frame"
+SIGNAL_SUBJECT_PREFIX = "can.data"
+
+
+def frame_subject(message_name: str) -> str:
+    """Returns the subject used to publish the frame of a DBC message."""
+    return f"{FRAME_SUBJECT_PREFIX}.{message_name}"
+
+
+def signal_subject(signal_name: str) -> str:
+    """Returns the per-signal subject of a decoded CAN signal."""
+    return f"{SIGNAL_SUBJECT_PREFIX}.{signal_name}"
+
+
+def make_frame(signals: dict, timestamp: float) -> dict:
+    """Builds the frame message of the signals of a frame."""
+    return {"ts": timestamp, "signals": signals}
+
+
+def fan_out_frame(payload: bytes | dict) -> Iterator[Tuple[str, float, float]]:
+    """
+    Splits a frame message into its individual signals.
+
+    :param payload: The raw JSON frame message payload, or an already decoded frame.
+    :return: An iterator of (`can.data.<SignalName>` subject, value, timestamp) tuples.
+    """
+    frame = json.loads(payload) if isinstance(payload, (bytes, bytearray, str)) else payload
+    timestamp = frame.get("ts")
+    for name, value in frame.get("signals", {}).items():
+        yield signal_subject(name), value, timestamp
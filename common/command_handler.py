@@ -41,7 +41,9 @@ class CommandHandler:
             if reply:
                 args["reply"] = reply
 
-            self.logger.info(f"Executing command '{command}' with args: {args}")
+            # Arguments can be large (settings, triggers), they are only logged in DEBUG
+            self.logger.info("Executing command '%s'", command)
+            self.logger.debug("Arguments of command '%s': %s", command, args)
             await handler(**args)
 
         except json.JSONDecodeError:
@@ -1,42 +1,114 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 
-def setup_logging(service_name: str, log_level: int = logging.INFO):
+# Default size of a log file before it is rotated, and number of rotated files kept
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# Environment variable overriding the directory of the log files, e.g. a temporary directory for the tests
+LOG_DIR_ENV = "LOG_DIR"
+
+# Listener of each service logger, writing its records to the file and the console
+_listeners: dict[str, logging.handlers.QueueListener] = {}
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues the records without formatting them: only the message arguments are
+    merged (they could change before the listener thread handles the record),
+    the timestamp and the layout are formatted by the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold references to frames, format them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def log_directory() -> str:
+    """The directory of the log files: `logs/`, or the `LOG_DIR` environment variable."""
+    return os.path.abspath(os.environ.get(LOG_DIR_ENV, "logs"))
+
+
+def setup_logging(service_name: str, log_level: int = logging.INFO,
+                  max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT):
     """
     Configures logging for a microservice.
 
     This sets up a logger that writes to both a file in the `logs/` directory
-    and to the console.
+    (see `log_directory`) and to the console. The logger only queues its records, a listener thread
+    writes them, so that logging doesn't block the event loop on disk or
+    console writes. The file is rotated when it reaches `max_bytes`, and at each
+    start of the service.
 
     :param service_name: The name of the service, used for the log file name.
     :param log_level: The logging level (e.g., logging.INFO).
+    :param max_bytes: The size of the log file before it is rotated.
+    :param backup_count: The number of rotated log files kept.
     """
-    # Use an absolute path for the logs directory to be safe
-    log_dir = os.path.abspath("logs")
+    log_dir = log_directory()
     os.makedirs(log_dir, exist_ok=True)
 
     logger = logging.getLogger(service_name)
     logger.setLevel(log_level)
     logger.propagate = False
 
+    # Add handlers to the logger, but only if they haven't been added before
+    if logger.handlers:
+        return logger
+
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
 
-    # Create a file handler
-    file_handler = logging.FileHandler(os.path.join(log_dir, f"{service_name}.log"), mode='w')
-    file_handler.setLevel(log_level)
+    # Create a rotating file handler, starting a new file for this run
+    log_path = os.path.join(log_dir, f"{service_name}.log")
+    file_handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count)
+    if os.path.getsize(log_path) > 0:
+        file_handler.doRollover()
     file_handler.setFormatter(formatter)
 
     # Create a console handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(log_level)
     console_handler.setFormatter(formatter)
 
-    # Add handlers to the logger, but only if they haven't been added before
-    if not logger.handlers:
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+    # The level is only checked by the logger, so that `set_log_level` applies to all handlers
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, file_handler, console_handler)
+    listener.start()
+    _listeners[service_name] = listener
+    logger.addHandler(_LazyQueueHandler(records))
 
     return logger
+
+
+def set_log_level(service_name: str, level: int | str) -> int:
+    """
+    Changes the level of a service logger at runtime. Accepts a level number or
+    name ("DEBUG", "INFO"...). Returns the new level.
+    """
+    if isinstance(level, str):
+        level_number = logging.getLevelName(level.upper())
+        if not isinstance(level_number, int):
+            raise ValueError(f"Unknown log level '{level}'")
+        level = level_number
+    logging.getLogger(service_name).setLevel(level)
+    return level
+
+
+def stop_logging():
+    """Writes the queued records and stops the listener threads, e.g. before the process exits."""
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+
+
+atexit.register(stop_logging)
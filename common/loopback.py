@@ -0,0 +1,194 @@
+"""
+    In-process implementation of the messaging client, for tests, benchmarks
+    and services running in the same process.
+"""
+import asyncio
+import itertools
+from typing import Callable, Awaitable
+
+from nats.aio.msg import Msg
+from nats.errors import NoRespondersError, TimeoutError as NatsTimeoutError
+
+from common.messaging import MessagingClient
+from common.metrics import MessageMetrics
+
+INBOX_PREFIX = "_INBOX"
+
+
+def subject_matches(pattern: str, subject: str) -> bool:
+    """
+    Matches a subject against a NATS subscription subject: `*` matches exactly
+    one token and a trailing `>` matches one or more tokens.
+    """
+    pattern_tokens = pattern.split(".")
+    subject_tokens = subject.split(".")
+    for i, token in enumerate(pattern_tokens):
+        if token == ">":
+            return len(subject_tokens) > i
+        if i >= len(subject_tokens):
+            return False
+        if token != "*" and token != subject_tokens[i]:
+            return False
+    return len(pattern_tokens) == len(subject_tokens)
+
+
+class LoopbackSubscription:
+    """
+    A subscription of the loopback bus. Like with NATS, its messages are
+    delivered in order by a dedicated task, never from the publisher's call.
+    """
+
+    def __init__(self, bus: "LoopbackBus", client: "LoopbackMessagingClient", subject: str,
+                 cb: Callable[[Msg], Awaitable[None]], queue: str = ""):
+        self.bus = bus
+        self.client = client
+        self.subject = subject
+        self.queue = queue
+        self._cb = cb
+        self._messages: asyncio.Queue[Msg] = asyncio.Queue()
+        self._task = asyncio.create_task(self._deliver())
+        self.delivered = 0
+
+    @property
+    def pending_msgs(self) -> int:
+        return self._messages.qsize()
+
+    async def _deliver(self):
+        while True:
+            msg = await self._messages.get()
+            try:
+                await self._cb(msg)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Like nats-py, an error in a callback doesn't stop the subscription
+                self.bus.errors.append(e)
+            finally:
+                self.delivered += 1
+                self.bus._done(1)
+
+    async def unsubscribe(self):
+        self.bus._remove(self)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        # Messages that will never be delivered
+        self.bus._done(self._messages.qsize())
+
+
+class LoopbackBus:
+    """
+    An in-memory message broker with the NATS semantics used by the services:
+    `*` and `>` wildcards, queue groups (one member of each group receives a
+    message, in turn), headers and request/reply through inboxes.
+    """
+
+    def __init__(self):
+        self._subscriptions: list[LoopbackSubscription] = []
+        # Subject -> (plain subscriptions, {queue group: members}), reset on (un)subscribe
+        self._routes: dict[str, tuple[list[LoopbackSubscription], dict[str, list[LoopbackSubscription]]]] = {}
+        self._queue_turns: dict[str, itertools.count] = {}
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.errors: list[Exception] = []
+
+    def _add(self, subscription: LoopbackSubscription):
+        self._subscriptions.append(subscription)
+        self._routes.clear()
+
+    def _remove(self, subscription: LoopbackSubscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            self._routes.clear()
+
+    def _done(self, count: int):
+        self._in_flight -= count
+        if self._in_flight <= 0:
+            self._in_flight = 0
+            self._idle.set()
+
+    def _route(self, subject: str):
+        route = self._routes.get(subject)
+        if route is None:
+            plain, groups = [], {}
+            for subscription in self._subscriptions:
+                if subject_matches(subscription.subject, subject):
+                    if subscription.queue:
+                        groups.setdefault(subscription.queue, []).append(subscription)
+                    else:
+                        plain.append(subscription)
+            route = self._routes[subject] = (plain, groups)
+        return route
+
+    def publish(self, subject: str, payload: bytes, headers: dict[str, str] | None = None, reply: str = "") -> int:
+        """Queues a message for all the matching subscriptions. Returns the number of receivers."""
+        plain, groups = self._route(subject)
+        receivers = list(plain)
+        for group, members in groups.items():
+            turn = self._queue_turns.setdefault(group, itertools.count())
+            receivers.append(members[next(turn) % len(members)])
+        if receivers:
+            self._in_flight += len(receivers)
+            self._idle.clear()
+        for subscription in receivers:
+            msg = Msg(_client=subscription.client, subject=subject, reply=reply, data=payload, headers=headers)
+            subscription._messages.put_nowait(msg)
+        return len(receivers)
+
+    async def wait_idle(self):
+        """Waits until every published message has been handled, including the ones published by the handlers."""
+        await self._idle.wait()
+
+
+class LoopbackMessagingClient(MessagingClient):
+    """
+    A messaging client connected to an in-process `LoopbackBus` instead of a
+    NATS server. Clients of the same bus see each other's messages; without
+    a bus, the client gets a private one.
+    """
+
+    def __init__(self, bus: LoopbackBus | None = None):
+        self.bus = bus or LoopbackBus()
+        self.is_connected = False
+        self._subscriptions: list[LoopbackSubscription] = []
+        self._inbox_ids = itertools.count()
+        self.metrics = MessageMetrics()
+
+    async def connect(self, servers: list[str] | str, **options):
+        self.is_connected = True
+
+    async def disconnect(self):
+        for subscription in list(self._subscriptions):
+            await subscription.unsubscribe()
+        self._subscriptions.clear()
+        self.is_connected = False
+
+    async def publish(self, subject: str, payload: bytes, headers: dict[str, str] | None = None):
+        self.bus.publish(subject, payload, headers)
+        self.metrics.record_publish(subject, len(payload))
+
+    async def subscribe(self, subject: str, cb: Callable[[Msg], Awaitable[None]], queue: str = "") -> LoopbackSubscription:
+        subscription = LoopbackSubscription(self.bus, self, subject, self.metrics.instrument(cb), queue)
+        self.bus._add(subscription)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    async def request(self, subject: str, payload: bytes, timeout: float = 1.0) -> Msg:
+        inbox = f"{INBOX_PREFIX}.{id(self):x}.{next(self._inbox_ids)}"
+        response = asyncio.get_running_loop().create_future()
+
+        async def on_response(msg: Msg):
+            if not response.done():
+                response.set_result(msg)
+
+        subscription = LoopbackSubscription(self.bus, self, inbox, on_response)
+        self.bus._add(subscription)
+        self.metrics.record_publish(subject, len(payload))
+        try:
+            if not self.bus.publish(subject, payload, reply=inbox):
+                raise NoRespondersError
+            return await asyncio.wait_for(response, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise NatsTimeoutError
+        finally:
+            await subscription.unsubscribe()
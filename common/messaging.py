@@ -1,18 +1,194 @@
 import asyncio
+import json
+import struct
 from abc import ABC, abstractmethod
-from typing import Callable, Awaitable
+from typing import Callable, Awaitable, Any, Iterable
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 import nats
 from nats.aio.client import Client as NATS
 from nats.aio.msg import Msg
 from nats.aio.subscription import Subscription
 
+from common.metrics import MessageMetrics
+
+# Header announcing the codec of a payload. Payloads without it are JSON.
+CODEC_HEADER = "Content-Type"
+
+
+class Codec(ABC):
+    """
+    An abstract base class for a payload codec.
+    """
+    name: str
+    content_type: str
+
+    @abstractmethod
+    def encode(self, obj: Any) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Any:
+        pass
+
+    def encode_value(self, value: Any, timestamp: float) -> bytes:
+        """Encodes a standard `{"value": ..., "ts": ...}` data point."""
+        return self.encode({"value": value, "ts": timestamp})
+
+    def decode_value(self, data: bytes) -> tuple[Any, float | None]:
+        """Decodes a data point into a (value, timestamp) pair. Bare values have no timestamp."""
+        obj = self.decode(data)
+        if isinstance(obj, dict):
+            return obj["value"], obj.get("ts")
+        return obj, None
+
+
+class JsonCodec(Codec):
+    name = "json"
+    content_type = "application/json"
+
+    def encode(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class Float64Codec(Codec):
+    """
+    Fixed-layout binary codec for numeric data points: the value and the
+    timestamp as two little-endian float64 (16 bytes).
+    """
+    name = "f64"
+    content_type = "application/x-f64-value"
+    _struct = struct.Struct("<dd")
+
+    def encode(self, obj: dict) -> bytes:
+        return self.encode_value(obj["value"], obj.get("ts"))
+
+    def decode(self, data: bytes) -> dict:
+        value, timestamp = self._struct.unpack(data)
+        return {"value": value, "ts": timestamp}
+
+    def encode_value(self, value: Any, timestamp: float) -> bytes:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(f"The f64 codec only encodes numbers, not {type(value).__name__}")
+        return self._struct.pack(value, timestamp if timestamp is not None else float("nan"))
+
+    def decode_value(self, data: bytes) -> tuple[float, float | None]:
+        value, timestamp = self._struct.unpack(data)
+        return value, None if timestamp != timestamp else timestamp
+
+
+class MsgpackCodec(Codec):
+    """MessagePack codec for structured payloads. Requires the optional `msgpack` package."""
+    name = "msgpack"
+    content_type = "application/msgpack"
+
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj)
+
+    def decode(self, data: bytes) -> Any:
+        if msgpack is None:
+            raise ValueError("Decoding a msgpack payload requires the msgpack package")
+        return msgpack.unpackb(data)
+
+
+JSON_CODEC = JsonCodec()
+CODECS: dict[str, Codec] = {codec.name: codec for codec in (JSON_CODEC, Float64Codec(), MsgpackCodec())}
+CODECS_BY_CONTENT_TYPE: dict[str, Codec] = {codec.content_type: codec for codec in CODECS.values()}
+
+
+def codec_of(msg: Msg) -> Codec:
+    """Returns the codec announced in the headers of a message (JSON when there is none)."""
+    headers = getattr(msg, "headers", None)
+    if headers:
+        return CODECS_BY_CONTENT_TYPE.get(headers.get(CODEC_HEADER), JSON_CODEC)
+    return JSON_CODEC
+
+
+def decode_payload(msg: Msg) -> Any:
+    """Decodes the payload of a message with the codec announced in its headers."""
+    return codec_of(msg).decode(msg.data)
+
+
+def decode_value(msg: Msg) -> tuple[Any, float | None]:
+    """Decodes a data point message into a (value, timestamp) pair."""
+    return codec_of(msg).decode_value(msg.data)
+
+
+class CodecRegistry:
+    """
+    Selects the codec of each subject family.
+
+    The mapping comes from the `codecs` block of the global settings, e.g.
+    `{"can.data": "f64", "can.frame": "msgpack"}`, and is matched against
+    the longest subject prefix. Subjects without a codec use JSON.
+    JSON payloads are published without a codec header, so their wire
+    format is unchanged for consumers that don't know about codecs.
+    """
+
+    def __init__(self, mapping: dict[str, str] | None = None):
+        self._families: dict[str, Codec] = {}
+        self._cache: dict[str, Codec] = {}
+        self.configure(mapping or {})
+
+    def configure(self, mapping: dict[str, str]):
+        families = {}
+        for family, name in mapping.items():
+            codec = CODECS.get(name)
+            if codec is None:
+                raise ValueError(f"Unknown codec '{name}' for subject family '{family}'")
+            if codec is CODECS["msgpack"] and msgpack is None:
+                raise ValueError(f"The msgpack codec of subject family '{family}' requires the msgpack package")
+            families[family] = codec
+        self._families = families
+        self._cache = {}
+
+    def codec_for(self, subject: str) -> Codec:
+        codec = self._cache.get(subject)
+        if codec is None:
+            codec = JSON_CODEC
+            tokens = subject.split(".")
+            for i in range(len(tokens), 0, -1):
+                family_codec = self._families.get(".".join(tokens[:i]))
+                if family_codec:
+                    codec = family_codec
+                    break
+            self._cache[subject] = codec
+        return codec
+
+    @staticmethod
+    def headers_of(codec: Codec) -> dict[str, str] | None:
+        return None if codec is JSON_CODEC else {CODEC_HEADER: codec.content_type}
+
+    def encode(self, subject: str, obj: Any) -> tuple[bytes, dict[str, str] | None]:
+        """Encodes a structured payload, returning the payload and its headers."""
+        codec = self.codec_for(subject)
+        return codec.encode(obj), self.headers_of(codec)
+
+    def encode_value(self, subject: str, value: Any, timestamp: float) -> tuple[bytes, dict[str, str] | None]:
+        """
+        Encodes a data point, returning the payload and its headers. Values the
+        codec of the subject can't encode (e.g. strings with f64) fall back to JSON.
+        """
+        codec = self.codec_for(subject)
+        try:
+            return codec.encode_value(value, timestamp), self.headers_of(codec)
+        except TypeError:
+            return JSON_CODEC.encode_value(value, timestamp), None
+
+
 class MessagingClient(ABC):
     """
     An abstract base class for a messaging client.
     """
     @abstractmethod
-    async def connect(self, servers: list[str] | str):
+    async def connect(self, servers: list[str] | str, **options):
         pass
 
     @abstractmethod
@@ -20,7 +196,7 @@ class MessagingClient(ABC):
         pass
 
     @abstractmethod
-    async def publish(self, subject: str, payload: bytes):
+    async def publish(self, subject: str, payload: bytes, headers: dict[str, str] | None = None):
         pass
 
     @abstractmethod
@@ -31,17 +207,34 @@ class MessagingClient(ABC):
     async def request(self, subject: str, payload: bytes, timeout: float = 1.0) -> Msg:
         pass
 
+    async def publish_many(self, messages: Iterable[tuple[str, bytes, dict[str, str] | None]]):
+        """Publishes (subject, payload, headers) tuples. Implementations may coalesce them into a single write."""
+        for subject, payload, headers in messages:
+            await self.publish(subject, payload, headers=headers)
+
+    async def flush(self, timeout: float = 1.0):
+        """Waits until everything published so far has reached the server."""
+        pass
+
 class NatsMessagingClient(MessagingClient):
     """
     A messaging client implementation for NATS.
     """
+    # Options of the `nats_client` global settings block passed to `nats.connect`
+    CONNECT_OPTIONS = (
+        "pending_size", "flush_timeout", "flusher_queue_size",
+        "connect_timeout", "allow_reconnect", "reconnect_time_wait", "max_reconnect_attempts",
+        "ping_interval", "max_outstanding_pings",
+    )
+
     def __init__(self):
         self.nc: NATS | None = None
+        self.metrics = MessageMetrics()
 
-    async def connect(self, servers: list[str] | str):
+    async def connect(self, servers: list[str] | str, **options):
         if not self.nc or not self.nc.is_connected:
             try:
-                self.nc = await nats.connect(servers)
+                self.nc = await nats.connect(servers, **options)
             except Exception as e:
                 # This will be caught by the service's logger
                 raise
@@ -50,11 +243,84 @@ class NatsMessagingClient(MessagingClient):
         if self.nc and self.nc.is_connected:
             await self.nc.close()
 
-    async def publish(self, subject: str, payload: bytes):
-        await self.nc.publish(subject, payload)
+    async def publish(self, subject: str, payload: bytes, headers: dict[str, str] | None = None):
+        await self.nc.publish(subject, payload, headers=headers)
+        self.metrics.record_publish(subject, len(payload))
+
+    async def flush(self, timeout: float = 1.0):
+        await self.nc.flush(timeout=timeout)
 
     async def subscribe(self, subject: str, cb: Callable[[Msg], Awaitable[None]], queue: str = "") -> Subscription:
-        return await self.nc.subscribe(subject, cb=cb, queue=queue)
+        return await self.nc.subscribe(subject, cb=self.metrics.instrument(cb), queue=queue)
 
     async def request(self, subject: str, payload: bytes, timeout: float = 1.0) -> Msg:
+        self.metrics.record_publish(subject, len(payload))
         return await self.nc.request(subject, payload, timeout=timeout)
+
+
+class PublishBatch:
+    """
+    Accumulates publications and hands them to the messaging client in a single
+    `publish_many` call, instead of awaiting one publish per message.
+
+    Use it as an async context manager: the batch is flushed when its payloads
+    reach `max_bytes`, every `flush_interval` seconds while it is open (0
+    disables the timer) and when the block exits without an error.
+
+        async with PublishBatch(client, codecs) as batch:
+            for name, value in values.items():
+                await batch.publish_value(f"sensors.{name}", value, timestamp)
+    """
+
+    def __init__(self, client: MessagingClient, codecs: CodecRegistry | None = None,
+                 max_bytes: int = 65536, flush_interval: float = 0.0):
+        self.client = client
+        self.codecs = codecs or CodecRegistry()
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._messages: list[tuple[str, bytes, dict[str, str] | None]] = []
+        self._pending_bytes = 0
+        self._timer_task: asyncio.Task | None = None
+
+    def __len__(self):
+        return len(self._messages)
+
+    async def publish(self, subject: str, payload: bytes, headers: dict[str, str] | None = None):
+        self._messages.append((subject, payload, headers))
+        self._pending_bytes += len(payload)
+        if self.max_bytes and self._pending_bytes >= self.max_bytes:
+            await self.flush()
+
+    async def publish_value(self, subject: str, value: Any, timestamp: float):
+        """Queues a data point encoded with the codec of the subject family."""
+        await self.publish(subject, *self.codecs.encode_value(subject, value, timestamp))
+
+    async def publish_object(self, subject: str, obj: Any):
+        """Queues a structured payload encoded with the codec of the subject family."""
+        await self.publish(subject, *self.codecs.encode(subject, obj))
+
+    async def flush(self):
+        """Publishes the queued messages."""
+        if not self._messages:
+            return
+        messages, self._messages = self._messages, []
+        self._pending_bytes = 0
+        await self.client.publish_many(messages)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def __aenter__(self) -> "PublishBatch":
+        if self.flush_interval > 0:
+            self._timer_task = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._timer_task:
+            self._timer_task.cancel()
+            await asyncio.gather(self._timer_task, return_exceptions=True)
+            self._timer_task = None
+        if exc_type is None:
+            await self.flush()
@@ -0,0 +1,115 @@
+"""
+    Message throughput and handler latency metrics of a messaging client.
+
+    Messages are counted per subject family, the first two tokens of their
+    subject (`can.data.EngineSpeed` -> `can.data`), so that the metrics stay
+    small whatever the number of signals. Recording a message only increments
+    preallocated counters.
+"""
+import time
+from bisect import bisect_left
+from typing import Awaitable, Callable
+
+from nats.aio.msg import Msg
+
+# Upper bounds of the handler latency histogram buckets, in milliseconds. The
+# last bucket counts the handlers slower than the last bound.
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+# The subject -> family cache is reset beyond this size (e.g. request inboxes)
+MAX_CACHED_SUBJECTS = 4096
+
+
+def subject_family(subject: str, depth: int = 2) -> str:
+    """Returns the first `depth` tokens of a subject."""
+    return ".".join(subject.split(".", depth)[:depth])
+
+
+class SubjectStats:
+    """Counters of a subject family."""
+    __slots__ = ("published", "published_bytes", "received", "received_bytes", "errors", "handler_seconds", "histogram")
+
+    def __init__(self):
+        self.published = 0
+        self.published_bytes = 0
+        self.received = 0
+        self.received_bytes = 0
+        self.errors = 0
+        self.handler_seconds = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def to_dict(self, elapsed: float) -> dict:
+        return {
+            "published": self.published,
+            "published_bytes": self.published_bytes,
+            "received": self.received,
+            "received_bytes": self.received_bytes,
+            "errors": self.errors,
+            "published_per_s": round(self.published / elapsed, 2) if elapsed else 0.0,
+            "received_per_s": round(self.received / elapsed, 2) if elapsed else 0.0,
+            "handler_avg_ms": round(self.handler_seconds * 1000 / self.received, 4) if self.received else None,
+            "handler_histogram": list(self.histogram),
+        }
+
+
+class MessageMetrics:
+    """Per subject family counters of the messages published and received by a client."""
+
+    def __init__(self, depth: int = 2):
+        self.depth = depth
+        self.started_at = time.monotonic()
+        self._families: dict[str, SubjectStats] = {}
+        self._subjects: dict[str, SubjectStats] = {}
+
+    def stats_for(self, subject: str) -> SubjectStats:
+        stats = self._subjects.get(subject)
+        if stats is None:
+            family = subject_family(subject, self.depth)
+            stats = self._families.get(family)
+            if stats is None:
+                stats = self._families[family] = SubjectStats()
+            if len(self._subjects) >= MAX_CACHED_SUBJECTS:
+                self._subjects.clear()
+            self._subjects[subject] = stats
+        return stats
+
+    def record_publish(self, subject: str, size: int):
+        stats = self.stats_for(subject)
+        stats.published += 1
+        stats.published_bytes += size
+
+    def record_received(self, subject: str, size: int, seconds: float, failed: bool = False):
+        stats = self.stats_for(subject)
+        stats.received += 1
+        stats.received_bytes += size
+        stats.handler_seconds += seconds
+        stats.histogram[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+        if failed:
+            stats.errors += 1
+
+    def instrument(self, cb: Callable[[Msg], Awaitable[None]]) -> Callable[[Msg], Awaitable[None]]:
+        """Wraps a subscription callback to count its messages and time their handling."""
+        async def handler(msg: Msg):
+            start = time.perf_counter()
+            failed = True
+            try:
+                await cb(msg)
+                failed = False
+            finally:
+                self.record_received(msg.subject, len(msg.data), time.perf_counter() - start, failed)
+
+        return handler
+
+    def snapshot(self) -> dict:
+        """Returns the counters of all the subject families, with their average rates since the start."""
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "uptime_s": round(elapsed, 1),
+            "latency_buckets_ms": list(LATENCY_BUCKETS_MS),
+            "subjects": {family: stats.to_dict(elapsed) for family, stats in sorted(self._families.items())},
+        }
+
+    def reset(self):
+        self.started_at = time.monotonic()
+        self._families.clear()
+        self._subjects.clear()
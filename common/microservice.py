@@ -2,12 +2,15 @@ import asyncio
 import signal
 import json
 import logging
+import os
+import time
 from abc import ABC, abstractmethod
 from nats.aio.msg import Msg
 
-from common.messaging import MessagingClient, NatsMessagingClient
+from common.messaging import MessagingClient, NatsMessagingClient, CodecRegistry, PublishBatch
+from common.metrics import MessageMetrics
 from common.command_handler import CommandHandler
-from common.logging_setup import setup_logging
+from common.logging_setup import setup_logging, set_log_level
 
 class Microservice(ABC):
     """
@@ -23,7 +26,14 @@ class Microservice(ABC):
         self._shutdown_event = asyncio.Event()
         self.messaging_client: MessagingClient = NatsMessagingClient()
         self.command_handler = CommandHandler(self.service_name, self.logger)
+        self.command_handler.register_command("metrics", self._handle_metrics_command)
+        self.command_handler.register_command("set_log_level", self._handle_set_log_level_command)
+        self.codecs = CodecRegistry()
         self.nats_url = "nats://127.0.0.1:4222"
+        # Options of `nats.connect`, updated from the `nats_client` global settings
+        self.nats_options: dict = {}
+        self._created_at = time.perf_counter()
+        self._metrics_task: asyncio.Task | None = None
 
     def _signal_handler(self, *args):
         self.logger.info("Shutdown signal received.")
@@ -32,35 +42,44 @@ class Microservice(ABC):
     async def connect(self):
         """Connects to the messaging server."""
         try:
-            nats_url = self.settings.get("global", {}).get("nats_url", self.nats_url)
-            await self.messaging_client.connect(nats_url)
+            nats_url = self.global_settings.get("nats_url", self.nats_url)
+            await self.messaging_client.connect(nats_url, **self.nats_options)
             self.logger.info(f"Connected to messaging server at {nats_url}")
             return True
         except Exception as e:
             self.logger.error(f"Error connecting to messaging server: {e}")
             return False
 
+    def _nats_client_options(self) -> dict:
+        """Returns the NATS connection options of the `nats_client` global settings block."""
+        options = self.global_settings.get("nats_client", {})
+        return {key: value for key, value in options.items() if key in NatsMessagingClient.CONNECT_OPTIONS}
+
     async def disconnect(self):
         if self.messaging_client:
             self.logger.info("Disconnecting from messaging server...")
             await self.messaging_client.disconnect()
 
-    async def get_settings(self, retry_interval: int = 5):
+    async def get_settings(self, retry_interval: float = 1, max_retry_interval: float = 30):
         """
         Retrieves settings from the settings service, with retries.
+
+        The settings are requested on the main messaging client, so the service
+        keeps the connection opened for the request. It is only reopened when the
+        settings point to another server or set `nats_client` connection options.
+        Failed attempts are retried with an exponential backoff.
         """
+        start = time.perf_counter()
+        attempts = 0
         while not self._shutdown_event.is_set():
+            attempts += 1
             try:
                 self.logger.info("Attempting to connect to NATS for settings...")
-                # Use a temporary client for settings retrieval to not interfere
-                # with the main client's state if it's already connected.
-                settings_client = NatsMessagingClient()
-                await settings_client.connect(self.nats_url)
+                await self.messaging_client.connect(self.nats_url, **self.nats_options)
 
                 subject = "settings.get.all"
                 self.logger.info(f"Requesting settings on subject: {subject}")
-                response = await settings_client.request(subject, b'', timeout=2.0)
-                await settings_client.disconnect()
+                response = await self.messaging_client.request(subject, b'', timeout=2.0)
 
                 try:
                     self.all_settings = json.loads(response.data)
@@ -76,21 +95,71 @@ class Microservice(ABC):
                     self.global_settings = self.all_settings["global"]
                 except KeyError:
                     self.global_settings = {}
+
+                try:
+                    self.codecs.configure(self.global_settings.get("codecs", {}))
+                except ValueError as e:
+                    self.logger.error(f"Invalid codecs settings, using JSON for all subjects: {e}")
                     
-                self.logger.info(f"Settings for {self.service_name} received successfully: {self.settings}")
+                self.logger.info("Settings for %s received successfully.", self.service_name)
+                self.logger.debug("Settings of %s: %s", self.service_name, self.settings)
+                if log_level := self.settings.get("log_level"):
+                    try:
+                        set_log_level(self.service_name, log_level)
+                    except ValueError as e:
+                        self.logger.error(f"Invalid log_level setting: {e}")
 
-                # Now connect the main client with the correct URL
-                await self.connect()
+                # Reopen the connection only if the settings require it
+                nats_url = self.global_settings.get("nats_url", self.nats_url)
+                nats_options = {**self.nats_options, **self._nats_client_options()}
+                if nats_url != self.nats_url or nats_options != self.nats_options:
+                    self.nats_options = nats_options
+                    await self.messaging_client.disconnect()
+                if not await self.connect():
+                    raise ConnectionError(f"Could not connect to {nats_url}")
+                self.logger.info(f"Ready in {(time.perf_counter() - start) * 1000:.0f} ms ({attempts} attempt(s)).")
                 return # Exit the loop on success
 
             except Exception as e:
-                self.logger.warning(f"Could not get settings: {e}. Retrying in {retry_interval}s...")
+                delay = min(retry_interval * 2 ** (attempts - 1), max_retry_interval)
+                self.logger.warning(f"Could not get settings: {e}. Retrying in {delay:.0f}s...")
 
             try:
-                await asyncio.wait_for(self._shutdown_event.wait(), timeout=retry_interval)
+                await asyncio.wait_for(self._shutdown_event.wait(), timeout=delay)
             except asyncio.TimeoutError:
                 pass
 
+    async def publish_encoded(self, subject: str, payload: bytes, headers: dict[str, str] | None = None):
+        """Publishes an encoded payload, with its codec headers if it has some."""
+        if headers:
+            await self.messaging_client.publish(subject, payload, headers=headers)
+        else:
+            await self.messaging_client.publish(subject, payload)
+
+    async def publish_value(self, subject: str, value, timestamp: float):
+        """Publishes a data point with the codec of the subject family."""
+        payload, headers = self.codecs.encode_value(subject, value, timestamp)
+        await self.publish_encoded(subject, payload, headers)
+
+    async def publish_object(self, subject: str, obj):
+        """Publishes a structured payload with the codec of the subject family."""
+        payload, headers = self.codecs.encode(subject, obj)
+        await self.publish_encoded(subject, payload, headers)
+
+    def publish_batch(self) -> PublishBatch:
+        """
+        Returns a batch publishing through the messaging client with the codecs of
+        the service, tuned by the `publish_batch` global settings block
+        (`max_bytes`, `flush_interval_ms`).
+        """
+        options = self.global_settings.get("publish_batch", {})
+        return PublishBatch(
+            self.messaging_client,
+            self.codecs,
+            max_bytes=options.get("max_bytes", 65536),
+            flush_interval=options.get("flush_interval_ms", 0) / 1000,
+        )
+
     async def _subscribe_to_commands(self):
         """Subscribes to the command stream for this service."""
         subject = f"commands.{self.service_name}"
@@ -101,25 +170,91 @@ class Microservice(ABC):
 
         await self.messaging_client.subscribe(subject, cb=command_message_handler)
 
-    async def run(self):
+    async def _publish_ready(self):
+        """Announces on `service.ready.<service_name>` that the service has started."""
+        payload = {
+            "service": self.service_name,
+            "pid": os.getpid(),
+            "startup_ms": round((time.perf_counter() - self._created_at) * 1000, 1),
+        }
+        try:
+            await self.messaging_client.publish(f"service.ready.{self.service_name}", json.dumps(payload).encode())
+            self.logger.info(f"Service ready in {payload['startup_ms']:.0f} ms.")
+        except Exception as e:
+            self.logger.warning(f"Could not publish the readiness of the service: {e}")
+
+    def get_metrics(self) -> dict:
+        """
+        Returns the message metrics of the service: per subject family counts,
+        bytes and rates of the published and received messages, and the
+        latency histogram of the subscription handlers.
+        """
+        metrics = getattr(self.messaging_client, "metrics", None)
+        return {
+            "service": self.service_name,
+            "pid": os.getpid(),
+            "timestamp": time.time(),
+            **(metrics.snapshot() if isinstance(metrics, MessageMetrics) else {"subjects": {}}),
+        }
+
+    async def _handle_metrics_command(self, reset: bool = False, reply: str = ""):
+        """Command handler replying with the message metrics, optionally resetting them afterwards."""
+        payload = json.dumps(self.get_metrics()).encode()
+        await self.messaging_client.publish(reply or f"{self.service_name}.metrics", payload)
+        metrics = getattr(self.messaging_client, "metrics", None)
+        if reset and isinstance(metrics, MessageMetrics):
+            metrics.reset()
+
+    async def _handle_set_log_level_command(self, level: str, reply: str = ""):
+        """Command handler changing the log level of the service at runtime, e.g. to "DEBUG"."""
+        try:
+            new_level = set_log_level(self.service_name, level)
+            self.logger.warning(f"Log level set to {logging.getLevelName(new_level)}.")
+            response = {"status": "ok", "level": logging.getLevelName(new_level)}
+        except (ValueError, TypeError) as e:
+            response = {"status": "error", "message": str(e)}
+        if reply:
+            await self.messaging_client.publish(reply, json.dumps(response).encode())
+
+    async def _publish_metrics_loop(self):
+        """Publishes the message metrics on `<service_name>.metrics` every `metrics.publish_interval_s` seconds."""
+        interval = self.global_settings.get("metrics", {}).get("publish_interval_s", 10)
+        if not interval or interval <= 0:
+            return
+        while not self._shutdown_event.is_set():
+            try:
+                await asyncio.wait_for(self._shutdown_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                return
+            try:
+                await self.messaging_client.publish(f"{self.service_name}.metrics", json.dumps(self.get_metrics()).encode())
+            except Exception as e:
+                self.logger.warning(f"Could not publish the metrics: {e}")
+
+    async def run(self, install_signal_handlers: bool = True):
         """
         The main entry point for the microservice.
         This method sets up signal handling and runs the service's main logic.
+
+        :param install_signal_handlers: False when the service runs next to others
+            in the same process, whose owner handles the signals and stops it.
         """
         self.logger.info("Service starting...")
-        loop = asyncio.get_running_loop()
-        try:
-            for sig in (signal.SIGINT, signal.SIGTERM):
-                loop.add_signal_handler(sig, self._signal_handler)
-        except NotImplementedError:
-            self.logger.warning("loop.add_signal_handler not implemented. Using signal.signal().")
-            signal.signal(signal.SIGINT, self._signal_handler)
-            signal.signal(signal.SIGTERM, self._signal_handler)
+        if install_signal_handlers:
+            self._install_signal_handlers()
 
         try:
             # The service's main logic, including dependency acquisition,
             # is now handled in _start_logic.
-            await self._start_logic()
+            started = await self._start_logic()
+            if started is False:
+                # Not announced ready: the services depending on it are not started
+                self.logger.error("Service failed to start.")
+            elif not self._shutdown_event.is_set():
+                await self._publish_ready()
+                self._metrics_task = asyncio.create_task(self._publish_metrics_loop())
 
             self.logger.info("Service is running. Waiting for shutdown signal.")
             await self._shutdown_event.wait()
@@ -129,16 +264,32 @@ class Microservice(ABC):
             self.logger.critical(f"An unhandled error occurred during run: {e}", exc_info=True)
         finally:
             self.logger.info("Shutting down...")
+            if self._metrics_task:
+                self._metrics_task.cancel()
             await self._stop_logic()
             await self.disconnect()
             self.logger.info("Service has stopped.")
 
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        try:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, self._signal_handler)
+        except NotImplementedError:
+            self.logger.warning("loop.add_signal_handler not implemented. Using signal.signal().")
+            signal.signal(signal.SIGINT, self._signal_handler)
+            signal.signal(signal.SIGTERM, self._signal_handler)
+
     async def stop(self):
         self.logger.info("Programmatic stop called.")
         self._shutdown_event.set()
 
     @abstractmethod
-    async def _start_logic(self):
+    async def _start_logic(self) -> bool | None:
+        """
+        Starts the service. Returns False when it could not start (e.g. its
+        hardware failed to initialize), so that it isn't announced ready.
+        """
         pass
 
     @abstractmethod
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Any
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+
+class S3Uploader:
+    """
+    Uploads files to S3 without blocking the event loop.
+
+    Files are added to a persistent on-disk queue, so pending uploads survive
+    a restart of the service. A background task uploads the queued files in a
+    thread pool, each file being sent in parallel multipart chunks by boto3.
+    Failed uploads are retried with an exponential backoff.
+
+    The S3 connection comes from the global settings (`s3_endpoint_url`,
+    `s3_bucket`, `s3_access_key`, `s3_secret_key`) and the uploader can be tuned
+    with an optional `s3_upload` block of the global settings:
+
+        "s3_upload": {
+            "max_workers": 2,              # Files uploaded at the same time
+            "max_concurrency": 4,          # Parallel parts per file
+            "multipart_chunksize_mb": 8,
+            "max_retries": 0,              # 0 retries forever
+            "retry_backoff_s": 2,
+            "max_backoff_s": 300
+        }
+    """
+
+    def __init__(self, global_settings: dict, queue_path: str, logger: logging.Logger,
+                 client_factory: Callable[[], Any] | None = None):
+        options = global_settings.get("s3_upload", {})
+        self.global_settings = global_settings
+        self.bucket_name = global_settings.get("s3_bucket")
+        self.queue_path = queue_path
+        self.logger = logger
+        self.max_workers = options.get("max_workers", 2)
+        self.max_retries = options.get("max_retries", 0)
+        self.retry_backoff = options.get("retry_backoff_s", 2.0)
+        self.max_backoff = options.get("max_backoff_s", 300.0)
+        chunk_size = int(options.get("multipart_chunksize_mb", 8) * 1024 * 1024)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=chunk_size,
+            multipart_chunksize=chunk_size,
+            max_concurrency=options.get("max_concurrency", 4),
+        )
+        self._client_factory = client_factory or self._create_client
+        self._client = None
+        # Creating boto3 clients isn't thread-safe: the first uploads of the pool create it under this lock
+        self._client_lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._queue: list[dict] = []
+        self._in_progress: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._worker_task: asyncio.Task | None = None
+        self._upload_tasks: set[asyncio.Task] = set()
+        self.uploaded = 0
+        self.failed = 0
+
+    def _create_client(self):
+        return boto3.client(
+            's3',
+            endpoint_url=self.global_settings.get("s3_endpoint_url"),
+            aws_access_key_id=self.global_settings.get("s3_access_key"),
+            aws_secret_access_key=self.global_settings.get("s3_secret_key")
+        )
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def _load_queue(self):
+        try:
+            with open(self.queue_path, 'r') as f:
+                self._queue = json.load(f)
+        except FileNotFoundError:
+            self._queue = []
+        except (json.JSONDecodeError, OSError) as e:
+            self.logger.error(f"Could not read the upload queue '{self.queue_path}': {e}")
+            self._queue = []
+
+    def _write_queue(self, queue: list[dict]):
+        tmp_path = f"{self.queue_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(queue, f)
+        os.replace(tmp_path, self.queue_path)
+
+    async def _save_queue(self):
+        try:
+            await asyncio.to_thread(self._write_queue, [dict(item) for item in self._queue])
+        except OSError as e:
+            self.logger.error(f"Could not save the upload queue '{self.queue_path}': {e}")
+
+    async def start(self):
+        """Loads the pending uploads and starts the upload worker."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.queue_path)), exist_ok=True)
+        await asyncio.to_thread(self._load_queue)
+        if self._queue:
+            self.logger.info(f"Resuming {len(self._queue)} pending S3 uploads.")
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="s3_upload")
+        self._worker_task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        """Stops the upload worker. Pending and interrupted uploads stay in the queue."""
+        if self._worker_task:
+            self._worker_task.cancel()
+            await asyncio.gather(self._worker_task, return_exceptions=True)
+        for task in list(self._upload_tasks):
+            task.cancel()
+        await asyncio.gather(*self._upload_tasks, return_exceptions=True)
+        if self._executor:
+            # Running uploads can't be interrupted, they are retried on the next start
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def enqueue(self, file_paths: list[str]):
+        """Adds files to the upload queue."""
+        queued = {item["path"] for item in self._queue}
+        for file_path in file_paths:
+            if file_path in queued:
+                continue
+            self._queue.append({
+                "path": file_path,
+                "key": os.path.basename(file_path),
+                "attempts": 0,
+                "next_attempt": 0.0,
+            })
+            self.logger.info(f"Queued {file_path} for upload to S3 bucket '{self.bucket_name}'.")
+        await self._save_queue()
+        self._wakeup.set()
+
+    def _upload_file(self, item: dict):
+        """Uploads a file, in a thread of the pool."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        self._client.upload_file(item["path"], self.bucket_name, item["key"], Config=self.transfer_config)
+
+    async def _upload(self, item: dict):
+        loop = asyncio.get_running_loop()
+        try:
+            self.logger.info(f"Uploading {item['key']} to S3 bucket '{self.bucket_name}'...")
+            await loop.run_in_executor(self._executor, self._upload_file, item)
+            self.logger.info(f"Successfully uploaded {item['key']}.")
+            self.uploaded += 1
+            self._queue.remove(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            item["attempts"] += 1
+            if self.max_retries and item["attempts"] >= self.max_retries:
+                self.logger.error(f"S3 upload of {item['key']} failed {item['attempts']} times, giving up: {e}")
+                self.failed += 1
+                self._queue.remove(item)
+            else:
+                delay = min(self.retry_backoff * 2 ** (item["attempts"] - 1), self.max_backoff)
+                item["next_attempt"] = time.time() + delay
+                self.logger.warning(f"S3 upload of {item['key']} failed: {e}. Retrying in {delay:.0f}s...")
+        finally:
+            self._in_progress.discard(item["path"])
+        await self._save_queue()
+        self._wakeup.set()
+
+    async def _worker(self):
+        """Starts the uploads that are due, up to `max_workers` at a time."""
+        try:
+            while True:
+                self._wakeup.clear()
+                now = time.time()
+                next_attempt = None
+                for item in list(self._queue):
+                    if item["path"] in self._in_progress:
+                        continue
+                    if not os.path.exists(item["path"]):
+                        self.logger.warning(f"{item['path']} no longer exists, removing it from the upload queue.")
+                        self._queue.remove(item)
+                        await self._save_queue()
+                        continue
+                    if item["next_attempt"] > now:
+                        next_attempt = min(next_attempt or item["next_attempt"], item["next_attempt"])
+                        continue
+                    if len(self._in_progress) >= self.max_workers:
+                        break
+                    self._in_progress.add(item["path"])
+                    task = asyncio.create_task(self._upload(item))
+                    self._upload_tasks.add(task)
+                    task.add_done_callback(self._upload_tasks.discard)
+
+                timeout = max(next_attempt - now, 0) if next_attempt else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            pass
@@ -1,10 +1,21 @@
+import argparse
 import asyncio
 from services.manager import main as manager_main
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Starts the manager, which starts all the microservices.")
+    parser.add_argument("--mode", choices=["process", "zygote", "monolith"], default=None,
+                        help="process: one Python process per service, zygote: processes forked from a launcher "
+                             "with the modules already imported, monolith: all services in the manager's process "
+                             "(default: MANAGER_MODE environment variable, or process)")
+    parser.add_argument("--bus", choices=["nats", "loopback"], default=None,
+                        help="Messaging of the monolith mode, loopback: in-process bus without NATS server, "
+                             "not reachable from the browser of the UI (default: MANAGER_BUS environment variable, or nats)")
+    args = parser.parse_args()
+
     print("Starting the microservice application...")
     try:
-        asyncio.run(manager_main.main())
+        asyncio.run(manager_main.main(mode=args.mode, bus=args.bus))
     except KeyboardInterrupt:
         print("Application shut down by user.")
     print("Application has been shut down.")
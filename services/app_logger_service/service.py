@@ -4,13 +4,13 @@ import os
 import sys
 from datetime import datetime, timezone
 import uuid
-import boto3
 import glob
 
 # Add the project root to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from common.microservice import Microservice
+from common.s3_uploader import S3Uploader
 
 class AppLoggerService(Microservice):
     """
@@ -25,6 +25,7 @@ class AppLoggerService(Microservice):
         self.log_data = {}
         self.log_filename = None
         self.log_dir = "app_logs"
+        self.uploader: S3Uploader | None = None
 
     async def _start_logic(self):
         self.logger.info("Waiting for settings...")
@@ -35,6 +36,9 @@ class AppLoggerService(Microservice):
 
         os.makedirs(self.log_dir, exist_ok=True)
 
+        self.uploader = S3Uploader(self.global_settings, os.path.join(self.log_dir, ".upload_queue.json"), self.logger)
+        await self.uploader.start()
+
         self.command_handler.register_command("start", self._handle_start)
         self.command_handler.register_command("stop", self._handle_stop)
         await self._subscribe_to_commands()
@@ -51,6 +55,8 @@ class AppLoggerService(Microservice):
         self.logger.info("Stopping app logger service...")
         if self.is_running:
             await self._handle_stop()
+        if self.uploader:
+            await self.uploader.stop()
 
     async def _handle_get_status_request(self, msg):
         """Replies with the current status."""
@@ -175,19 +181,5 @@ class AppLoggerService(Microservice):
             self.logger.error(f"Error writing log file {log_path}: {e}", exc_info=True)
 
     async def _upload_to_s3(self, file_path: str):
-        self.logger.info(f"Starting S3 upload for file: {file_path}")
-        try:
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=self.global_settings.get("s3_endpoint_url"),
-                aws_access_key_id=self.global_settings.get("s3_access_key"),
-                aws_secret_access_key=self.global_settings.get("s3_secret_key")
-            )
-            bucket_name = self.global_settings.get("s3_bucket")
-            file_name = os.path.basename(file_path)
-
-            self.logger.info(f"Uploading {file_name} to S3 bucket '{bucket_name}'...")
-            s3_client.upload_file(file_path, bucket_name, file_name)
-            self.logger.info(f"Successfully uploaded {file_name}.")
-        except Exception as e:
-            self.logger.error(f"S3 upload failed: {e}", exc_info=True)
+        self.logger.info(f"Queueing S3 upload for file: {file_path}")
+        await self.uploader.enqueue([file_path])
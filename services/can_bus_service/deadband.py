@@ -0,0 +1,67 @@
+"""
+    Change-only (deadband) publishing of decoded CAN signals.
+"""
+
+
+class SignalRule:
+    """Publishing rule of a signal, with the intervals converted to seconds."""
+    __slots__ = ("deadband", "min_interval", "heartbeat")
+
+    def __init__(self, deadband: float = 0.0, min_interval_ms: float = 0, heartbeat_ms: float = 1000):
+        self.deadband = float(deadband)
+        self.min_interval = min_interval_ms / 1000.0
+        self.heartbeat = heartbeat_ms / 1000.0
+
+
+class DeadbandFilter:
+    """
+    Decides which decoded signal values are worth publishing.
+
+    A value is published when it differs from the last published value by more
+    than the signal's `deadband` and at least `min_interval_ms` after the last
+    publish, or, as a heartbeat, when nothing was published for `heartbeat_ms`
+    (0 disables the heartbeat). Rules come from the `deadband` settings block:
+
+        "deadband": {
+            "default": {"deadband": 0, "min_interval_ms": 0, "heartbeat_ms": 1000},
+            "signals": {"PF_BOOM_PFAngX": {"deadband": 0.05}}
+        }
+
+    Per-signal rules override the default rule field by field.
+    """
+
+    def __init__(self, settings: dict):
+        default = settings.get("default", {})
+        self._default_rule = SignalRule(**default)
+        self._rules = {
+            name: SignalRule(**{**default, **rule})
+            for name, rule in settings.get("signals", {}).items()
+        }
+        # Signal name -> [last published value, last publish timestamp]
+        self._last: dict[str, list] = {}
+        self.published = 0
+        self.suppressed = 0
+
+    def accept(self, name: str, value: float, timestamp: float) -> bool:
+        """Returns True if the value must be published, and records it as published."""
+        last = self._last.get(name)
+        if last is None:
+            self._last[name] = [value, timestamp]
+            self.published += 1
+            return True
+
+        rule = self._rules.get(name, self._default_rule)
+        elapsed = timestamp - last[1]
+        if (abs(value - last[0]) > rule.deadband and elapsed >= rule.min_interval) \
+                or (rule.heartbeat and elapsed >= rule.heartbeat):
+            last[0] = value
+            last[1] = timestamp
+            self.published += 1
+            return True
+
+        self.suppressed += 1
+        return False
+
+    def filter(self, signals: dict[str, float], timestamp: float) -> dict[str, float]:
+        """Returns the subset of the signals that must be published."""
+        return {name: value for name, value in signals.items() if self.accept(name, value, timestamp)}
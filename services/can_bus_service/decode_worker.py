@@ -0,0 +1,88 @@
+"""
+    Off-loop decoding stage for the CAN bus service.
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Callable
+
+import can
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+
+
+class DecodeListener(can.Listener):
+    """
+    Decodes and serializes CAN frames in the `can.Notifier` receive thread.
+
+    The ready-to-send (subject, payload, headers) tuples are handed to the event loop
+    through a bounded queue. When the queue is full, the `overflow` policy
+    either drops the oldest queued payloads (`drop_oldest`, the freshest data
+    is kept) or the incoming ones (`drop_newest`). The event loop is woken up
+    once per batch of frames, not once per frame.
+    """
+
+    def __init__(self, encode: Callable[[can.Message], list[tuple]],
+                 loop: asyncio.AbstractEventLoop, max_queue: int = 10000, overflow: str = "drop_oldest"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}', expected one of {OVERFLOW_POLICIES}")
+        self._encode = encode
+        self._loop = loop
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self._pending: deque[tuple] = deque()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+        self._wakeup_scheduled = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    def on_message_received(self, msg: can.Message):
+        """Called in the notifier thread for each received frame."""
+        try:
+            publications = self._encode(msg)
+        except Exception:
+            self.errors += 1
+            return
+        if not publications:
+            return
+
+        with self._lock:
+            for publication in publications:
+                if len(self._pending) >= self.max_queue:
+                    self.dropped += 1
+                    if self.overflow == "drop_newest":
+                        continue
+                    self._pending.popleft()
+                self._pending.append(publication)
+                self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._pending))
+            wakeup = not self._wakeup_scheduled
+            self._wakeup_scheduled = True
+
+        if wakeup:
+            self._loop.call_soon_threadsafe(self._ready.set)
+
+    def on_error(self, exc: Exception):
+        self.errors += 1
+
+    async def get_batch(self) -> list[tuple]:
+        """Waits for and returns all the payloads queued so far."""
+        await self._ready.wait()
+        self._ready.clear()
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+            self._wakeup_scheduled = False
+        return batch
+
+    def get_stats(self) -> dict:
+        return {
+            "queue_depth": len(self._pending),
+            "queue_max_depth": self.max_depth,
+            "queue_enqueued": self.enqueued,
+            "queue_dropped": self.dropped,
+            "decode_errors": self.errors,
+        }
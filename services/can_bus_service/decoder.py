@@ -0,0 +1,118 @@
+"""
+    Precompiled CAN frame decoders built once from a loaded DBC database.
+"""
+import cantools
+
+
+class CompiledMessage:
+    """
+    Unpacker for a single DBC message.
+
+    The bit position, mask, sign and scaling of every signal are computed once,
+    so decoding a frame is reduced to two integer conversions and a shift/mask
+    per signal, with the values scaled straight into floats.
+    Messages that can't be unpacked this way (multiplexed messages, float
+    signals) fall back to the generic cantools decoder.
+    """
+
+    def __init__(self, message: cantools.database.can.Message):
+        self.name = message.name
+        self.length = message.length
+        self._message = message
+        self._little_endian: list[tuple] = []
+        self._big_endian: list[tuple] = []
+        self.is_generic = message.is_multiplexed() or any(s.is_float for s in message.signals)
+
+        if self.is_generic:
+            return
+
+        for signal in message.signals:
+            if signal.byte_order == "little_endian":
+                shift = signal.start
+                target = self._little_endian
+            else:
+                # The start bit of a big endian signal is its most significant bit,
+                # numbered from the least significant bit of each byte.
+                msb = 8 * (signal.start // 8) + (7 - signal.start % 8)
+                shift = self.length * 8 - msb - signal.length
+                target = self._big_endian
+
+            target.append((
+                signal.name,
+                shift,
+                (1 << signal.length) - 1,
+                (1 << (signal.length - 1)) if signal.is_signed else 0,
+                1 << signal.length,
+                float(signal.scale),
+                float(signal.offset),
+            ))
+
+    def decode(self, data: bytes | bytearray) -> dict[str, float]:
+        """Decodes the payload of a frame into a {signal name: scaled value} dict."""
+        if self.is_generic:
+            return {
+                name: float(value)
+                for name, value in self._message.decode(data, decode_choices=False).items()
+            }
+
+        if len(data) < self.length:
+            raise ValueError(f"Wrong data size: {len(data)} instead of {self.length} bytes for {self.name}")
+
+        signals = {}
+        if self._little_endian:
+            raw = int.from_bytes(data, "little")
+            for name, shift, mask, sign, span, scale, offset in self._little_endian:
+                value = (raw >> shift) & mask
+                if value & sign:
+                    value -= span
+                signals[name] = value * scale + offset
+        if self._big_endian:
+            raw = int.from_bytes(data[:self.length], "big")
+            for name, shift, mask, sign, span, scale, offset in self._big_endian:
+                value = (raw >> shift) & mask
+                if value & sign:
+                    value -= span
+                signals[name] = value * scale + offset
+        return signals
+
+
+class DecoderCache:
+    """
+    Per-arbitration-ID decoder cache.
+
+    Known IDs map to a `CompiledMessage`. Unknown IDs are recorded in a negative
+    set and counted, so a noisy bus costs a failed dict lookup per frame instead
+    of a KeyError.
+    """
+
+    def __init__(self, db: cantools.database.can.Database):
+        self._decoders: dict[int, CompiledMessage] = {
+            message.frame_id: CompiledMessage(message) for message in db.messages
+        }
+        self.unknown_ids: set[int] = set()
+        self.unknown_frames = 0
+
+    def __len__(self):
+        return len(self._decoders)
+
+    @property
+    def frame_ids(self) -> list[int]:
+        return list(self._decoders)
+
+    def get(self, arbitration_id: int) -> CompiledMessage | None:
+        decoder = self._decoders.get(arbitration_id)
+        if decoder is None:
+            self.unknown_frames += 1
+            self.unknown_ids.add(arbitration_id)
+        return decoder
+
+    def decode(self, arbitration_id: int, data: bytes | bytearray) -> tuple[str, dict[str, float]] | None:
+        """
+        Decodes a frame.
+
+        :return: The (message name, signals) pair, or None if the ID is not in the DBC.
+        """
+        decoder = self.get(arbitration_id)
+        if decoder is None:
+            return None
+        return decoder.name, decoder.decode(data)
@@ -0,0 +1,121 @@
+"""
+    Kernel/driver-level CAN acceptance filters derived from the loaded DBC.
+"""
+import os
+import time
+
+STANDARD_MASK = 0x7FF
+EXTENDED_MASK = 0x1FFFFFFF
+
+
+def parse_frame_id(frame_id: int | str) -> int:
+    """Accepts frame IDs given as integers or as strings such as "0x18FEF100"."""
+    if isinstance(frame_id, str):
+        return int(frame_id, 0)
+    return int(frame_id)
+
+
+def _merge(first: tuple[int, int], second: tuple[int, int]) -> tuple[int, int]:
+    """The (can_id, can_mask) filter matching the bits common to both filters."""
+    mask = first[1] & second[1] & ~(first[0] ^ second[0])
+    return first[0] & mask, mask
+
+
+def _accepted_ids(can_filter: tuple[int, int], full_mask: int) -> int:
+    """Number of IDs of `full_mask` bits accepted by a (can_id, can_mask) filter."""
+    return 1 << bin(full_mask & ~can_filter[1]).count("1")
+
+
+def build_acceptance_filters(frame_ids: list[tuple[int, bool]], max_filters: int = 0) -> list[dict]:
+    """
+    Builds python-can `can_filters` accepting the given frame IDs.
+
+    :param frame_ids: (arbitration ID, is extended) pairs to accept.
+    :param max_filters: Maximum number of filters supported by the driver (0 for no limit),
+        standard and extended ones alike. While there are more filters than that,
+        the two neighbouring IDs (or already merged filters) of the same kind whose
+        merge lets the fewest other IDs through are merged into a filter matching
+        the bits they have in common. With a single filter for both kinds, the
+        filter ignores the kind of the frames.
+    """
+    unique_ids = sorted(set(frame_ids))
+    kinds = ((False, STANDARD_MASK), (True, EXTENDED_MASK))
+    groups = {extended: [(can_id, full_mask) for can_id, is_extended in unique_ids if is_extended == extended]
+              for extended, full_mask in kinds}
+
+    count = len(unique_ids)
+    while max_filters and count > max_filters:
+        best = None
+        for extended, full_mask in kinds:
+            kind = groups[extended]
+            for i in range(len(kind) - 1):
+                merged = _merge(kind[i], kind[i + 1])
+                cost = (_accepted_ids(merged, full_mask) - _accepted_ids(kind[i], full_mask)
+                        - _accepted_ids(kind[i + 1], full_mask))
+                if best is None or cost < best[0]:
+                    best = (cost, extended, i, merged)
+        if best is None:
+            break
+        _, extended, i, merged = best
+        groups[extended][i:i + 2] = [merged]
+        count -= 1
+
+    if max_filters and count > max_filters:
+        # One filter of each kind is left: the standard IDs are compared to the
+        # extended ones with their upper bits cleared
+        (standard_id, standard_mask), = groups[False]
+        can_id, mask = _merge((standard_id, standard_mask | (EXTENDED_MASK & ~STANDARD_MASK)), groups[True][0])
+        return [{"can_id": can_id, "can_mask": mask}]
+
+    return [
+        {"can_id": can_id, "can_mask": mask, "extended": extended}
+        for extended, _ in kinds for can_id, mask in groups[extended]
+    ]
+
+
+class FilterSavingsMonitor:
+    """
+    Measures how many frames per second the acceptance filters keep out of userspace.
+
+    The total number of frames received by the interface is read from the
+    kernel statistics of SocketCAN interfaces. For other interfaces, the
+    savings can't be measured and are reported as None.
+    """
+
+    def __init__(self, interface: str, channel: str | None):
+        self._stats_path = None
+        if interface == "socketcan" and channel:
+            path = f"/sys/class/net/{channel}/statistics/rx_packets"
+            if os.path.exists(path):
+                self._stats_path = path
+        self._last_sample: tuple[float, int, int] | None = None
+        self.frames_saved_per_s: float | None = None
+
+    def _read_interface_frames(self) -> int | None:
+        try:
+            with open(self._stats_path) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def sample(self, frames_accepted: int) -> float | None:
+        """
+        Updates the rate of filtered frames since the previous sample.
+
+        :param frames_accepted: Total number of frames that reached the service so far.
+        """
+        if not self._stats_path:
+            return None
+        interface_frames = self._read_interface_frames()
+        if interface_frames is None:
+            return None
+
+        now = time.monotonic()
+        if self._last_sample:
+            last_time, last_interface_frames, last_accepted = self._last_sample
+            elapsed = now - last_time
+            if elapsed > 0:
+                saved = (interface_frames - last_interface_frames) - (frames_accepted - last_accepted)
+                self.frames_saved_per_s = max(saved, 0) / elapsed
+        self._last_sample = (now, interface_frames, frames_accepted)
+        return self.frames_saved_per_s
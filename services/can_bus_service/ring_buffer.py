@@ -0,0 +1,149 @@
+"""
+    Pre-trigger ring buffer of raw CAN frames.
+"""
+import threading
+import time
+from array import array
+
+import can
+
+FLAG_EXTENDED = 0x01
+FLAG_REMOTE = 0x02
+FLAG_ERROR = 0x04
+FLAG_FD = 0x08
+FLAG_BITRATE_SWITCH = 0x10
+FLAG_ERROR_STATE_INDICATOR = 0x20
+
+# Size of the fixed part of a record: timestamp (8), arbitration ID (4), data length (1), flags (1)
+RECORD_HEADER_SIZE = 14
+
+
+class PretriggerBuffer(can.Listener):
+    """
+    Keeps the most recent raw frames received on the bus, so that a recording
+    can start with the frames received shortly before it was triggered.
+
+    Frames are stored compactly in preallocated arrays (timestamp, arbitration
+    ID, data length, flags and a fixed-size data slot per frame). The capacity
+    is derived from a memory budget in bytes, and `window` limits the flushed
+    frames to the last seconds before the recording starts.
+
+    While a recording is attached, received frames are forwarded to it after
+    being buffered, so no frame is lost or duplicated between the flushed
+    pre-trigger frames and the live ones. The frames received while the
+    pre-trigger frames are flushed are queued behind them: the notifier thread
+    is never blocked by the flush.
+    """
+
+    def __init__(self, window: float, max_bytes: int = 1_000_000, max_data_length: int = 8):
+        self.window = window
+        self.max_data_length = max_data_length
+        self.capacity = max(1, max_bytes // (RECORD_HEADER_SIZE + max_data_length))
+        self._timestamps = array("d", bytes(8 * self.capacity))
+        self._ids = array("I", [0]) * self.capacity
+        self._lengths = bytearray(self.capacity)
+        self._flags = bytearray(self.capacity)
+        self._data = bytearray(self.capacity * max_data_length)
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self._target: can.Listener | None = None
+        # Frames received during the flush of the pre-trigger frames, None once flushed
+        self._queued: list[can.Message] | None = None
+
+    def __len__(self):
+        return self._count
+
+    def on_message_received(self, msg: can.Message):
+        """Called in the notifier thread for each received frame."""
+        with self._lock:
+            index = self._head
+            length = min(len(msg.data), self.max_data_length)
+            offset = index * self.max_data_length
+            self._timestamps[index] = msg.timestamp
+            self._ids[index] = msg.arbitration_id
+            self._lengths[index] = length
+            self._flags[index] = (
+                (FLAG_EXTENDED if msg.is_extended_id else 0)
+                | (FLAG_REMOTE if msg.is_remote_frame else 0)
+                | (FLAG_ERROR if msg.is_error_frame else 0)
+                | (FLAG_FD if msg.is_fd else 0)
+                | (FLAG_BITRATE_SWITCH if msg.bitrate_switch else 0)
+                | (FLAG_ERROR_STATE_INDICATOR if msg.error_state_indicator else 0)
+            )
+            self._data[offset:offset + length] = msg.data[:length]
+            self._head = (index + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+            if self._queued is not None:
+                self._queued.append(msg)
+            elif self._target:
+                self._target.on_message_received(msg)
+
+    def _copy_records(self) -> tuple:
+        """Copies the buffer: a few memory copies, so that the lock is held briefly."""
+        return (self._head, self._count, self._timestamps[:], self._ids[:], self._lengths[:], self._flags[:],
+                self._data[:])
+
+    def _message_at(self, records: tuple, index: int) -> can.Message:
+        _, _, timestamps, ids, lengths, flags, data = records
+        flags = flags[index]
+        offset = index * self.max_data_length
+        return can.Message(
+            timestamp=timestamps[index],
+            arbitration_id=ids[index],
+            is_extended_id=bool(flags & FLAG_EXTENDED),
+            is_remote_frame=bool(flags & FLAG_REMOTE),
+            is_error_frame=bool(flags & FLAG_ERROR),
+            is_fd=bool(flags & FLAG_FD),
+            bitrate_switch=bool(flags & FLAG_BITRATE_SWITCH),
+            error_state_indicator=bool(flags & FLAG_ERROR_STATE_INDICATOR),
+            dlc=lengths[index],
+            data=bytes(data[offset:offset + lengths[index]]),
+        )
+
+    def _window_messages(self, records: tuple, now: float) -> list[can.Message]:
+        """Returns the copied frames of the `window` seconds before `now`, oldest first."""
+        head, count, timestamps = records[:3]
+        start = (head - count) % self.capacity
+        messages = []
+        for i in range(count):
+            index = (start + i) % self.capacity
+            if now - timestamps[index] <= self.window:
+                messages.append(self._message_at(records, index))
+        return messages
+
+    def attach(self, target: can.Listener, now: float | None = None) -> int:
+        """
+        Flushes the frames of the `window` seconds before `now` (the current
+        time by default, so that an idle bus flushes no old frame) into the
+        target, then forwards it every received frame until `detach` is called.
+        Returns the number of flushed frames.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            records = self._copy_records()
+            self._queued = []
+            self._target = target
+
+        # The writes to the target happen outside the lock
+        messages = self._window_messages(records, now)
+        for msg in messages:
+            target.on_message_received(msg)
+        while True:
+            with self._lock:
+                queued = self._queued
+                if not queued or self._target is not target:
+                    # Flushed: the next frames are forwarded as they are received
+                    self._queued = None
+                    break
+                self._queued = []
+            for msg in queued:
+                target.on_message_received(msg)
+        return len(messages)
+
+    def detach(self):
+        with self._lock:
+            self._target = None
+            self._queued = None
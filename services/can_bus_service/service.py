@@ -5,15 +5,22 @@ import sys
 import os
 import cantools
 import can
-import boto3
 from datetime import datetime, timezone
 import glob
+import threading
 from typing import List
 
 # Add the project root to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from common.microservice import Microservice
+from common.s3_uploader import S3Uploader
+from common.can_frames import frame_subject, signal_subject, make_frame
+from services.can_bus_service.decoder import DecoderCache
+from services.can_bus_service.deadband import DeadbandFilter
+from services.can_bus_service.decode_worker import DecodeListener, OVERFLOW_POLICIES
+from services.can_bus_service.filters import build_acceptance_filters, parse_frame_id, FilterSavingsMonitor
+from services.can_bus_service.ring_buffer import PretriggerBuffer
 
 class CanBusService(Microservice):
     """
@@ -24,10 +31,31 @@ class CanBusService(Microservice):
         super().__init__("can_bus_service")
         self.can_bus = None
         self.db = None
+        self.decoder: DecoderCache | None = None
         self.listener_task = None
         self.can_logger: can.Logger | None = None
         self.current_log_path_pattern: str | None = None
         self.notifier: can.Notifier | None = None
+        # "signal": one message per signal on can.data.<Signal>
+        # "frame": one message per CAN frame on can.frame.<Message>
+        # "window": one message per DBC message and time window on can.frame.<Message>
+        self.publish_mode = "signal"
+        self.publish_window = 0.05
+        self.window_task = None
+        self._window_frames: dict[str, tuple[dict, float]] = {}
+        self._window_lock = threading.Lock()
+        # "loop": frames are decoded on the event loop
+        # "thread": frames are decoded in the notifier receive thread (see DecodeListener)
+        self.decode_mode = "loop"
+        self.decode_queue_overflow = "drop_oldest"
+        self.decode_listener: DecodeListener | None = None
+        self.deadband: DeadbandFilter | None = None
+        self.frames_received = 0
+        self.frames_suppressed = 0
+        self.can_filters: list[dict] | None = None
+        self.filter_monitor: FilterSavingsMonitor | None = None
+        self.pretrigger_buffer: PretriggerBuffer | None = None
+        self.uploader: S3Uploader | None = None
 
     async def _start_logic(self):
         self.logger.info("Waiting for settings...")
@@ -37,16 +65,33 @@ class CanBusService(Microservice):
 
         self.logger.info("Initializing...")
 
+        log_dir = self.settings.get("log_dir", "can_logs")
+        self.uploader = S3Uploader(self.global_settings, os.path.join(log_dir, ".upload_queue.json"), self.logger)
+        await self.uploader.start()
+
+        if dbc_file := self.settings.get("dbc_file"):
+            try:
+                self.logger.info(f"Loading DBC file from {dbc_file}...")
+                self.db = cantools.db.load_file(dbc_file)
+                self.decoder = DecoderCache(self.db)
+                self.logger.info(f"Compiled decoders for {len(self.decoder)} CAN messages.")
+            except FileNotFoundError:
+                self.logger.error(f"DBC file not found at {dbc_file}")
+
         interface = self.settings.get("interface", "virtual")
         channel = self.settings.get("channel", "vcan0")
         if channel == "" : channel=None
 
+        if self.settings.get("hardware_filters", False):
+            self.can_filters = self._build_can_filters()
+            self.filter_monitor = FilterSavingsMonitor(interface, channel)
+
         try:
             self.logger.info(f"Initializing CAN bus: interface={interface}, channel={channel}")
-            self.can_bus = can.interface.Bus(channel=channel, interface=interface)
+            self.can_bus = can.interface.Bus(channel=channel, interface=interface, can_filters=self.can_filters)
         except Exception as e:
             self.logger.error(f"Error initializing CAN bus: {e}", exc_info=True)
-            return
+            return False
         
         try:
             self.logger.info("Send CANopen NMT start")
@@ -62,22 +107,51 @@ class CanBusService(Microservice):
                 self.logger.error("Message NOT sent")
         except Exception as e:
             self.logger.error(f"Error sending NMT start message: {e}", exc_info=True)
-            return
-
-        if dbc_file := self.settings.get("dbc_file"):
-            try:
-                self.logger.info(f"Loading DBC file from {dbc_file}...")
-                self.db = cantools.db.load_file(dbc_file)
-            except FileNotFoundError:
-                self.logger.error(f"DBC file not found at {dbc_file}")
+            return False
+
+        self.publish_mode = self.settings.get("publish_mode", "signal")
+        if self.publish_mode not in ("signal", "frame", "window"):
+            self.logger.warning(f"Unknown publish_mode '{self.publish_mode}', falling back to 'signal'.")
+            self.publish_mode = "signal"
+        self.publish_window = self.settings.get("publish_window_ms", 50) / 1000.0
+        self.logger.info(f"CAN data publish mode: {self.publish_mode}")
+
+        self.decode_mode = self.settings.get("decode_mode", "loop")
+        if self.decode_mode not in ("loop", "thread"):
+            self.logger.warning(f"Unknown decode_mode '{self.decode_mode}', falling back to 'loop'.")
+            self.decode_mode = "loop"
+        self.logger.info(f"CAN decode mode: {self.decode_mode}")
+        # Checked here, the DecodeListener is only created in the listener task
+        self.decode_queue_overflow = self.settings.get("decode_queue_overflow", "drop_oldest")
+        if self.decode_queue_overflow not in OVERFLOW_POLICIES:
+            self.logger.error(f"Unknown decode_queue_overflow '{self.decode_queue_overflow}', "
+                              f"expected one of {OVERFLOW_POLICIES}, falling back to 'drop_oldest'.")
+            self.decode_queue_overflow = "drop_oldest"
+
+        if (deadband_settings := self.settings.get("deadband")) is not None:
+            self.deadband = DeadbandFilter(deadband_settings)
+            self.logger.info("Change-only (deadband) publishing enabled.")
+
+        if (pretrigger := self.settings.get("pretrigger_s", 0)) > 0:
+            self.pretrigger_buffer = PretriggerBuffer(
+                pretrigger,
+                max_bytes=self.settings.get("pretrigger_buffer_bytes", 1_000_000),
+                max_data_length=64 if self.settings.get("fd", False) else 8,
+            )
+            self.logger.info(f"Pre-trigger buffer enabled: {pretrigger}s, up to {self.pretrigger_buffer.capacity} frames.")
 
         self.command_handler.register_command("startRecording", self._handle_start_recording)
         self.command_handler.register_command("stopRecording", self._handle_stop_recording)
+        self.command_handler.register_command("getStats", self._handle_get_stats)
         await self._subscribe_to_commands()
 
         self.listener_task = asyncio.create_task(self._message_listener())
         self.logger.info("CAN message listener started.")
 
+        if self.publish_mode == "window":
+            self.window_task = asyncio.create_task(self._window_publisher())
+            self.logger.info(f"CAN window publisher started ({self.publish_window * 1000:.0f} ms).")
+
     async def _stop_logic(self):
         self.logger.info("Stopping...")
         if self.can_logger:
@@ -86,65 +160,190 @@ class CanBusService(Microservice):
         if self.listener_task and not self.listener_task.done():
             self.listener_task.cancel()
 
+        if self.window_task and not self.window_task.done():
+            self.window_task.cancel()
+
         if self.can_bus:
             self.can_bus.shutdown()
             self.logger.info("CAN bus shut down.")
 
+        if self.uploader:
+            await self.uploader.stop()
+
+    def _build_can_filters(self) -> list[dict] | None:
+        """
+        Builds the acceptance filters from the arbitration IDs of the DBC and
+        the optional `filter_allow_ids` allow-list of the settings.
+        """
+        frame_ids = [(message.frame_id, message.is_extended_frame) for message in self.db.messages] if self.db else []
+        for frame_id in self.settings.get("filter_allow_ids", []):
+            frame_id = parse_frame_id(frame_id)
+            frame_ids.append((frame_id, frame_id > 0x7FF))
+
+        if not frame_ids:
+            self.logger.warning("No arbitration IDs to build the acceptance filters from. Frames are not filtered.")
+            return None
+
+        can_filters = build_acceptance_filters(frame_ids, self.settings.get("max_hardware_filters", 0))
+        self.logger.info(f"Built {len(can_filters)} acceptance filters for {len(set(frame_ids))} arbitration IDs.")
+        return can_filters
+
+    def _encode_frame(self, msg: can.Message) -> list[tuple[str, bytes, dict | None]]:
+        """
+        Decodes a raw CAN frame and serializes it according to the publish mode.
+        Returns the list of (subject, payload, headers) to publish, which is empty
+        when the arbitration ID is not in the DBC file or when the frame is only
+        accumulated for the next publish window.
+        """
+        if not self.decoder:
+            return []
+        self.frames_received += 1
+        decoded = self.decoder.decode(msg.arbitration_id, msg.data)
+        if decoded is None:
+            return []
+        message_name, signals = decoded
+        signals = {name: round(value, 4) for name, value in signals.items()}
+
+        # In window mode, the deadband is applied to the accumulated values when the window is flushed
+        if self.deadband and self.publish_mode != "window":
+            signals = self.deadband.filter(signals, msg.timestamp)
+            if not signals:
+                self.frames_suppressed += 1
+                return []
+
+        if self.publish_mode == "frame":
+            subject = frame_subject(message_name)
+            return [(subject, *self.codecs.encode(subject, make_frame(signals, msg.timestamp)))]
+
+        if self.publish_mode == "window":
+            # Keep the latest values of each message until the window is flushed
+            with self._window_lock:
+                previous = self._window_frames.get(message_name)
+                if previous:
+                    previous[0].update(signals)
+                    signals = previous[0]
+                self._window_frames[message_name] = (signals, msg.timestamp)
+            return []
+
+        # Standardized subject and payload for each signal
+        publications = []
+        for name, value in signals.items():
+            subject = signal_subject(name)
+            publications.append((subject, *self.codecs.encode_value(subject, value, msg.timestamp)))
+        return publications
+
     async def _message_listener(self):
+        loop = asyncio.get_running_loop()
+        # Raw frames are buffered before decoding, so recordings can include the pre-trigger window
+        raw_listeners = [self.pretrigger_buffer] if self.pretrigger_buffer else []
+        if self.decode_mode == "thread":
+            self.decode_listener = DecodeListener(
+                self._encode_frame,
+                loop,
+                max_queue=self.settings.get("decode_queue_size", 10000),
+                overflow=self.decode_queue_overflow,
+            )
+            self.notifier = can.Notifier(self.can_bus, raw_listeners + [self.decode_listener], loop=loop)
+            await self._publish_decoded_frames()
+            return
+
         reader = can.AsyncBufferedReader()
-        self.notifier = can.Notifier(self.can_bus, [reader], loop=asyncio.get_running_loop())
+        self.notifier = can.Notifier(self.can_bus, raw_listeners + [reader], loop=loop)
 
         try:
-            while True:
-                msg = await reader.get_message()
-                if not self.db: continue
-                try:
-                    decoded = self.db.decode_message(msg.arbitration_id, msg.data)
-                    for name, signal_value in decoded.items():
-                        # Standardized subject for each signal
-                        subject = f"can.data.{name}"
-
-                        # Standardized payload
-                        payload = {
-                            "value": round(float(signal_value), 4),
-                            "ts": msg.timestamp
-                        }
-
-                        await self.messaging_client.publish(
-                            subject,
-                            json.dumps(payload).encode()
-                        )
-                        self.logger.debug(f"Published to {subject}: {payload}")
-                except KeyError:
-                    # This happens when the arbitration ID is not in the DBC file
-                    self.logger.debug(f"Message with ID {msg.arbitration_id} not found in DBC file.")
-                except Exception as e:
-                    # Catch other potential errors during decoding or publishing
-                    self.logger.warning(f"Error processing message {msg.arbitration_id}: {e}")
+            async with self.publish_batch() as batch:
+                while True:
+                    # Frames that arrived while the previous ones were published go out together
+                    messages = [await reader.get_message()]
+                    while not reader.buffer.empty():
+                        messages.append(reader.buffer.get_nowait())
+                    for msg in messages:
+                        try:
+                            for subject, payload, headers in self._encode_frame(msg):
+                                await batch.publish(subject, payload, headers)
+                        except Exception as e:
+                            # Catch other potential errors during decoding or publishing
+                            self.logger.warning("Error processing message %s: %s", msg.arbitration_id, e)
+                    try:
+                        await batch.flush()
+                    except Exception as e:
+                        self.logger.warning(f"Error publishing CAN messages: {e}")
         except asyncio.CancelledError:
             self.logger.info("Message listener cancelled.")
         finally:
             if self.notifier:
                 self.notifier.stop()
 
-    async def _upload_to_s3(self, file_path_pattern: str):
-        self.logger.info(f"Starting S3 upload for files matching: {file_path_pattern}*")
+    async def _publish_decoded_frames(self):
+        """Publishes the payloads decoded in the notifier thread by the DecodeListener."""
         try:
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=self.global_settings.get("s3_endpoint_url"),
-                aws_access_key_id=self.global_settings.get("s3_access_key"),
-                aws_secret_access_key=self.global_settings.get("s3_secret_key")
-            )
-            bucket_name = self.global_settings.get("s3_bucket")
+            async with self.publish_batch() as batch:
+                while True:
+                    publications = await self.decode_listener.get_batch()
+                    try:
+                        for subject, payload, headers in publications:
+                            await batch.publish(subject, payload, headers)
+                        await batch.flush()
+                    except Exception as e:
+                        self.logger.warning(f"Error publishing {len(publications)} CAN messages: {e}")
+        except asyncio.CancelledError:
+            self.logger.info("Message listener cancelled.")
+        finally:
+            if self.notifier:
+                self.notifier.stop()
 
-            for file_to_upload in glob.glob(f"{file_path_pattern}*"):
-                file_name = os.path.basename(file_to_upload)
-                self.logger.info(f"Uploading {file_name} to S3 bucket '{bucket_name}'...")
-                s3_client.upload_file(file_to_upload, bucket_name, file_name)
-                self.logger.info(f"Successfully uploaded {file_name}.")
-        except Exception as e:
-            self.logger.error(f"S3 upload failed: {e}", exc_info=True)
+    async def _window_publisher(self):
+        """Publishes the frames accumulated during each publish window."""
+        try:
+            while True:
+                await asyncio.sleep(self.publish_window)
+                if not self._window_frames:
+                    continue
+                with self._window_lock:
+                    frames, self._window_frames = self._window_frames, {}
+                try:
+                    async with self.publish_batch() as batch:
+                        for message_name, (signals, timestamp) in frames.items():
+                            if self.deadband:
+                                signals = self.deadband.filter(signals, timestamp)
+                                if not signals:
+                                    self.frames_suppressed += 1
+                                    continue
+                            await batch.publish_object(frame_subject(message_name), make_frame(signals, timestamp))
+                except Exception as e:
+                    self.logger.warning(f"Error publishing {len(frames)} CAN frames: {e}")
+        except asyncio.CancelledError:
+            self.logger.info("Window publisher cancelled.")
+
+    def _get_stats(self) -> dict:
+        """Returns the decoding and publishing counters."""
+        stats = {
+            "publish_mode": self.publish_mode,
+            "decode_mode": self.decode_mode,
+            "frames_received": self.frames_received,
+            "unknown_frames": self.decoder.unknown_frames if self.decoder else 0,
+            "frames_suppressed": self.frames_suppressed,
+            "signals_published": self.deadband.published if self.deadband else None,
+            "signals_suppressed": self.deadband.suppressed if self.deadband else 0,
+        }
+        if self.decode_listener:
+            stats.update(self.decode_listener.get_stats())
+        if self.can_filters is not None:
+            stats["acceptance_filters"] = len(self.can_filters)
+            stats["filters_in_hardware"] = bool(getattr(self.can_bus, "_is_filtered", False))
+            stats["frames_saved_per_s"] = self.filter_monitor.sample(self.frames_received) if self.filter_monitor else None
+        return stats
+
+    async def _handle_get_stats(self, reply: str = ""):
+        stats = self._get_stats()
+        if reply:
+            await self.messaging_client.publish(reply, json.dumps(stats).encode())
+        else:
+            await self.messaging_client.publish("can_bus.stats", json.dumps(stats).encode())
+
+    async def _upload_to_s3(self, file_path_pattern: str):
+        self.logger.info(f"Queueing S3 upload for files matching: {file_path_pattern}*")
+        await self.uploader.enqueue(glob.glob(f"{file_path_pattern}*"))
 
     async def _handle_start_recording(self, filename: str | None = None):
         if self.can_logger:
@@ -175,7 +374,11 @@ class CanBusService(Microservice):
             else:
                 self.can_logger = can.Logger(log_path_with_ext)
 
-            if self.notifier:
+            if self.pretrigger_buffer:
+                # Flushing the pre-trigger frames writes to the log file, keep it off the event loop
+                flushed = await asyncio.to_thread(self.pretrigger_buffer.attach, self.can_logger)
+                self.logger.info(f"Flushed {flushed} pre-trigger frames into the recording.")
+            elif self.notifier:
                 self.notifier.add_listener(self.can_logger)
         except Exception as e:
             self.logger.error(f"Failed to start CAN logger: {e}", exc_info=True)
@@ -187,7 +390,9 @@ class CanBusService(Microservice):
             return
 
         self.logger.info("Stopping CAN recording...")
-        if self.notifier:
+        if self.pretrigger_buffer:
+            self.pretrigger_buffer.detach()
+        elif self.notifier:
             self.notifier.remove_listener(self.can_logger)
         self.can_logger.stop()
         self.can_logger = None
@@ -195,7 +400,7 @@ class CanBusService(Microservice):
         file_path_pattern = self.current_log_path_pattern
         self.current_log_path_pattern = None
 
-        # Upload to S3 and gather file list
+        # Queue the upload to S3 and gather file list
         await self._upload_to_s3(file_path_pattern)
 
         logged_files = glob.glob(f"{file_path_pattern}*")
@@ -1,3 +1,6 @@
+import math
+from collections import deque
+from heapq import heapify, heappop, heappush
 from abc import ABC, abstractmethod
 
 class StatefulComputation(ABC):
@@ -12,6 +15,14 @@ class StatefulComputation(ABC):
         """
         pass
 
+    def resume(self):
+        """
+        Called when the computation continues from the state of a previous run
+        of the service: forgets what anchors it in time (e.g. the last sample of
+        an Integrator), so that the downtime isn't counted as data time.
+        """
+        pass
+
 class RunningAverage(StatefulComputation):
     """
     Computes a running (cumulative) average.
@@ -45,6 +56,11 @@ class Integrator(StatefulComputation):
         self.last_timestamp = timestamp
         return self.integral
 
+    def resume(self):
+        # The total is kept, the next sample starts a new trapezoid
+        self.last_value = None
+        self.last_timestamp = None
+
 class Differentiator(StatefulComputation):
     """
     Computes the derivative of a signal with respect to time.
@@ -64,3 +80,322 @@ class Differentiator(StatefulComputation):
         self.last_value = value
         self.last_timestamp = timestamp
         return derivative
+
+    def resume(self):
+        self.last_value = None
+        self.last_timestamp = None
+
+class ExponentialMovingAverage(StatefulComputation):
+    """
+    Computes an exponential moving average: each sample weighs `alpha` and the
+    previous average `1 - alpha`.
+    """
+    def __init__(self, alpha: float = 0.1):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in ]0, 1]")
+        self.alpha = alpha
+        self.average = None
+
+    def update(self, value: float, timestamp: float) -> float:
+        if self.average is None:
+            self.average = float(value)
+        else:
+            self.average += self.alpha * (value - self.average)
+        return self.average
+
+class WindowedComputation(StatefulComputation):
+    """
+    Base class of the computations over the samples of the last `window`
+    seconds. At most `max_samples` samples are kept, which bounds the memory
+    whatever the rate of the signal. Subclasses keep running aggregates, updated
+    in `_added` and `_removed`, so that each update is amortized O(1).
+    """
+    def __init__(self, window: float = 10.0, max_samples: int = 10000):
+        if window <= 0:
+            raise ValueError("window must be positive")
+        if max_samples < 1:
+            raise ValueError("max_samples must be at least 1")
+        self.window = float(window)
+        self.max_samples = int(max_samples)
+        self.samples = deque()
+
+    def update(self, value: float, timestamp: float) -> float:
+        self.samples.append((timestamp, value))
+        self._added(value)
+        oldest = timestamp - self.window
+        samples = self.samples
+        while samples[0][0] < oldest or len(samples) > self.max_samples:
+            self._removed(samples.popleft()[1])
+        return self._result()
+
+    def _added(self, value: float):
+        pass
+
+    def _removed(self, value: float):
+        pass
+
+    @abstractmethod
+    def _result(self) -> float:
+        pass
+
+class MovingAverage(WindowedComputation):
+    """
+    Computes the average of the samples of the last `window` seconds.
+    """
+    def __init__(self, window: float = 10.0, max_samples: int = 10000):
+        super().__init__(window, max_samples)
+        self.sum = 0.0
+
+    def _added(self, value: float):
+        self.sum += value
+
+    def _removed(self, value: float):
+        self.sum -= value
+
+    def _result(self) -> float:
+        return self.sum / len(self.samples)
+
+class MovingStdDev(WindowedComputation):
+    """
+    Computes the (population) standard deviation of the samples of the last
+    `window` seconds.
+    """
+    def __init__(self, window: float = 10.0, max_samples: int = 10000):
+        super().__init__(window, max_samples)
+        self.sum = 0.0
+        self.sum_of_squares = 0.0
+
+    def _added(self, value: float):
+        self.sum += value
+        self.sum_of_squares += value * value
+
+    def _removed(self, value: float):
+        self.sum -= value
+        self.sum_of_squares -= value * value
+
+    def _result(self) -> float:
+        count = len(self.samples)
+        mean = self.sum / count
+        # Rounding errors of the running sums can make the variance slightly negative
+        return math.sqrt(max(self.sum_of_squares / count - mean * mean, 0.0))
+
+class MovingRMS(WindowedComputation):
+    """
+    Computes the root mean square of the samples of the last `window` seconds.
+    """
+    def __init__(self, window: float = 10.0, max_samples: int = 10000):
+        super().__init__(window, max_samples)
+        self.sum_of_squares = 0.0
+
+    def _added(self, value: float):
+        self.sum_of_squares += value * value
+
+    def _removed(self, value: float):
+        self.sum_of_squares -= value * value
+
+    def _result(self) -> float:
+        return math.sqrt(max(self.sum_of_squares / len(self.samples), 0.0))
+
+class RateOfChange(WindowedComputation):
+    """
+    Computes the average rate of change of a signal over the last `window`
+    seconds: the difference between the newest and the oldest samples of the
+    window, divided by the time between them.
+    """
+    def _result(self) -> float:
+        first_timestamp, first_value = self.samples[0]
+        last_timestamp, last_value = self.samples[-1]
+        dt = last_timestamp - first_timestamp
+        return (last_value - first_value) / dt if dt > 0 else 0.0
+
+class MovingMin(StatefulComputation):
+    """
+    Computes the minimum of the samples of the last `window` seconds with a
+    monotonic deque: the samples that can't be the minimum anymore are dropped,
+    so each update is amortized O(1).
+    """
+    def __init__(self, window: float = 10.0, max_samples: int = 10000):
+        if window <= 0:
+            raise ValueError("window must be positive")
+        if max_samples < 1:
+            raise ValueError("max_samples must be at least 1")
+        self.window = float(window)
+        self.max_samples = int(max_samples)
+        self.count = 0
+        # (sample number, timestamp, value), with increasing values
+        self.candidates = deque()
+
+    def _dominates(self, new_value: float, value: float) -> bool:
+        return new_value <= value
+
+    def update(self, value: float, timestamp: float) -> float:
+        self.count += 1
+        candidates = self.candidates
+        while candidates and self._dominates(value, candidates[-1][2]):
+            candidates.pop()
+        candidates.append((self.count, timestamp, value))
+        oldest = timestamp - self.window
+        first_kept = self.count - self.max_samples
+        while candidates[0][1] < oldest or candidates[0][0] <= first_kept:
+            candidates.popleft()
+        return candidates[0][2]
+
+class MovingMax(MovingMin):
+    """
+    Computes the maximum of the samples of the last `window` seconds.
+    """
+    def _dominates(self, new_value: float, value: float) -> bool:
+        return new_value >= value
+
+class _LazyHeap:
+    """
+    A min-heap from which any item can be removed: the item is only counted as
+    removed, and popped once it reaches the top. The heap is rebuilt when the
+    removed items outnumber the others, so that its size stays O(size).
+    """
+    def __init__(self):
+        self.items = []
+        self.removed = {}
+        self.size = 0
+
+    def push(self, item: float):
+        heappush(self.items, item)
+        self.size += 1
+
+    def top(self) -> float:
+        return self.items[0]
+
+    def pop(self) -> float:
+        item = heappop(self.items)
+        self.size -= 1
+        self._prune()
+        return item
+
+    def remove(self, item: float):
+        self.removed[item] = self.removed.get(item, 0) + 1
+        self.size -= 1
+        if len(self.items) > 2 * self.size + 16:
+            self._compact()
+        else:
+            self._prune()
+
+    def _prune(self):
+        items, removed = self.items, self.removed
+        while items and items[0] in removed:
+            item = heappop(items)
+            if removed[item] == 1:
+                del removed[item]
+            else:
+                removed[item] -= 1
+
+    def _compact(self):
+        kept, removed = [], self.removed
+        for item in self.items:
+            if item in removed:
+                if removed[item] == 1:
+                    del removed[item]
+                else:
+                    removed[item] -= 1
+            else:
+                kept.append(item)
+        heapify(kept)
+        self.items = kept
+
+class Percentile(WindowedComputation):
+    """
+    Computes a percentile (e.g. 50 for the median, 95) of the samples of the
+    last `window` seconds. The samples of the window are split between a
+    max-heap of the lowest ones, topped by the percentile, and a min-heap of
+    the others, from which the expired samples are removed lazily: an update is
+    amortized O(log n) for n samples in the window.
+    """
+    def __init__(self, percentile: float = 50.0, window: float = 10.0, max_samples: int = 10000):
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be in ]0, 100[")
+        super().__init__(window, max_samples)
+        self.percentile = percentile
+        self.lower = _LazyHeap() # negated values
+        self.upper = _LazyHeap()
+
+    def _added(self, value: float):
+        if self.lower.size and value <= -self.lower.top():
+            self.lower.push(-value)
+        else:
+            self.upper.push(value)
+
+    def _removed(self, value: float):
+        # Every sample of the lower heap is at most the lowest of the upper heap
+        if self.lower.size and value <= -self.lower.top():
+            self.lower.remove(-value)
+        else:
+            self.upper.remove(value)
+
+    def _result(self) -> float:
+        lower, upper = self.lower, self.upper
+        count = len(self.samples)
+        rank = min(int(count * self.percentile / 100), count - 1) + 1
+        while lower.size > rank:
+            upper.push(-lower.pop())
+        while lower.size < rank:
+            lower.push(-upper.pop())
+        return -lower.top()
+
+class CumulativePercentile(StatefulComputation):
+    """
+    Estimates a percentile of all the samples of a signal since the start with
+    the P² algorithm (Jain and Chlamtac), which only keeps five markers instead
+    of the samples: O(1) time and memory per update.
+    """
+    def __init__(self, percentile: float = 50.0):
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be in ]0, 100[")
+        self.percentile = percentile
+        p = percentile / 100
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, value: float, timestamp: float) -> float:
+        heights = self.heights
+        if len(heights) < 5:
+            # Exact percentile of the first samples
+            heights.append(value)
+            heights.sort()
+            return heights[min(int(len(heights) * self.percentile / 100), len(heights) - 1)]
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        positions, desired = self.positions, self.desired
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+        return heights[2]
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
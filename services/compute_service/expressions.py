@@ -0,0 +1,313 @@
+"""
+    Expressions over the signals of the compute service, for triggers and
+    derived signals, e.g.:
+
+        pressure > 200 for 2s
+        hysteresis(can.data.CoolantTemp, 90, 100) and not engine.running
+        sqrt(gps.data.vx ** 2 + gps.data.vy ** 2) * 3.6
+
+    An expression is parsed once and compiled to a Python function, which reads
+    the signals from the state of the service. The syntax:
+
+    -   Numbers, strings ("on", 'off'), `true`, `false`.
+    -   Signals by name, dotted names included (`can.data.EngineSpeed`); other
+        names between backquotes (`` `sensor-1` ``).
+    -   Arithmetic: `+ - * / % **`, comparisons: `== != > < >= <=` (chainable,
+        `0 < x < 10`), logic: `and`/`&&`, `or`/`||`, `not`/`!`.
+    -   Functions: `abs`, `min`, `max`, `round`, `sqrt`, and
+        `hysteresis(value, low, high)`, true once `value` rose above `high` and
+        until it falls below `low`.
+    -   `<condition> for <duration>`: true once the condition has been true for
+        the duration (`500ms`, `2s`, `1.5min`, `1h`, seconds without unit), on
+        the timestamps of the data. It binds tighter than `and`/`or`:
+        `a > 1 for 2s and b < 3`.
+"""
+import math
+import re
+
+_TOKENS = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+      | (?P<string>"[^"]*"|'[^']*')
+      | (?P<quoted>`[^`]+`)
+      | (?P<name>[A-Za-z_]\w*(?:[.:]\w+)*)
+      | (?P<operator>\*\*|==|!=|>=|<=|&&|\|\||[-+*/%<>()!,])
+    )""", re.VERBOSE)
+
+_CONSTANTS = {"true": "True", "false": "False", "True": "True", "False": "False"}
+_KEYWORDS = {"and", "or", "not", "for"}
+_COMPARISONS = {"==", "!=", ">", "<", ">=", "<="}
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "sec": 1, "min": 60, "h": 3600}
+_FUNCTIONS = {"abs": abs, "min": min, "max": max, "round": round, "sqrt": math.sqrt}
+
+
+class ExpressionError(ValueError):
+    """Raised for an expression that can't be parsed."""
+
+
+class Hysteresis:
+    """State of a `hysteresis(value, low, high)` call."""
+    __slots__ = ("active",)
+
+    def __init__(self):
+        self.active = False
+
+    def __call__(self, value, low, high) -> bool:
+        if value > high:
+            self.active = True
+        elif value < low:
+            self.active = False
+        return self.active
+
+
+class HeldFor:
+    """State of a `<condition> for <duration>`: since when the condition is true."""
+    __slots__ = ("seconds", "since")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.since = None
+
+    def __call__(self, condition, timestamp: float) -> bool:
+        if not condition:
+            self.since = None
+            return False
+        if self.since is None:
+            self.since = timestamp
+        return timestamp - self.since >= self.seconds
+
+
+def _all(*values):
+    """`and` evaluating all its operands, for the operands with a state to update."""
+    for value in values:
+        if not value:
+            return value
+    return values[-1]
+
+
+def _any(*values):
+    """`or` evaluating all its operands."""
+    for value in values:
+        if value:
+            return value
+    return values[-1]
+
+
+class _Compiler:
+    """
+    Recursive descent parser generating the Python code of an expression. Each
+    rule returns the code of its node and whether it holds a state (`for`,
+    `hysteresis`), which must be updated at every evaluation: the boolean
+    operators don't short-circuit such operands.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = self._tokenize(source)
+        self.position = 0
+        self.signals = set()
+        self.namespace = {"__builtins__": {}, "_all": _all, "_any": _any, **_FUNCTIONS}
+        # The `for` and `hysteresis` operators, in the order of the expression
+        self.operators = []
+
+    def _tokenize(self, source: str) -> list[tuple[str, str, int]]:
+        tokens, position = [], 0
+        while source[position:].strip():
+            match = _TOKENS.match(source, position)
+            if not match:
+                raise ExpressionError(f"Unexpected character at {position}: '{source[position:].strip()[:10]}'")
+            tokens.append((match.lastgroup, match.group(match.lastgroup), match.start(match.lastgroup)))
+            position = match.end()
+        return tokens
+
+    def _peek(self) -> str | None:
+        return self.tokens[self.position][1] if self.position < len(self.tokens) else None
+
+    def _next(self) -> tuple[str, str, int]:
+        if self.position >= len(self.tokens):
+            raise ExpressionError("Unexpected end of the expression.")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _expect(self, value: str):
+        kind, text, position = self._next()
+        if text != value:
+            raise ExpressionError(f"Expected '{value}' at {position}, got '{text}'.")
+
+    def _state(self, prefix: str, state) -> str:
+        name = f"_{prefix}{len(self.namespace)}"
+        self.namespace[name] = state
+        self.operators.append(state)
+        return name
+
+    def compile(self):
+        code, _ = self._or()
+        if self.position < len(self.tokens):
+            _, text, position = self.tokens[self.position]
+            raise ExpressionError(f"Unexpected '{text}' at {position}.")
+        if not self.signals:
+            raise ExpressionError("The expression doesn't reference any signal.")
+        exec(compile(f"def evaluate(s, t):\n    return {code}", f"<expression {self.source!r}>", "exec"),
+             self.namespace)
+        return self.namespace["evaluate"]
+
+    def _boolean(self, operand, keywords: tuple[str, str], python_operator: str, eager_function: str):
+        operands = [operand()]
+        while self._peek() in keywords:
+            self._next()
+            operands.append(operand())
+        if len(operands) == 1:
+            return operands[0]
+        if any(stateful for _, stateful in operands):
+            return f"{eager_function}({', '.join(code for code, _ in operands)})", True
+        return "(" + f" {python_operator} ".join(code for code, _ in operands) + ")", False
+
+    def _or(self):
+        return self._boolean(self._and, ("or", "||"), "or", "_any")
+
+    def _and(self):
+        return self._boolean(self._not, ("and", "&&"), "and", "_all")
+
+    def _not(self):
+        if self._peek() in ("not", "!"):
+            self._next()
+            code, stateful = self._not()
+            return f"(not {code})", stateful
+        return self._held()
+
+    def _held(self):
+        code, stateful = self._comparison()
+        if self._peek() != "for":
+            return code, stateful
+        self._next()
+        kind, text, position = self._next()
+        if kind != "number":
+            raise ExpressionError(f"Expected a duration after 'for' at {position}, got '{text}'.")
+        seconds = float(text)
+        unit = self._peek()
+        if unit in _DURATION_UNITS and self.tokens[self.position][0] == "name":
+            self._next()
+            seconds *= _DURATION_UNITS[unit]
+        return f"{self._state('held', HeldFor(seconds))}({code}, t)", True
+
+    def _comparison(self):
+        code, stateful = self._sum()
+        parts = [code]
+        while self._peek() in _COMPARISONS:
+            parts.append(self._next()[1])
+            code, operand_stateful = self._sum()
+            parts.append(code)
+            stateful = stateful or operand_stateful
+        if len(parts) == 1:
+            return parts[0], stateful
+        return "(" + " ".join(parts) + ")", stateful
+
+    def _binary(self, operand, operators: tuple[str, ...]):
+        code, stateful = operand()
+        while self._peek() in operators:
+            operator = self._next()[1]
+            right, right_stateful = operand()
+            code, stateful = f"({code} {operator} {right})", stateful or right_stateful
+        return code, stateful
+
+    def _sum(self):
+        return self._binary(self._term, ("+", "-"))
+
+    def _term(self):
+        return self._binary(self._unary, ("*", "/", "%"))
+
+    def _unary(self):
+        if self._peek() in ("-", "+"):
+            operator = self._next()[1]
+            code, stateful = self._unary()
+            return f"({operator}{code})", stateful
+        return self._power()
+
+    def _power(self):
+        code, stateful = self._atom()
+        if self._peek() == "**":
+            self._next()
+            exponent, exponent_stateful = self._unary()
+            return f"({code} ** {exponent})", stateful or exponent_stateful
+        return code, stateful
+
+    def _atom(self):
+        kind, text, position = self._next()
+        if kind == "number":
+            return repr(float(text) if any(c in text for c in ".eE") else int(text)), False
+        if kind == "string":
+            return repr(text[1:-1]), False
+        if kind == "quoted":
+            return self._signal(text[1:-1]), False
+        if text == "(":
+            code = self._or()
+            self._expect(")")
+            return code
+        if kind == "name" and text in _CONSTANTS:
+            return _CONSTANTS[text], False
+        if kind == "name" and text not in _KEYWORDS:
+            if self._peek() == "(":
+                return self._call(text, position)
+            return self._signal(text), False
+        raise ExpressionError(f"Unexpected '{text}' at {position}.")
+
+    def _signal(self, name: str) -> str:
+        self.signals.add(name)
+        return f"s[{name!r}]"
+
+    def _call(self, function: str, position: int):
+        self._expect("(")
+        arguments = []
+        if self._peek() != ")":
+            arguments.append(self._or())
+            while self._peek() == ",":
+                self._next()
+                arguments.append(self._or())
+        self._expect(")")
+        stateful = any(argument_stateful for _, argument_stateful in arguments)
+        codes = [code for code, _ in arguments]
+        if function == "hysteresis":
+            if len(codes) != 3:
+                raise ExpressionError(f"hysteresis(value, low, high) takes 3 arguments, got {len(codes)} at {position}.")
+            return f"{self._state('hysteresis', Hysteresis())}({', '.join(codes)})", True
+        if function not in _FUNCTIONS:
+            raise ExpressionError(f"Unknown function '{function}' at {position}.")
+        return f"{function}({', '.join(codes)})", stateful
+
+
+class Expression:
+    """
+    An expression compiled at creation. `evaluate(state, timestamp)` returns
+    its value from the signal values of `state` (a dict), and raises KeyError
+    while one of its `signals` has no value. The expression keeps the state of
+    its `for` and `hysteresis` operators between evaluations.
+    """
+
+    def __init__(self, expression: str):
+        if not isinstance(expression, str) or not expression.strip():
+            raise ExpressionError("The expression is empty.")
+        self.source = expression
+        compiler = _Compiler(expression)
+        self.evaluate = compiler.compile()
+        self.signals = frozenset(compiler.signals)
+        self._operators = compiler.operators
+
+    def resume(self):
+        """Continues from the state of a previous run: the `for` durations start again, the hysteresis states are kept."""
+        for operator in self._operators:
+            if isinstance(operator, HeldFor):
+                operator.since = None
+
+    def __getstate__(self):
+        # The compiled function can't be pickled: the expression is compiled again and gets back the state of its operators
+        return {"source": self.source, "operators": self._operators}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["source"])
+        for operator, saved in zip(self._operators, state["operators"]):
+            for slot in operator.__slots__:
+                setattr(operator, slot, getattr(saved, slot))
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
@@ -0,0 +1,65 @@
+"""
+    Output policies of the computations: which results are published on
+    `compute.result.<name>`. The state of the service, the downstream
+    computations and the triggers always see every result; a policy only
+    thins out the messages.
+"""
+
+# Tolerance on the interval between published results, so that e.g. a 100 Hz
+# signal limited to 10 Hz publishes every 10th sample despite rounding errors
+TIMESTAMP_TOLERANCE = 1e-9
+
+
+class OutputPolicy:
+    """
+    Filters the results of a computation. A result is published when it passes
+    all the configured filters, in this order:
+
+    -   `decimation`: only one result out of `decimation` is considered.
+    -   `max_rate_hz`: at most `max_rate_hz` results per second of data time
+        (the timestamps of the data points, not the wall clock).
+    -   `deadband`: only results differing from the last published one by more
+        than `deadband` (0 publishes on change).
+
+    With `batch`, the results passing the filters are not published one by one
+    but in the periodic `compute.results` message of the service.
+    """
+
+    def __init__(self, max_rate_hz: float = 0, decimation: int = 1, deadband: float | None = None,
+                 batch: bool = False):
+        if max_rate_hz < 0:
+            raise ValueError("max_rate_hz must be positive, or 0 for no limit.")
+        if decimation < 1 or int(decimation) != decimation:
+            raise ValueError("decimation must be an integer of at least 1.")
+        if deadband is not None and deadband < 0:
+            raise ValueError("deadband must be positive.")
+        self.min_interval = 1 / max_rate_hz if max_rate_hz else 0.0
+        self.decimation = int(decimation)
+        self.deadband = deadband
+        self.batch = bool(batch)
+        self._skip = 0
+        self._last_timestamp = None
+        self._last_value = None
+
+    def should_publish(self, value, timestamp: float) -> bool:
+        """Tells whether a new result is published, and records it if so."""
+        if self._skip:
+            self._skip -= 1
+            return False
+        self._skip = self.decimation - 1
+
+        if self._last_timestamp is not None:
+            if self.min_interval and timestamp - self._last_timestamp < self.min_interval - TIMESTAMP_TOLERANCE:
+                return False
+            if self.deadband is not None:
+                try:
+                    if abs(value - self._last_value) <= self.deadband:
+                        return False
+                except TypeError:
+                    # Not a number, e.g. a string state: publish on change
+                    if value == self._last_value:
+                        return False
+
+        self._last_timestamp = timestamp
+        self._last_value = value
+        return True
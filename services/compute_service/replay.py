@@ -0,0 +1,364 @@
+"""
+    Offline replay of the compute_service computations and triggers over a
+    recorded CAN log, to validate new definitions on real traffic.
+
+    The log (BLF, or any format read by `can.LogReader`) is decoded with the
+    frame decoders of the can_bus_service into one NumPy column per signal.
+    The computations then run over whole columns: cumulative sums for the
+    averages and integrators, differences for the derivatives, and window
+    bounds found by binary search for the moving aggregates. The computations
+    without a vectorized form, the expressions and the triggers run sample by
+    sample, on columns aligned on a common timeline.
+
+    Requires the optional `numpy` package.
+
+        python services/compute_service/replay.py can_logs/<folder>/<file>.blf --output replay.json
+"""
+import argparse
+import json
+import operator
+import os
+import sys
+import time
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import can
+import cantools
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from common.can_frames import signal_subject
+from services.can_bus_service.decoder import DecoderCache
+from services.compute_service import computations as computation_classes
+from services.compute_service.expressions import Expression
+
+# The trigger condition operators, as in the service
+OPERATORS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>=': operator.ge,
+    '<=': operator.le,
+}
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("The vectorized replay requires the numpy package.")
+
+
+def load_signals(path: str, db: cantools.database.can.Database) -> dict[str, tuple]:
+    """
+    Decodes a CAN log file into {`can.data.<SignalName>`: (timestamps, values)}
+    NumPy columns sorted by time, the signal names of the live service.
+    """
+    require_numpy()
+    decoders = DecoderCache(db)
+    columns = defaultdict(lambda: ([], []))
+    with can.LogReader(path) as reader:
+        for msg in reader:
+            if msg.is_error_frame or msg.is_remote_frame:
+                continue
+            decoder = decoders.get(msg.arbitration_id)
+            if decoder is None:
+                continue
+            try:
+                signals = decoder.decode(msg.data)
+            except Exception:
+                # Truncated or malformed frame
+                continue
+            for name, value in signals.items():
+                timestamps, values = columns[name]
+                timestamps.append(msg.timestamp)
+                values.append(value)
+
+    series = {}
+    for name, (timestamps, values) in columns.items():
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        order = np.argsort(timestamps, kind="stable")
+        series[signal_subject(name)] = (timestamps[order], np.asarray(values, dtype=np.float64)[order])
+    return series
+
+
+def _window_starts(timestamps, computation) -> "np.ndarray":
+    """Index of the oldest sample of the window of each sample, as kept by `WindowedComputation`."""
+    starts = np.searchsorted(timestamps, timestamps - computation.window, side="left")
+    return np.maximum(starts, np.arange(len(timestamps)) - computation.max_samples + 1)
+
+
+def _window_sums(values, starts) -> "np.ndarray":
+    """Sum of `values[starts[i]:i + 1]` for each i."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    return cumulative[1:] - cumulative[starts]
+
+
+def running_average(timestamps, values, computation):
+    return np.cumsum(values) / np.arange(1, len(values) + 1)
+
+
+def integrator(timestamps, values, computation):
+    dt = np.diff(timestamps)
+    areas = np.where(dt > 0, (values[1:] + values[:-1]) / 2.0 * dt, 0.0)
+    return np.concatenate(([0.0], np.cumsum(areas)))
+
+
+def differentiator(timestamps, values, computation):
+    dt = np.diff(timestamps)
+    rates = np.divide(np.diff(values), dt, out=np.zeros_like(dt), where=dt > 0)
+    return np.concatenate(([0.0], rates))
+
+
+def moving_average(timestamps, values, computation):
+    starts = _window_starts(timestamps, computation)
+    return _window_sums(values, starts) / (np.arange(1, len(values) + 1) - starts)
+
+
+def moving_std_dev(timestamps, values, computation):
+    starts = _window_starts(timestamps, computation)
+    counts = np.arange(1, len(values) + 1) - starts
+    mean = _window_sums(values, starts) / counts
+    variance = _window_sums(values * values, starts) / counts - mean * mean
+    return np.sqrt(np.maximum(variance, 0.0))
+
+
+def moving_rms(timestamps, values, computation):
+    starts = _window_starts(timestamps, computation)
+    counts = np.arange(1, len(values) + 1) - starts
+    return np.sqrt(np.maximum(_window_sums(values * values, starts) / counts, 0.0))
+
+
+def rate_of_change(timestamps, values, computation):
+    starts = _window_starts(timestamps, computation)
+    dt = timestamps - timestamps[starts]
+    return np.divide(values - values[starts], dt, out=np.zeros_like(dt), where=dt > 0)
+
+
+# Vectorized forms of the computations, the others run sample by sample
+VECTORIZED = {
+    computation_classes.RunningAverage: running_average,
+    computation_classes.Integrator: integrator,
+    computation_classes.Differentiator: differentiator,
+    computation_classes.MovingAverage: moving_average,
+    computation_classes.MovingStdDev: moving_std_dev,
+    computation_classes.MovingRMS: moving_rms,
+    computation_classes.RateOfChange: rate_of_change,
+}
+
+
+def _align(series: tuple, timeline) -> tuple:
+    """The values of a series as of each timestamp of `timeline`, and whether it had one yet."""
+    timestamps, values = series
+    indexes = np.searchsorted(timestamps, timeline, side="right") - 1
+    return values[np.maximum(indexes, 0)], indexes >= 0
+
+
+def _evaluate_rows(expression: Expression, names: list[str], columns: list, timeline) -> list:
+    """Evaluates an expression on each row of aligned columns, as the service does at each update."""
+    evaluate = expression.evaluate
+    state = {}
+    results = []
+    for timestamp, *row in zip(timeline.tolist(), *(column.tolist() for column in columns)):
+        state.update(zip(names, row))
+        results.append(evaluate(state, timestamp))
+    return results
+
+
+class ReplayResult:
+    """The result series of the computations and the activation timeline of the triggers."""
+
+    def __init__(self, series: dict[str, tuple], timelines: dict[str, list[tuple[float, bool]]]):
+        self.series = series
+        self.timelines = timelines
+
+    def to_dict(self, signals: list[str] | None = None) -> dict:
+        """Serializable results, of the given signals or all of them."""
+        names = signals if signals is not None else list(self.series)
+        return {
+            "series": {name: {"timestamps": self.series[name][0].tolist(), "values": self.series[name][1].tolist()}
+                       for name in names if name in self.series},
+            "triggers": {name: [{"timestamp": timestamp, "active": active} for timestamp, active in timeline]
+                         for name, timeline in self.timelines.items()},
+        }
+
+
+class VectorizedReplay:
+    """
+    Runs computation and trigger definitions, in the format of the
+    `compute_service` settings, over recorded signals. The results follow the
+    live service, but for the updates sharing a timestamp, which are applied
+    together before the expressions and triggers depending on them.
+    """
+
+    def __init__(self, computations: list[dict], triggers: list[dict]):
+        require_numpy()
+        entries = [self._entry(definition) for definition in computations]
+        self.computations = self._ordered(entries)
+        self.triggers = [(trigger, Expression(trigger["condition"]) if trigger.get("condition") else None)
+                         for trigger in triggers]
+
+    @staticmethod
+    def _entry(definition: dict) -> tuple[str, object, list[str]]:
+        """The (output name, computation instance, input signals) of a definition."""
+        computation_type = definition.get("computation_type")
+        if computation_type == "Expression":
+            computation_class = Expression
+        else:
+            computation_class = getattr(computation_classes, computation_type or "", None)
+            if not (isinstance(computation_class, type)
+                    and issubclass(computation_class, computation_classes.StatefulComputation)):
+                raise ValueError(f"Unknown computation type: {computation_type}")
+        computation = computation_class(**definition.get("params", {}))
+        if isinstance(computation, Expression):
+            inputs = sorted(computation.signals)
+        else:
+            inputs = [definition["source_signal"]]
+        return definition["output_name"], computation, inputs
+
+    @staticmethod
+    def _ordered(entries: list[tuple]) -> list[tuple]:
+        """Sorts the computations so that each one runs after the computations of its inputs."""
+        by_output = {entry[0]: entry for entry in entries}
+        ordered, visiting, done = [], set(), set()
+
+        def visit(entry):
+            output_name = entry[0]
+            if output_name in done:
+                return
+            if output_name in visiting:
+                raise ValueError(f"The computation of '{output_name}' depends on itself (cycle).")
+            visiting.add(output_name)
+            for input_signal in entry[2]:
+                if input_signal in by_output:
+                    visit(by_output[input_signal])
+            visiting.discard(output_name)
+            done.add(output_name)
+            ordered.append(entry)
+
+        for entry in entries:
+            visit(entry)
+        return ordered
+
+    def run(self, signals: dict[str, tuple]) -> ReplayResult:
+        """Runs the computations and triggers over {signal name: (timestamps, values)} columns."""
+        series = dict(signals)
+        for output_name, computation, inputs in self.computations:
+            result = self._compute(computation, inputs, series)
+            if result is not None:
+                series[output_name] = result
+        timelines = {trigger["name"]: self._trigger_timeline(trigger, expression, series)
+                     for trigger, expression in self.triggers}
+        return ReplayResult(series, timelines)
+
+    @staticmethod
+    def _compute(computation, inputs: list[str], series: dict[str, tuple]) -> tuple | None:
+        if any(input_signal not in series or not len(series[input_signal][0]) for input_signal in inputs):
+            # An input without any value: the computation never runs
+            return None
+        if isinstance(computation, Expression):
+            timeline = np.unique(np.concatenate([series[input_signal][0] for input_signal in inputs]))
+            aligned = [_align(series[input_signal], timeline) for input_signal in inputs]
+            complete = np.logical_and.reduce([valid for _, valid in aligned])
+            timeline = timeline[complete]
+            results = _evaluate_rows(computation, inputs, [values[complete] for values, _ in aligned], timeline)
+            return timeline, np.asarray(results)
+
+        timestamps, values = series[inputs[0]]
+        vectorized = VECTORIZED.get(type(computation))
+        if vectorized is not None:
+            return timestamps, vectorized(timestamps, values, computation)
+        update = computation.update
+        return timestamps, np.asarray([update(value, timestamp)
+                                       for timestamp, value in zip(timestamps.tolist(), values.tolist())])
+
+    @staticmethod
+    def _trigger_timeline(trigger: dict, expression: Expression | None, series: dict[str, tuple]) -> list[tuple[float, bool]]:
+        """The (timestamp, active) changes of a trigger, evaluated at each update of its signals."""
+        conditions = trigger.get("conditions", [])
+        names = {condition.get("name") for condition in conditions}
+        if expression is not None:
+            names |= expression.signals
+        present = [series[name][0] for name in names if name in series]
+        if not names:
+            # Evaluated on every update: active from the first one
+            present = [timestamps for timestamps, _ in series.values()]
+        present = [timestamps for timestamps in present if len(timestamps)]
+        if not present:
+            return []
+        timeline = np.unique(np.concatenate(present))
+        if not names:
+            return [(float(timeline[0]), True)]
+
+        aligned = {name: _align(series[name], timeline) for name in names if name in series}
+        never = (np.zeros(len(timeline)), np.zeros(len(timeline), dtype=bool))
+        met = np.ones(len(timeline), dtype=bool)
+        for condition in conditions:
+            op_func = OPERATORS.get(condition.get("operator"))
+            values, valid = aligned.get(condition.get("name"), never)
+            if op_func is None:
+                met[:] = False
+                break
+            try:
+                met &= valid & np.asarray(op_func(values, condition.get("value")), dtype=bool)
+            except TypeError:
+                # E.g. a comparison with a missing value, which fails in the service too
+                met[:] = False
+        if expression is not None:
+            inputs = sorted(expression.signals)
+            columns = [aligned.get(name, never) for name in inputs]
+            complete = np.logical_and.reduce([valid for _, valid in columns])
+            results = np.zeros(len(timeline), dtype=bool)
+            results[complete] = [bool(result) for result in _evaluate_rows(
+                expression, inputs, [values[complete] for values, _ in columns], timeline[complete])]
+            met &= results
+
+        changes = np.flatnonzero(np.diff(met.astype(np.int8), prepend=0))
+        return [(timestamp, bool(met[index])) for index, timestamp in zip(changes.tolist(), timeline[changes].tolist())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays the compute_service computations and triggers over a CAN log.")
+    parser.add_argument("log_file", help="Recorded CAN log, e.g. can_logs/<folder>/<file>.blf")
+    parser.add_argument("--dbc", default="config/db-full.dbc", help="DBC file to decode the frames")
+    parser.add_argument("--settings-file", default="config/settings.json",
+                        help="Settings with the compute_service computations and triggers")
+    parser.add_argument("--output", help="JSON file for the result series and the trigger timelines")
+    args = parser.parse_args()
+
+    with open(args.settings_file) as f:
+        settings = json.load(f).get("compute_service", {})
+    replay = VectorizedReplay(settings.get("computations", []), settings.get("triggers", []))
+
+    start = time.perf_counter()
+    signals = load_signals(args.log_file, cantools.database.load_file(args.dbc))
+    loaded = time.perf_counter()
+    result = replay.run(signals)
+    replayed = time.perf_counter()
+
+    samples = sum(len(timestamps) for timestamps, _ in signals.values())
+    first = min((timestamps[0] for timestamps, _ in signals.values() if len(timestamps)), default=0.0)
+    last = max((timestamps[-1] for timestamps, _ in signals.values() if len(timestamps)), default=0.0)
+    print(f"Decoded {samples} samples of {len(signals)} signals ({last - first:.1f} s recorded) "
+          f"in {(loaded - start) * 1000:.1f} ms, replayed in {(replayed - loaded) * 1000:.1f} ms.")
+    for output_name, _, _ in replay.computations:
+        if output_name in result.series:
+            timestamps, values = result.series[output_name]
+            print(f"  {output_name}: {len(values)} values, last {values[-1]}")
+        else:
+            print(f"  {output_name}: no input")
+    for name, timeline in result.timelines.items():
+        print(f"  trigger {name}: {sum(1 for _, active in timeline if active)} activations")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result.to_dict([output_name for output_name, _, _ in replay.computations]), f)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,31 @@
 import asyncio
 import json
+import pickle
 import sys
 import os
+import time
+import uuid
 from datetime import datetime
 
 # Add the project root to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from common.microservice import Microservice
+from common.messaging import decode_payload, decode_value
+from common.can_frames import fan_out_frame, make_frame
 
 from collections import defaultdict
 import operator
-from services.compute_service.computations import RunningAverage, Integrator, Differentiator
+from services.compute_service.computations import (
+    RunningAverage, Integrator, Differentiator, ExponentialMovingAverage, MovingAverage, MovingMin, MovingMax,
+    MovingStdDev, MovingRMS, RateOfChange, Percentile, CumulativePercentile,
+)
+from services.compute_service.expressions import Expression, ExpressionError
+from services.compute_service.output_policy import OutputPolicy
+
+# Format of the state snapshots, snapshots of another version are ignored
+SNAPSHOT_VERSION = 2
+
 
 class ComputeService(Microservice):
     def __init__(self):
@@ -19,14 +33,53 @@ class ComputeService(Microservice):
         super().__init__("compute_service")
         self.computation_state = {}
         self.triggers = []
+        # Maps a signal name to the triggers whose conditions reference it, in
+        # registration order. Triggers without conditions are evaluated on every update.
+        self.triggers_by_signal = defaultdict(list)
+        self.unconditional_triggers = []
+        # Compiled `condition` expressions of the triggers, by trigger name
+        self.trigger_expressions: dict[str, Expression] = {}
         self.status = "INITIALIZING"
         # Maps an input signal name (e.g., "can_data.PF_EngineSpeed") to a list of computation instances.
+        # An expression computation is listed under each of the signals it references.
         self.active_computations = defaultdict(list)
+        # The computations form a DAG of signals. Maps a signal to its evaluation
+        # plan: the (input signals, computation) pairs downstream of it, in
+        # topological order. Computed on first use, reset when the DAG changes.
+        self.evaluation_plans: dict[str, list[tuple[tuple[str, ...], dict]]] = {}
+        # Changes of the state since the last `compute.state.delta`, whose version is `state_version`.
+        # The versions restart at each start of the service: `state_epoch` tells the runs apart.
+        self.state_epoch = uuid.uuid4().hex
+        self.state_version = 0
+        self.changed_signals = set()
+        self.removed_signals = set()
+        self.computations_changed = False
+        self.triggers_changed = False
+        # The configuration is saved once it stopped changing for `config_save_delay` seconds
+        self.configuration_dirty = False
+        self.restoring_configuration = False
+        self.save_task: asyncio.Task | None = None
+        self.state_publisher_task: asyncio.Task | None = None
+        # Latest results of the computations with a batched output, published together on `compute.results`
+        self.pending_results = {}
+        self.pending_results_timestamp = None
+        self.results_publisher_task: asyncio.Task | None = None
+        self.snapshot_task: asyncio.Task | None = None
 
         self.available_computations = {
             "RunningAverage": RunningAverage,
             "Integrator": Integrator,
             "Differentiator": Differentiator,
+            "ExponentialMovingAverage": ExponentialMovingAverage,
+            "MovingAverage": MovingAverage,
+            "MovingMin": MovingMin,
+            "MovingMax": MovingMax,
+            "MovingStdDev": MovingStdDev,
+            "MovingRMS": MovingRMS,
+            "RateOfChange": RateOfChange,
+            "Percentile": Percentile,
+            "CumulativePercentile": CumulativePercentile,
+            "Expression": Expression,
         }
         self.operator_map = {
             '>': operator.gt,
@@ -37,19 +90,35 @@ class ComputeService(Microservice):
             '<=': operator.le,
         }
 
-    async def _save_configuration(self):
-        """Saves the current computations and triggers to the settings service."""
-        self.logger.info("Saving configuration to settings service...")
-
-        # Create serializable definitions of computations
+    def _computation_definitions(self) -> list[dict]:
+        """Returns serializable definitions of the computations, as accepted by `register_computation`."""
         comp_definitions = []
         for source_signal, computations in self.active_computations.items():
             for comp_info in computations:
-                comp_definitions.append({
+                if source_signal != comp_info['inputs'][0]:
+                    # An expression with several inputs, defined under its first one
+                    continue
+                definition = {
                     "source_signal": source_signal,
                     "computation_type": type(comp_info['instance']).__name__,
                     "output_name": comp_info['output_name']
-                })
+                }
+                if isinstance(comp_info['instance'], Expression):
+                    # Its inputs are the signals of the expression
+                    del definition["source_signal"]
+                if comp_info.get('params'):
+                    definition["params"] = comp_info['params']
+                if comp_info.get('output'):
+                    definition["output"] = comp_info['output']
+                comp_definitions.append(definition)
+        return comp_definitions
+
+    async def _save_configuration(self):
+        """Saves the current computations and triggers to the settings service."""
+        self.logger.info("Saving configuration to settings service...")
+
+        # Create serializable definitions of computations
+        comp_definitions = self._computation_definitions()
 
         # Save computations
         await self.messaging_client.publish(
@@ -72,26 +141,285 @@ class ComputeService(Microservice):
         )
         self.logger.info("Configuration save command sent.")
 
-    async def _handle_register_computation(self, source_signal: str, computation_type: str, output_name: str, reply: str = ""):
-        """Command handler to dynamically register a new computation."""
+    def _configuration_changed(self):
+        """
+        Schedules the save of the configuration. Every change postpones it, so
+        that a burst of registrations is saved once, after a quiet period.
+        """
+        if self.restoring_configuration:
+            return
+        self.configuration_dirty = True
+        if self.save_task:
+            self.save_task.cancel()
+        self.save_task = asyncio.create_task(self._save_configuration_later())
+
+    async def _save_configuration_later(self):
+        await asyncio.sleep(self.settings.get("config_save_delay", 2.0))
+        self.save_task = None
+        await self._flush_configuration()
+
+    async def _flush_configuration(self):
+        """Saves the configuration if it changed since it was last saved."""
+        if self.configuration_dirty:
+            self.configuration_dirty = False
+            await self._save_configuration()
+
+    async def _restore_configuration(self):
+        """Registers the computations and triggers persisted in the settings, without saving them back."""
+        self.logger.info("Loading persisted configuration from settings...")
+        start = time.perf_counter()
+        self.restoring_configuration = True
+        try:
+            persisted_computations = self.settings.get("computations", [])
+            for comp_def in persisted_computations:
+                await self._handle_register_computation(**comp_def)
+
+            persisted_triggers = self.settings.get("triggers", [])
+            for trigger_def in persisted_triggers:
+                await self._handle_register_trigger(trigger=trigger_def)
+        finally:
+            self.restoring_configuration = False
+            # The trigger index is built once for all the restored triggers
+            self._rebuild_trigger_index()
+        self.logger.info("Loaded %d computations and %d triggers in %.1f ms.", len(persisted_computations),
+                         len(persisted_triggers), (time.perf_counter() - start) * 1000)
+
+    def _snapshot(self) -> bytes:
+        """
+        Serializes the state of the computations, their values and the
+        activity of the triggers. The input signals are not saved: they would
+        be stale at the next start. Pickling runs on the event loop, in one go,
+        so that the snapshot is consistent.
+        """
+        computations = {comp_info["output_name"]: (comp_info["params"], comp_info["instance"])
+                        for computations in self.active_computations.values() for comp_info in computations}
+        state = self.computation_state
+        triggers = {trigger["name"]: {"is_currently_active": trigger.get("is_currently_active", False),
+                                      "last_event_timestamp": trigger.get("last_event_timestamp")}
+                    for trigger in self.triggers}
+        return pickle.dumps({
+            "version": SNAPSHOT_VERSION,
+            "timestamp": time.time(),
+            "computation_state": {name: state[name] for name in computations if name in state},
+            "computations": computations,
+            "triggers": triggers,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # The snapshots are pickles: loading one runs the code it references, so
+    # whoever can write the snapshot file can run code in the service. They are
+    # only readable and writable by the user of the service, and a snapshot
+    # that another user could have written is not loaded.
+
+    @staticmethod
+    def _write_snapshot(path: str, data: bytes):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        # Created with restrictive permissions, then renamed over the previous snapshot
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_snapshot(path: str) -> dict:
+        with open(path, 'rb') as f:
+            info = os.fstat(f.fileno())
+            if info.st_mode & 0o022 or (hasattr(os, "getuid") and info.st_uid != os.getuid()):
+                raise PermissionError("the file is writable by other users")
+            return pickle.load(f)
+
+    async def _save_snapshot(self):
+        """Writes a snapshot to `snapshot_path`, the file is written in a thread."""
+        path = self.settings.get("snapshot_path", "snapshots/compute_service.pickle")
+        start = time.perf_counter()
+        try:
+            data = self._snapshot()
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            self.logger.error("Could not take a snapshot of the state: %s", e)
+            return
+        pickled = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write_snapshot, path, data)
+        except OSError as e:
+            self.logger.error("Could not write the snapshot '%s': %s", path, e)
+            return
+        self.logger.debug("Snapshot of %d bytes pickled in %.2f ms and written in %.2f ms.", len(data),
+                          (pickled - start) * 1000, (time.perf_counter() - pickled) * 1000)
+
+    async def _snapshot_loop(self, interval: float):
+        """Saves a snapshot every `interval` seconds."""
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                await self._save_snapshot()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.logger.error("Error in snapshot loop: %s", e, exc_info=True)
+
+    async def _restore_snapshot(self):
+        """
+        Restores the last snapshot after the configuration was registered: the
+        computations registered with the same type and parameters continue
+        from their saved state and value, e.g. an Integrator from its total.
+        The input signals stay without a value until fresh samples arrive, so
+        that no trigger or expression fires on the values of the last run.
+        """
+        path = self.settings.get("snapshot_path", "snapshots/compute_service.pickle")
+        start = time.perf_counter()
+        try:
+            snapshot = await asyncio.to_thread(self._read_snapshot, path)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            # Truncated file, computation class renamed...
+            self.logger.warning("Ignoring the snapshot '%s', which can't be read: %s", path, e)
+            return
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            self.logger.warning("Ignoring the snapshot '%s' of another version.", path)
+            return
+
+        restored = set()
+        saved_computations = snapshot["computations"]
+        for computations in self.active_computations.values():
+            for comp_info in computations:
+                saved = saved_computations.get(comp_info["output_name"])
+                if saved is None:
+                    continue
+                params, instance = saved
+                if params == comp_info["params"] and type(instance) is type(comp_info["instance"]):
+                    # The accumulated state is kept, not the time anchors of the last run
+                    instance.resume()
+                    comp_info["instance"] = instance
+                    restored.add(comp_info["output_name"])
+
+        saved_state = snapshot["computation_state"]
+        values = {name: saved_state[name] for name in restored if name in saved_state}
+        self.computation_state.update(values)
+        self.changed_signals.update(values)
+        for trigger in self.triggers:
+            flags = snapshot["triggers"].get(trigger["name"])
+            if flags:
+                trigger.update(flags)
+                self.triggers_changed = True
+        self.logger.info("Restored %d computations from the snapshot of %s in %.1f ms.", len(restored),
+                         datetime.fromtimestamp(snapshot["timestamp"]).isoformat(timespec="seconds"),
+                         (time.perf_counter() - start) * 1000)
+
+    def _rebuild_trigger_index(self):
+        """Rebuilds the signal -> triggers index after the triggers changed."""
+        self.triggers_by_signal = defaultdict(list)
+        self.unconditional_triggers = []
+        for trigger in self.triggers:
+            signal_names = {condition.get("name") for condition in trigger.get("conditions", [])}
+            if trigger.get("name") in self.trigger_expressions:
+                signal_names.update(self.trigger_expressions[trigger["name"]].signals)
+            if not signal_names:
+                self.unconditional_triggers.append(trigger)
+            for signal_name in signal_names:
+                self.triggers_by_signal[signal_name].append(trigger)
+
+    def _find_computation(self, output_name: str) -> tuple[str, dict] | None:
+        """Returns the (source_signal, computation) producing a signal, if any."""
+        for source_signal, computations in self.active_computations.items():
+            for comp_info in computations:
+                if comp_info["output_name"] == output_name:
+                    return source_signal, comp_info
+        return None
+
+    def _is_downstream(self, signal_name: str, target: str) -> bool:
+        """Tells whether `target` is computed, directly or not, from `signal_name`."""
+        stack, seen = [signal_name], set()
+        while stack:
+            current = stack.pop()
+            if current == target:
+                return True
+            if current in seen:
+                continue
+            seen.add(current)
+            stack.extend(comp_info["output_name"] for comp_info in self.active_computations.get(current, ()))
+        return False
+
+    def _evaluation_plan(self, signal_name: str) -> list[tuple[tuple[str, ...], dict]]:
+        """Returns the computations to run, in order, when a signal is updated."""
+        plan = self.evaluation_plans.get(signal_name)
+        if plan is None:
+            # Reverse post-order of a depth-first search: a topological order of the downstream signals
+            post_order, visited, producers = [], set(), {}
+
+            def visit(current: str):
+                visited.add(current)
+                # In reverse, so that the computations of a signal keep their registration order
+                for comp_info in reversed(self.active_computations.get(current, ())):
+                    producers[comp_info["output_name"]] = comp_info
+                    if comp_info["output_name"] not in visited:
+                        visit(comp_info["output_name"])
+                post_order.append(current)
+
+            visit(signal_name)
+            # Each computation runs once, at the position of its output: after all of its inputs
+            plan = [(producers[output]["inputs"], producers[output]) for output in reversed(post_order)
+                    if output in producers]
+            self.evaluation_plans[signal_name] = plan
+        return plan
+
+    async def _handle_register_computation(self, source_signal: str = "", computation_type: str = "",
+                                           output_name: str = "", params: dict | None = None,
+                                           output: dict | None = None, reply: str = ""):
+        """
+        Command handler to dynamically register a new computation. `params` are
+        passed to the computation class, e.g. {"window": 5} for a MovingAverage.
+        `output` configures the publishing of its results (see `OutputPolicy`),
+        e.g. {"max_rate_hz": 10}; every result is published by default.
+
+        An "Expression" computation derives a signal from the signals referenced
+        by its {"expression": ...} parameter, it doesn't take a `source_signal`.
+        """
         response = {}
-        if not all([source_signal, computation_type, output_name]):
+        params = params or {}
+        output = output or {}
+        if not computation_type or not output_name or not (source_signal or computation_type == "Expression"):
             response = {"status": "error", "message": "Missing 'source_signal', 'computation_type', or 'output_name'."}
         elif computation_type not in self.available_computations:
             response = {"status": "error", "message": f"Unknown computation type: {computation_type}"}
+        elif not isinstance(params, dict):
+            response = {"status": "error", "message": "'params' must be an object."}
+        elif not isinstance(output, dict):
+            response = {"status": "error", "message": "'output' must be an object."}
+        elif self._find_computation(output_name):
+            response = {"status": "error", "message": f"The output '{output_name}' is already computed."}
         else:
             computation_class = self.available_computations[computation_type]
-            computation_instance = computation_class()
-            computation_to_store = {"instance": computation_instance, "output_name": output_name}
-            self.active_computations[source_signal].append(computation_to_store)
-            self.logger.info(f"Registered new computation: '{output_name}' ({computation_type}) on source '{source_signal}'.")
-            response = {"status": "ok", "message": "Computation registered successfully."}
+            try:
+                computation_instance = computation_class(**params)
+                # Without output options, every result is published
+                policy = OutputPolicy(**output) if output else None
+            except (TypeError, ValueError) as e:
+                response = {"status": "error", "message": f"Invalid parameters for {computation_type}: {e}"}
+            else:
+                if isinstance(computation_instance, Expression):
+                    inputs = tuple(sorted(computation_instance.signals))
+                else:
+                    inputs = (source_signal,)
+                cyclic_inputs = [signal for signal in inputs if self._is_downstream(output_name, signal)]
+                if cyclic_inputs:
+                    response = {"status": "error", "message": f"'{output_name}' can't be computed from '{cyclic_inputs[0]}', which depends on it (cycle)."}
+                else:
+                    computation_to_store = {"instance": computation_instance, "output_name": output_name, "params": params,
+                                            "output": output, "policy": policy, "inputs": inputs}
+                    for input_signal in inputs:
+                        self.active_computations[input_signal].append(computation_to_store)
+                    self.evaluation_plans.clear()
+                    self.computations_changed = True
+                    self.logger.info(f"Registered new computation: '{output_name}' ({computation_type}) on '{', '.join(inputs)}'.")
+                    response = {"status": "ok", "message": "Computation registered successfully."}
 
         if reply:
             await self.messaging_client.publish(reply, json.dumps(response).encode())
 
         if response.get("status") == "ok":
-            await self._save_configuration()
+            self._configuration_changed()
 
     async def _publish_status(self, status: str | None = None):
         """Publishes the service's current status."""
@@ -105,9 +433,16 @@ class ComputeService(Microservice):
     async def _handle_register_trigger(self, trigger: dict, reply: str = ""):
         """Command handler to dynamically register a new trigger."""
         response = {}
-        if not trigger or 'name' not in trigger or 'conditions' not in trigger or 'action' not in trigger:
-            response = {"status": "error", "message": "Invalid trigger structure. Required fields: name, conditions, action."}
-        else:
+        expression = None
+        if not trigger or 'name' not in trigger or 'action' not in trigger or not ('conditions' in trigger or 'condition' in trigger):
+            response = {"status": "error", "message": "Invalid trigger structure. Required fields: name, conditions or condition, action."}
+        elif trigger.get('condition'):
+            try:
+                expression = Expression(trigger['condition'])
+            except ExpressionError as e:
+                response = {"status": "error", "message": f"Invalid condition of trigger '{trigger['name']}': {e}"}
+
+        if not response:
             # Initialize the trigger's state
             trigger['is_currently_active'] = False
             trigger['last_event_timestamp'] = None
@@ -115,6 +450,13 @@ class ComputeService(Microservice):
             # Remove any existing trigger with the same name and add the new one
             self.triggers = [t for t in self.triggers if t.get('name') != trigger.get('name')]
             self.triggers.append(trigger)
+            if expression:
+                self.trigger_expressions[trigger['name']] = expression
+            else:
+                self.trigger_expressions.pop(trigger['name'], None)
+            if not self.restoring_configuration:
+                self._rebuild_trigger_index()
+            self.triggers_changed = True
 
             self.logger.info(f"Registered trigger: {trigger.get('name')}")
             response = {"status": "ok", "message": "Trigger registered successfully."}
@@ -123,7 +465,7 @@ class ComputeService(Microservice):
             await self.messaging_client.publish(reply, json.dumps(response).encode())
 
         if response.get("status") == "ok":
-            await self._save_configuration()
+            self._configuration_changed()
 
     async def _handle_unregister_computation(self, output_name: str, reply: str = ""):
         """Command handler to unregister a computation by its output name."""
@@ -132,6 +474,7 @@ class ComputeService(Microservice):
             response = {"status": "error", "message": "Missing 'output_name'."}
         else:
             found = False
+            # An expression is listed under each of its inputs
             for source_signal, computations in self.active_computations.items():
                 initial_len = len(computations)
                 self.active_computations[source_signal] = [
@@ -139,11 +482,15 @@ class ComputeService(Microservice):
                 ]
                 if len(self.active_computations[source_signal]) < initial_len:
                     found = True
-                    break
+            if found:
+                self.evaluation_plans.clear()
+                self.computations_changed = True
 
             if found:
                 if output_name in self.computation_state:
                     del self.computation_state[output_name]
+                    self.changed_signals.discard(output_name)
+                    self.removed_signals.add(output_name)
                 self.logger.info(f"Unregistered computation with output: {output_name}")
                 response = {"status": "ok", "message": "Computation unregistered."}
             else:
@@ -153,7 +500,7 @@ class ComputeService(Microservice):
             await self.messaging_client.publish(reply, json.dumps(response).encode())
 
         if response.get("status") == "ok":
-            await self._save_configuration()
+            self._configuration_changed()
 
     async def _handle_unregister_trigger(self, name: str, reply: str = ""):
         """Command handler to unregister a trigger by its name."""
@@ -164,6 +511,9 @@ class ComputeService(Microservice):
             initial_len = len(self.triggers)
             self.triggers = [t for t in self.triggers if t.get('name') != name]
             if len(self.triggers) < initial_len:
+                self.trigger_expressions.pop(name, None)
+                self._rebuild_trigger_index()
+                self.triggers_changed = True
                 self.logger.info(f"Unregistered trigger: {name}")
                 response = {"status": "ok", "message": "Trigger unregistered."}
             else:
@@ -173,7 +523,7 @@ class ComputeService(Microservice):
             await self.messaging_client.publish(reply, json.dumps(response).encode())
 
         if response.get("status") == "ok":
-            await self._save_configuration()
+            self._configuration_changed()
 
     async def _handle_get_available_signals_request(self, reply: str = "", **kwargs):
         """Returns a list of all available signals for computation."""
@@ -193,50 +543,83 @@ class ComputeService(Microservice):
         self.command_handler.register_command("register_trigger", self._handle_register_trigger)
         self.command_handler.register_command("unregister_trigger", self._handle_unregister_trigger)
         self.command_handler.register_command("get_available_signals", self._handle_get_available_signals_request)
+        self.command_handler.register_command("get_state", self._handle_get_state_request)
         await self._subscribe_to_commands()
 
-        # Load persisted configuration
-        self.logger.info("Loading persisted configuration from settings...")
-        persisted_computations = self.settings.get("computations", [])
-        for comp_def in persisted_computations:
-            await self._handle_register_computation(**comp_def)
-
-        persisted_triggers = self.settings.get("triggers", [])
-        for trigger_def in persisted_triggers:
-            await self._handle_register_trigger(trigger=trigger_def)
-        self.logger.info(f"Loaded {len(persisted_computations)} computations and {len(persisted_triggers)} triggers.")
+        await self._restore_configuration()
+        snapshot_interval = self.settings.get("snapshot_interval", 10.0)
+        if snapshot_interval:
+            await self._restore_snapshot()
 
         # Subscribe to all individual data points from all services
         await self.messaging_client.subscribe("*.data.>", self._nats_data_handler())
         self.logger.info("Subscribed to all data points via '*.data.>'.")
 
+        # CAN frames published in "frame"/"window" mode are fanned out to the per-signal view
+        await self.messaging_client.subscribe("can.frame.>", self._nats_frame_handler)
+        self.logger.info("Subscribed to batched CAN frames via 'can.frame.>'.")
+
         # Start the periodic state publisher
-        self.state_publisher_task = asyncio.create_task(self._publish_full_state_loop())
+        self.state_publisher_task = asyncio.create_task(self._publish_state_loop())
+        self.results_publisher_task = asyncio.create_task(self._publish_results_loop())
+        if snapshot_interval:
+            self.snapshot_task = asyncio.create_task(self._snapshot_loop(snapshot_interval))
 
         await self._publish_status("RUNNING")
 
-    async def _publish_full_state_loop(self):
-        """Periodically publishes the full state of the service for the UI."""
+    def _state_snapshot(self) -> dict:
+        """Returns the full state of the service, at the current state version."""
+        return {
+            "epoch": self.state_epoch,
+            "version": self.state_version,
+            "computation_state": self.computation_state,
+            "triggers": self.triggers,
+            "computations": self._computation_definitions(),
+        }
+
+    def _take_state_delta(self) -> dict | None:
+        """
+        Returns the changes since the previous delta as a new state version, or
+        None if nothing changed. Values are absolute, so that applying a delta
+        on a snapshot that already contains some of its changes is harmless.
+        """
+        if not (self.changed_signals or self.removed_signals or self.computations_changed or self.triggers_changed):
+            return None
+        self.state_version += 1
+        state = self.computation_state
+        delta = {
+            "epoch": self.state_epoch,
+            "version": self.state_version,
+            "changed": {name: state[name] for name in self.changed_signals if name in state},
+            "removed": list(self.removed_signals),
+        }
+        if self.triggers_changed:
+            delta["triggers"] = self.triggers
+        if self.computations_changed:
+            delta["computations"] = self._computation_definitions()
+        self.changed_signals = set()
+        self.removed_signals = set()
+        self.computations_changed = self.triggers_changed = False
+        return delta
+
+    async def _handle_get_state_request(self, reply: str = "", **kwargs):
+        """Replies with a full snapshot of the state, to which the following `compute.state.delta` apply."""
+        if reply:
+            await self.messaging_client.publish(reply, json.dumps(self._state_snapshot()).encode())
+
+    async def _publish_state_loop(self):
+        """
+        Periodically publishes on `compute.state.delta` the signals that changed
+        since the previous publication, for the UI. Nothing is published when
+        nothing changed. Clients get a full snapshot with the `get_state` command.
+        """
         publish_interval = self.settings.get("ui_publish_interval", 1.0)
         while True:
             try:
-                # Create serializable definitions of computations for the UI
-                comp_definitions = []
-                for source_signal, computations in self.active_computations.items():
-                    for comp_info in computations:
-                        comp_definitions.append({
-                            "source_signal": source_signal,
-                            "computation_type": type(comp_info['instance']).__name__,
-                            "output_name": comp_info['output_name']
-                        })
-
-                payload = {
-                    "computation_state": self.computation_state,
-                    "triggers": self.triggers,
-                    "computations": comp_definitions # Add definitions to the payload
-                }
-                await self.messaging_client.publish(f"compute.state.full", json.dumps(payload).encode())
                 await asyncio.sleep(publish_interval)
+                delta = self._take_state_delta()
+                if delta:
+                    await self.messaging_client.publish("compute.state.delta", json.dumps(delta).encode())
             except asyncio.CancelledError:
                 self.logger.info("State publisher task cancelled.")
                 break
@@ -244,80 +627,111 @@ class ComputeService(Microservice):
                 self.logger.error(f"Error in state publisher loop: {e}", exc_info=True)
                 await asyncio.sleep(publish_interval) # Wait before retrying
 
+    async def _publish_pending_results(self):
+        """Publishes the batched results on `compute.results`, in the format of a CAN frame message."""
+        if not self.pending_results:
+            return
+        results, self.pending_results = self.pending_results, {}
+        await self.publish_object("compute.results", make_frame(results, self.pending_results_timestamp))
+
+    async def _publish_results_loop(self):
+        """Publishes the batched results every `result_batch_interval` seconds."""
+        publish_interval = self.settings.get("result_batch_interval", 0.1)
+        while True:
+            try:
+                await asyncio.sleep(publish_interval)
+                await self._publish_pending_results()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.logger.error("Error in results publisher loop: %s", e, exc_info=True)
+
     def _nats_data_handler(self):
         """
-        Returns an async function to handle incoming NATS messages. It attempts
-        to parse messages in two formats, in order:
-        1. A JSON object like: {"value": <data>, "ts": <optional_timestamp>}
-        2. A raw, float-convertible value.
+        Returns an async function to handle incoming NATS messages. The payload
+        is decoded with the codec announced in the message headers (JSON when
+        there is none), either as a data point like {"value": <data>, "ts": <optional_timestamp>}
+        or as a bare value.
         """
         async def handler(msg):
             signal_name = msg.subject
-
-            # --- Try parsing as JSON dictionary ---
             try:
-                data = json.loads(msg.data.decode())
-                if isinstance(data, dict) and 'value' in data:
-                    value = data['value']
-                    timestamp = data.get('ts', datetime.now().timestamp())
-                    await self._process_data(signal_name, value, timestamp)
-                    return  # Success, we are done.
-            except (json.JSONDecodeError, UnicodeDecodeError):
-                # This is expected for raw values, so we fall through.
-                pass
-            except Exception as e:
-                # Any other exception during JSON parsing is a real error.
-                self.logger.error(f"Unexpected error parsing JSON on '{signal_name}': {e}")
+                value, timestamp = decode_value(msg)
+            except Exception:
+                self.logger.warning("Message on '%s' is not in a recognized format: %r", signal_name, msg.data)
                 return
 
-            # --- If JSON parsing did not return, try parsing as raw float ---
-            try:
-                value = float(msg.data.decode())
+            if timestamp is None:
                 timestamp = datetime.now().timestamp()
-                await self._process_data(signal_name, value, timestamp)
-                return  # Success, we are done.
-            except (ValueError, UnicodeDecodeError):
-                # This means it's not a valid float either.
-                pass
-
-            # --- If all parsing attempts fail ---
-            self.logger.warning(f"Message on '{signal_name}' is not in a recognized format: {msg.data!r}")
+            await self._process_data(signal_name, value, timestamp)
 
         return handler
 
+    async def _nats_frame_handler(self, msg):
+        """Handles a batched CAN frame by processing each of its signals as `can.data.<Signal>`."""
+        try:
+            frame = decode_payload(msg)
+        except Exception as e:
+            self.logger.warning("Frame on '%s' is not in a recognized format: %s", msg.subject, e)
+            return
+
+        for signal_name, value, timestamp in fan_out_frame(frame):
+            await self._process_data(signal_name, value, timestamp if timestamp is not None else datetime.now().timestamp())
+
     async def _process_data(self, signal_name: str, value: any, timestamp: float):
         """
-        Processes a single piece of data, updates state, and triggers further computations.
-        This is the core of the chaining mechanism.
+        Processes a single piece of data, updates state, and runs the computations
+        downstream of it. This is the core of the chaining mechanism.
         """
-        self.logger.debug(f"Processing: {signal_name} = {value}")
+        self.logger.debug("Processing: %s = %s", signal_name, value)
 
         # 1. Update the global computation state
         self.computation_state[signal_name] = value
-
-        # 2. Find and execute all computations that use this signal as an input
-        if signal_name in self.active_computations:
-            for comp_info in self.active_computations[signal_name]:
-                instance = comp_info["instance"]
-                output_name = comp_info["output_name"]
-
-                try:
+        updated = [signal_name]
+
+        # 2. Run the computations downstream of this signal, once each, in
+        # topological order: a computation runs after the ones producing its inputs.
+        plan = self.evaluation_plans.get(signal_name)
+        if plan is None:
+            plan = self._evaluation_plan(signal_name)
+        for inputs, comp_info in plan:
+            for input_signal in inputs:
+                if input_signal in updated:
+                    break
+            else:
+                # None of its inputs was updated, e.g. the upstream computation failed
+                continue
+            output_name = comp_info["output_name"]
+            instance = comp_info["instance"]
+            try:
+                if isinstance(instance, Expression):
+                    new_value = instance.evaluate(self.computation_state, timestamp)
+                else:
                     # The computation's update method performs the calculation
-                    new_value = instance.update(value, timestamp)
-
-                    # Publish the individual result
-                    result_payload = {"value": new_value, "timestamp": datetime.now().isoformat()}
-                    await self.messaging_client.publish(f"compute.result.{output_name}", json.dumps(result_payload).encode())
-
-                    # 3. Recursively call _process_data with the new result
-                    # This is what enables chaining computations.
-                    await self._process_data(output_name, new_value, timestamp)
+                    new_value = instance.update(self.computation_state[inputs[0]], timestamp)
+                self.computation_state[output_name] = new_value
+                updated.append(output_name)
+
+                # Publish the result, as allowed by the output policy of the computation
+                policy = comp_info.get("policy")
+                if policy is None:
+                    await self.publish_value(f"compute.result.{output_name}", new_value, timestamp)
+                elif policy.should_publish(new_value, timestamp):
+                    if policy.batch:
+                        self.pending_results[output_name] = new_value
+                        self.pending_results_timestamp = timestamp
+                    else:
+                        await self.publish_value(f"compute.result.{output_name}", new_value, timestamp)
+            except KeyError:
+                # An input of the expression has no value yet
+                continue
+            except Exception as e:
+                self.logger.error("Error running computation '%s': %s", output_name, e, exc_info=True)
 
-                except Exception as e:
-                    self.logger.error(f"Error running computation '{output_name}': {e}", exc_info=True)
+        self.changed_signals.update(updated)
 
-        # 4. After all processing for this data point is done, evaluate triggers
-        await self._evaluate_triggers()
+        # 3. After all processing for this data point is done, evaluate the triggers that depend on it
+        await self._evaluate_triggers(updated, timestamp)
 
 
     async def _execute_trigger_action(self, trigger_name: str, action: dict):
@@ -334,14 +748,49 @@ class ComputeService(Microservice):
 
             payload = action.get("payload", {"trigger_name": trigger_name, "timestamp": datetime.now().isoformat()})
             await self.messaging_client.publish(subject, json.dumps(payload).encode())
-            self.logger.info(f"Trigger '{trigger_name}' action: Published to {subject}")
+            self.logger.info("Trigger '%s' action: Published to %s", trigger_name, subject)
         # Other action types could be implemented here
 
-    async def _evaluate_triggers(self):
-        """Evaluate all registered triggers against the current computation state."""
-        for trigger in self.triggers:
+    def _triggers_to_evaluate(self, signal_names: list[str] | None) -> list:
+        if signal_names is None:
+            return self.triggers
+        if len(signal_names) == 1:
+            indexed = self.triggers_by_signal.get(signal_names[0])
+            if not indexed:
+                return self.unconditional_triggers
+            if not self.unconditional_triggers:
+                return indexed
+            return indexed + self.unconditional_triggers
+        # Each trigger once, even if several of its signals were updated
+        triggers = {}
+        for signal_name in signal_names:
+            for trigger in self.triggers_by_signal.get(signal_name, ()):
+                triggers[id(trigger)] = trigger
+        for trigger in self.unconditional_triggers:
+            triggers[id(trigger)] = trigger
+        return list(triggers.values())
+
+    async def _evaluate_triggers(self, signal_names: list[str] | None = None, timestamp: float | None = None):
+        """
+        Evaluate the triggers against the current computation state: the ones
+        whose conditions reference one of `signal_names` and the ones without
+        conditions, or all registered triggers when no signal is given.
+        `timestamp` is the time of the data, for the durations of the condition
+        expressions (now by default).
+        """
+        if timestamp is None:
+            timestamp = datetime.now().timestamp()
+        for trigger in self._triggers_to_evaluate(signal_names):
             try:
                 all_conditions_met = True
+                expression = self.trigger_expressions.get(trigger['name'])
+                if expression is not None:
+                    # Evaluated at every update, even with unmet conditions, to keep the state of its `for` durations
+                    try:
+                        all_conditions_met = bool(expression.evaluate(self.computation_state, timestamp))
+                    except KeyError:
+                        # A signal of the expression has no value yet
+                        all_conditions_met = False
                 for condition in trigger.get("conditions", []):
                     signal_name = condition.get("name")
                     op_func = self.operator_map.get(condition.get("operator"))
@@ -361,12 +810,14 @@ class ComputeService(Microservice):
                 # State change detection
                 if all_conditions_met and not was_active:
                     trigger['is_currently_active'] = True
+                    self.triggers_changed = True
                     trigger['last_event_timestamp'] = datetime.now().isoformat()
                     self.logger.info(f"Trigger '{trigger['name']}' became ACTIVE.")
                     await self._execute_trigger_action(trigger['name'], trigger['action'].get('on_become_active'))
 
                 elif not all_conditions_met and was_active:
                     trigger['is_currently_active'] = False
+                    self.triggers_changed = True
                     trigger['last_event_timestamp'] = datetime.now().isoformat()
                     self.logger.info(f"Trigger '{trigger['name']}' became INACTIVE.")
                     await self._execute_trigger_action(trigger['name'], trigger['action'].get('on_become_inactive'))
@@ -386,5 +837,19 @@ class ComputeService(Microservice):
 
         if self.state_publisher_task:
             self.state_publisher_task.cancel()
+        if self.results_publisher_task:
+            self.results_publisher_task.cancel()
+            await self._publish_pending_results()
+        if self.snapshot_task:
+            # The last snapshot, for a warm restart
+            self.snapshot_task.cancel()
+            self.snapshot_task = None
+            await self._save_snapshot()
+
+        # Don't lose the changes still waiting for their save
+        if self.save_task:
+            self.save_task.cancel()
+            self.save_task = None
+        await self._flush_configuration()
 
         await self._publish_status("STOPPING")
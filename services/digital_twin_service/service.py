@@ -10,6 +10,8 @@ import logging
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from common.microservice import Microservice
+from common.messaging import PublishBatch, decode_payload, decode_value
+from common.can_frames import fan_out_frame
 from services.digital_twin_service.excavator_model import Excavator
 
 class DigitalTwinService(Microservice):
@@ -53,6 +55,8 @@ class DigitalTwinService(Microservice):
         # Subscribe to all CAN data signals
         await self.messaging_client.subscribe("can.data.>", self._handle_can_data)
         self.logger.info("Subscribed to all CAN data signals via 'can.data.>'")
+        await self.messaging_client.subscribe("can.frame.>", self._handle_can_frame)
+        self.logger.info("Subscribed to batched CAN frames via 'can.frame.>'")
 
         self.command_handler.register_command("get_height", self._handle_get_height)
         self.command_handler.register_command("get_radius", self._handle_get_radius)
@@ -75,33 +79,43 @@ class DigitalTwinService(Microservice):
             sensor_name = msg.subject.split('.')[-1]
 
             if sensor_name in self.sensor_state:
-                # The new payload is a JSON object with a "value" key
-                data = json.loads(msg.data.decode())
-                value = data.get("value")
+                # The payload is a data point with a "value" key
+                value, _ = decode_value(msg)
                 if value is not None:
                     self.sensor_state[sensor_name] = value
-                    self.logger.debug(f"Updated sensor {sensor_name} to {value}")
+                    self.logger.debug("Updated sensor %s to %s", sensor_name, value)
                 else:
-                    self.logger.warning(f"Received message for {sensor_name} but 'value' key was missing.")
-        except json.JSONDecodeError:
-            self.logger.error(f"Failed to decode JSON from subject '{msg.subject}'")
+                    self.logger.warning("Received message for %s but 'value' key was missing.", sensor_name)
+        except (json.JSONDecodeError, KeyError):
+            self.logger.error(f"Failed to decode data point from subject '{msg.subject}'")
         except IndexError:
             self.logger.error(f"Could not extract sensor name from subject '{msg.subject}'")
         except Exception as e:
             self.logger.error(f"Error handling CAN data for subject '{msg.subject}': {e}", exc_info=True)
 
-    async def _publish_data_recursively(self, base_subject: str, data: dict, timestamp: float):
+    async def _handle_can_frame(self, msg):
+        """Handles a batched CAN frame and updates the sensor state with each of its signals."""
+        try:
+            for subject, value, _ in fan_out_frame(decode_payload(msg)):
+                sensor_name = subject.split('.')[-1]
+                if sensor_name in self.sensor_state and value is not None:
+                    self.sensor_state[sensor_name] = value
+        except json.JSONDecodeError:
+            self.logger.error(f"Failed to decode JSON from subject '{msg.subject}'")
+        except Exception as e:
+            self.logger.error(f"Error handling CAN frame for subject '{msg.subject}': {e}", exc_info=True)
+
+    async def _publish_data_recursively(self, batch: PublishBatch, base_subject: str, data: dict, timestamp: float):
         """Recursively publishes nested dictionary data."""
         for key, value in data.items():
             new_subject = f"{base_subject}.{key}"
             if isinstance(value, dict):
-                await self._publish_data_recursively(new_subject, value, timestamp)
+                await self._publish_data_recursively(batch, new_subject, value, timestamp)
             else:
                 try:
-                    payload = {"value": value, "ts": timestamp}
-                    await self.messaging_client.publish(new_subject, json.dumps(payload).encode())
+                    await batch.publish_value(new_subject, value, timestamp)
                 except (ValueError, TypeError):
-                    self.logger.warning(f"Could not convert value for '{new_subject}' to float. Skipping.")
+                    self.logger.warning("Could not convert value for '%s' to float. Skipping.", new_subject)
 
     async def _publish_data(self):
         update_interval = self.settings.get("update_interval", 1)
@@ -115,8 +129,9 @@ class DigitalTwinService(Microservice):
                     # Get a single timestamp for this entire update cycle
                     timestamp = datetime.now().timestamp()
 
-                    # Recursively publish all data points
-                    await self._publish_data_recursively("digital_twin.data", model_data, timestamp)
+                    # Recursively publish all data points in one batch
+                    async with self.publish_batch() as batch:
+                        await self._publish_data_recursively(batch, "digital_twin.data", model_data, timestamp)
 
                     self.logger.debug("Finished publishing digital twin data.")
 
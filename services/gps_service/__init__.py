@@ -1 +1,4 @@
 # This file makes the 'gps_service' directory a Python package.
+
+# Services this service needs to be ready before it is started by the manager.
+DEPENDENCIES = ["settings_service", "owa_service"]
@@ -10,6 +10,7 @@ from datetime import datetime, timezone
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from common.microservice import Microservice
+from common.messaging import PublishBatch
 from common.owa_errors import OwaErrors
 import common.utils as utils
 from nats.aio.msg import Msg
@@ -119,10 +120,10 @@ class GpsService(Microservice):
 
     async def _handle_get_current_position_request(self, msg: Msg):
         """Replies with the last known GPS position."""
-        self.logger.info(f"Received request for current position on subject: {msg.subject}")
+        self.logger.debug("Received request for current position on subject: %s", msg.subject)
         if msg.reply:
             await self.messaging_client.publish(msg.reply, json.dumps(self.last_payload).encode())
-            self.logger.info(f"Replied to {msg.reply} with current position.")
+            self.logger.debug("Replied to %s with current position.", msg.reply)
 
     async def _stop_logic(self):
         """Stops the GPS service logic."""
@@ -162,18 +163,18 @@ class GpsService(Microservice):
             sv_data.append({"SV_Id": 0, "SV_Elevation": 0, "SV_Azimuth": 0, "SV_SNR": 0})
         return {"SV_InView": sv_in_view, "SV": sv_data}
 
-    async def _publish_data_recursively(self, base_subject: str, data: dict, timestamp: float):
+    async def _publish_data_recursively(self, batch: PublishBatch, base_subject: str, data: dict, timestamp: float):
         """Recursively publishes nested dictionary data."""
         for key, value in data.items():
             new_subject = f"{base_subject}.{key}"
             if isinstance(value, dict):
-                await self._publish_data_recursively(new_subject, value, timestamp)
+                await self._publish_data_recursively(batch, new_subject, value, timestamp)
             # Handle lists, but don't publish the whole list as one value
             elif isinstance(value, list):
                  # Publish list items individually if they are complex objects (dicts)
                 for i, item in enumerate(value):
                     if isinstance(item, dict):
-                        await self._publish_data_recursively(f"{new_subject}.{i}", item, timestamp)
+                        await self._publish_data_recursively(batch, f"{new_subject}.{i}", item, timestamp)
             else:
                 try:
                     # Attempt to convert to a numeric type if possible, otherwise keep as is
@@ -187,10 +188,9 @@ class GpsService(Microservice):
                     else:
                         numeric_value = str(value) # Convert other types to string
 
-                    payload = {"value": numeric_value, "ts": timestamp}
-                    await self.messaging_client.publish(new_subject, json.dumps(payload).encode())
+                    await batch.publish_value(new_subject, numeric_value, timestamp)
                 except Exception as e:
-                    self.logger.warning(f"Could not process value for '{new_subject}': {e}")
+                    self.logger.warning("Could not process value for '%s': %s", new_subject, e)
 
     async def _publish_gps_data(self):
         """Fetches and publishes GPS data."""
@@ -227,6 +227,7 @@ class GpsService(Microservice):
             # Get a single timestamp for this update cycle
             timestamp = datetime.now().timestamp()
 
-            # Start the recursive publishing
-            await self._publish_data_recursively("gps.data", payload, timestamp)
-            self.logger.debug(f"Finished publishing GPS data.")
+            # Start the recursive publishing, all the values are sent in one batch
+            async with self.publish_batch() as batch:
+                await self._publish_data_recursively(batch, "gps.data", payload, timestamp)
+            self.logger.debug("Finished publishing GPS data.")
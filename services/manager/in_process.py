@@ -0,0 +1,68 @@
+"""
+    Runs microservices as tasks of the manager's event loop ("monolith" mode).
+"""
+import asyncio
+import importlib
+import inspect
+import os
+import signal
+import subprocess
+
+from common.microservice import Microservice
+
+
+def load_service_class(service_name: str) -> type[Microservice]:
+    """Imports `services.<service_name>.service` and returns the Microservice subclass it defines."""
+    module = importlib.import_module(f"services.{service_name}.service")
+    for _, cls in inspect.getmembers(module, inspect.isclass):
+        if issubclass(cls, Microservice) and cls.__module__ == module.__name__ and not inspect.isabstract(cls):
+            return cls
+    raise ImportError(f"No Microservice subclass found in {module.__name__}")
+
+
+class ServiceTask:
+    """
+    Runs a microservice as an asyncio task, behind the subset of the
+    `subprocess.Popen` interface used by the manager (`pid`, `returncode`,
+    `poll`, `terminate`, `kill`, `wait`).
+
+    A service that stops on its own or with an unhandled exception is seen by
+    the manager like a terminated process, so the other services keep running
+    and the crashed one is restarted by the monitoring loop.
+    """
+
+    def __init__(self, service: Microservice):
+        self.service = service
+        self.pid = os.getpid()
+        self.returncode: int | None = None
+        self.task = asyncio.create_task(self._run(), name=service.service_name)
+
+    async def _run(self):
+        try:
+            await self.service.run(install_signal_handlers=False)
+            self.returncode = 0
+        except asyncio.CancelledError:
+            self.returncode = -signal.SIGKILL
+        except SystemExit as e:
+            self.returncode = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            self.service.logger.critical(f"Service task crashed: {e}", exc_info=True)
+            self.returncode = 1
+
+    def poll(self) -> int | None:
+        return self.returncode if self.task.done() else None
+
+    def terminate(self):
+        """Asks the service to shut down gracefully."""
+        self.service._shutdown_event.set()
+
+    def kill(self):
+        self.task.cancel()
+
+    async def wait(self, timeout: float | None = None) -> int:
+        """Waits for the service to stop. Raises `subprocess.TimeoutExpired` like `Popen.wait`."""
+        try:
+            await asyncio.wait_for(asyncio.shield(self.task), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise subprocess.TimeoutExpired(self.service.service_name, timeout)
+        return self.returncode
@@ -7,11 +7,15 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.
 
 from services.manager.service import ManagerService
 
-async def main():
+async def main(mode: str | None = None, bus: str | None = None):
     """
     Entry point for the Microservice Manager.
+
+    :param mode: "process", "zygote" or "monolith", defaults to the MANAGER_MODE environment variable.
+    :param bus: "nats" or "loopback" (monolith mode only), defaults to the MANAGER_BUS environment variable.
     """
-    service = ManagerService()
+    service = ManagerService(mode=mode or os.environ.get("MANAGER_MODE", "process"),
+                             bus=bus or os.environ.get("MANAGER_BUS", "nats"))
     await service.run()
 
 if __name__ == "__main__":
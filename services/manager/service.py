@@ -1,8 +1,10 @@
 import asyncio
+import importlib
 import os
 import subprocess
 import sys
 import json
+import time
 from typing import Dict, TypedDict, Optional
 from nats.aio.msg import Msg
 
@@ -10,14 +12,34 @@ from nats.aio.msg import Msg
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from common.microservice import Microservice
+from common.loopback import LoopbackBus, LoopbackMessagingClient
+from services.manager.in_process import ServiceTask, load_service_class
+from services.manager import zygote
 
 class ServiceStatus(TypedDict):
     status: str  # e.g., 'stopped', 'running', 'error', 'restarting'
     pid: Optional[int]
-    process: Optional[subprocess.Popen]
+    process: Optional[subprocess.Popen | ServiceTask | zygote.ZygoteProcess]
     last_command: Optional[str] # 'start' or 'stop'
     restart_count: int
     name: str
+    dependencies: list[str]
+    ready: bool
+    started_at: Optional[float]
+    startup_ms: Optional[float]
+
+# Dependency of the services that don't declare a `DEPENDENCIES` list in their package
+DEFAULT_DEPENDENCIES = ["settings_service"]
+
+# "process" runs each service in its own Python process, "zygote" forks these
+# processes from a launcher that has already imported the common modules, and
+# "monolith" runs all the services as tasks of the manager's event loop.
+MODES = ("process", "zygote", "monolith")
+
+# In the monolith mode, the services can talk through the NATS server ("nats")
+# or through an in-process bus shared with the manager ("loopback"). Nothing
+# outside the process sees the loopback bus, including the browser of the UI.
+BUSES = ("nats", "loopback")
 
 class ManagerService(Microservice):
     """
@@ -26,12 +48,31 @@ class ManagerService(Microservice):
     Receives commands via NATS to manage service lifecycles.
     """
 
-    def __init__(self):
+    def __init__(self, mode: str = "process", bus: str = "nats"):
         super().__init__("manager")
+        if mode not in MODES:
+            raise ValueError(f"Unknown manager mode '{mode}', expected one of {MODES}")
+        if bus not in BUSES:
+            raise ValueError(f"Unknown bus '{bus}', expected one of {BUSES}")
+        if bus == "loopback" and mode != "monolith":
+            raise ValueError("The loopback bus is only available in the monolith mode")
+        if mode == "zygote" and not zygote.is_supported():
+            self.logger.warning("The zygote mode requires os.fork, falling back to the process mode.")
+            mode = "process"
+        self.mode = mode
+        self.bus = bus
+        self.loopback_bus: Optional[LoopbackBus] = None
+        if bus == "loopback":
+            self.loopback_bus = LoopbackBus()
+            self.messaging_client = LoopbackMessagingClient(self.loopback_bus)
+        self.zygote: Optional[zygote.Zygote] = None
         self.services_dir = "services"
         self.managed_services: Dict[str, ServiceStatus] = {}
         self.last_published_status = None
         self.max_retries = 3
+        self.ready_timeout = 30.0
+        self.cold_boot_ms: Optional[float] = None
+        self._ready_events: Dict[str, asyncio.Event] = {}
         self._discover_and_initialize_services()
         self._register_command_handlers()
 
@@ -49,8 +90,46 @@ class ManagerService(Microservice):
                     "last_command": None,
                     "restart_count": 0,
                     "name": service_name,
+                    "dependencies": self._load_dependencies(service_name),
+                    "ready": False,
+                    "started_at": None,
+                    "startup_ms": None,
                 }
+                self._ready_events[service_name] = asyncio.Event()
         self.logger.info(f"Discovered services: {list(self.managed_services.keys())}")
+        self._check_dependencies()
+
+    def _load_dependencies(self, service_name: str) -> list[str]:
+        """Returns the `DEPENDENCIES` declared in the package of a service."""
+        try:
+            package = importlib.import_module(f"services.{service_name}")
+        except Exception as e:
+            self.logger.warning(f"Could not read the dependencies of '{service_name}': {e}")
+            package = None
+        dependencies = getattr(package, "DEPENDENCIES", DEFAULT_DEPENDENCIES)
+        return [name for name in dependencies if name != service_name]
+
+    def _check_dependencies(self):
+        """Ignores unknown dependencies and breaks dependency cycles, so that every service can start."""
+        for name, info in self.managed_services.items():
+            unknown = [dep for dep in info["dependencies"] if dep not in self.managed_services]
+            if unknown:
+                self.logger.warning(f"Ignoring unknown dependencies of '{name}': {unknown}")
+                info["dependencies"] = [dep for dep in info["dependencies"] if dep in self.managed_services]
+
+        # Kahn's algorithm: the services left over depend on each other
+        remaining = {name: set(info["dependencies"]) for name, info in self.managed_services.items()}
+        while True:
+            startable = [name for name, deps in remaining.items() if not deps]
+            if not startable:
+                break
+            for name in startable:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(startable)
+        for name in remaining:
+            self.logger.error(f"Service '{name}' is part of a dependency cycle, starting it without dependencies.")
+            self.managed_services[name]["dependencies"] = []
 
     def _register_command_handlers(self):
         """Registers handlers for manager commands."""
@@ -80,14 +159,30 @@ class ManagerService(Microservice):
             return False
 
         self.logger.info(f"Starting service '{service_name}'...")
+        self._ready_events[service_name].clear()
         try:
-            process = subprocess.Popen([sys.executable, service_main_path])
+            process = None
+            if self.mode == "monolith":
+                service = load_service_class(service_name)()
+                if self.loopback_bus:
+                    service.messaging_client = LoopbackMessagingClient(self.loopback_bus)
+                process = ServiceTask(service)
+            elif self.zygote and self.zygote.available:
+                try:
+                    process = await self.zygote.spawn(service_name)
+                except Exception as e:
+                    self.logger.warning(f"Could not fork '{service_name}' from the zygote, starting a new process: {e}")
+            if process is None:
+                process = subprocess.Popen([sys.executable, service_main_path])
             service_info.update({
                 "status": "running",
                 "process": process,
                 "pid": process.pid,
                 "restart_count": 0, # Reset restart count on successful manual start
-                "last_command": "start"
+                "last_command": "start",
+                "ready": False,
+                "started_at": time.time(),
+                "startup_ms": None,
             })
             self.logger.info(f"Service '{service_name}' started with PID {process.pid}.")
             await self.publish_status() # Publish status after starting a service
@@ -113,7 +208,10 @@ class ManagerService(Microservice):
             service_info["last_command"] = "stop"
             process.terminate()
             try:
-                await asyncio.to_thread(process.wait, timeout=5)
+                if isinstance(process, ServiceTask):
+                    await process.wait(timeout=5)
+                else:
+                    await asyncio.to_thread(process.wait, timeout=5)
                 self.logger.info(f"Service '{service_name}' terminated gracefully.")
             except subprocess.TimeoutExpired:
                 self.logger.warning(f"Service '{service_name}' did not terminate gracefully. Killing.")
@@ -121,9 +219,43 @@ class ManagerService(Microservice):
             except Exception as e:
                 self.logger.error(f"Error while stopping service {service_name}: {e}")
 
-        service_info.update({"status": "stopped", "pid": None, "process": None})
+        service_info.update({"status": "stopped", "pid": None, "process": None, "ready": False})
+        self._ready_events[service_name].clear()
+        await self.publish_status()
+
+    async def _handle_service_ready(self, msg: Msg):
+        """Marks a service as ready when it announces it on `service.ready.<service_name>`."""
+        service_name = msg.subject.split(".")[-1]
+        service_info = self.managed_services.get(service_name)
+        if service_info is None:
+            return
+        if service_info["started_at"] is not None:
+            service_info["startup_ms"] = round((time.time() - service_info["started_at"]) * 1000, 1)
+        service_info["ready"] = True
+        self._ready_events[service_name].set()
+        self.logger.info(f"Service '{service_name}' is ready ({service_info['startup_ms']} ms after its start).")
         await self.publish_status()
 
+    async def wait_until_ready(self, service_name: str, timeout: float | None = None) -> bool:
+        """Waits for a service to announce it is ready. Returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._ready_events[service_name].wait(), timeout=timeout or self.ready_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _start_after_dependencies(self, service_name: str):
+        """Starts a service as soon as all its dependencies are ready, then waits for it to be ready."""
+        dependencies = self.managed_services[service_name]["dependencies"]
+        results = await asyncio.gather(*(self.wait_until_ready(dep) for dep in dependencies))
+        not_ready = [dep for dep, ready in zip(dependencies, results) if not ready]
+        if not_ready:
+            self.logger.warning(f"Dependencies {not_ready} of '{service_name}' are not ready after "
+                                f"{self.ready_timeout:.0f}s, starting it anyway.")
+        if await self.start_service(service_name):
+            if not await self.wait_until_ready(service_name):
+                self.logger.warning(f"Service '{service_name}' did not report ready within {self.ready_timeout:.0f}s.")
+
     async def restart_service(self, service_name: str):
         self.logger.info(f"Restarting service '{service_name}'...")
         await self.stop_service(service_name)
@@ -145,20 +277,19 @@ class ManagerService(Microservice):
             await self.restart_service(service_name)
 
     async def start_all_command(self):
-        """Starts all discovered services, ensuring settings_service starts first."""
+        """
+        Starts all discovered services in parallel, each one as soon as the
+        services it depends on report they are ready.
+        """
         self.logger.info("Executing start_all command...")
-
-        # Define service start order
-        service_names = list(self.managed_services.keys())
-        # Ensure settings_service is first if it exists
-        if "settings_service" in service_names:
-            service_names.insert(0, service_names.pop(service_names.index("settings_service")))
-
-        for service_name in service_names:
-            await self.start_service(service_name)
-            if service_name == "settings_service":
-                self.logger.info("Waiting for settings_service to initialize...")
-                await asyncio.sleep(2) # Give it time to start and be available
+        start = time.perf_counter()
+        await asyncio.gather(*(self._start_after_dependencies(name) for name in self.managed_services))
+        self.cold_boot_ms = round((time.perf_counter() - start) * 1000, 1)
+        not_ready = [name for name, info in self.managed_services.items() if not info["ready"]]
+        if not_ready:
+            self.logger.warning(f"Cold boot finished in {self.cold_boot_ms:.0f} ms, services not ready: {not_ready}")
+        else:
+            self.logger.info(f"Cold boot finished in {self.cold_boot_ms:.0f} ms, all services are ready.")
         await self.publish_status()
 
     async def stop_all_command(self):
@@ -198,6 +329,9 @@ class ManagerService(Microservice):
 
         return {
             "global_status": "all_ok" if is_all_running else "degraded",
+            "mode": self.mode,
+            "bus": self.bus,
+            "cold_boot_ms": self.cold_boot_ms,
             "services": services_status_list
         }
 
@@ -212,17 +346,23 @@ class ManagerService(Microservice):
         await self.messaging_client.connect(self.nats_url)
         self.logger.info("Manager connected to NATS.")
 
-        # Now subscribe to commands.
+        # Now subscribe to commands and readiness announcements.
         await self._subscribe_to_commands()
+        await self.messaging_client.subscribe("service.ready.*", cb=self._handle_service_ready)
 
-        # Start all services automatically on manager startup.
-        self.logger.info("Manager starting... auto-starting all services.")
-        await self.start_all_command()
+        if self.mode == "zygote":
+            self.zygote = zygote.Zygote([f"services.{name}.service" for name in self.managed_services], self.logger)
+            self.zygote.start()
 
-        # Start the monitoring loop as a background task
+        # Start the monitoring loop as a background task, crashes during the
+        # startup are handled while the dependents wait for their dependencies.
         asyncio.create_task(self.monitor_services())
         self.logger.info("Service monitoring started.")
 
+        # Start all services automatically on manager startup.
+        self.logger.info("Manager starting... auto-starting all services.")
+        await self.start_all_command()
+
     async def _stop_logic(self):
         """Stops all managed microservices."""
         self.logger.info("Stopping all managed services...")
@@ -231,6 +371,8 @@ class ManagerService(Microservice):
         for service_name in service_names:
             await self.stop_service(service_name)
         self.logger.info("All managed services have been signaled to stop.")
+        if self.zygote and self._shutdown_event.is_set():
+            await asyncio.to_thread(self.zygote.stop)
 
     async def publish_status(self, reply:str="", forced:bool=False):
         """Publishes the status of all managed services to NATS and stores it."""
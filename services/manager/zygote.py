@@ -0,0 +1,271 @@
+"""
+    Pre-forked launcher ("zygote") for fast service starts and restarts.
+
+    The manager runs this module as a child process. It imports the heavy
+    modules used by the services once, then forks a copy of itself for each
+    service started by the manager, so the services skip the interpreter startup
+    and most of the imports. The manager and the zygote talk over two pipes,
+    with one JSON object per line:
+
+        manager -> zygote: {"id": 1, "service": "can_bus_service"}
+        zygote -> manager: {"preloaded": 12, "ms": 2350.1}
+                           {"id": 1, "pid": 4242}
+                           {"exit": 4242, "returncode": 0}
+
+    The zygote reaps the services it forked and reports their exit codes, and
+    it exits when the manager closes the request pipe.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+# Third-party and common modules imported by most services
+PRELOAD_MODULES = [
+    "nats", "can", "cantools", "boto3", "fastapi", "uvicorn",
+    "common.microservice", "common.messaging", "common.s3_uploader", "common.can_frames",
+]
+
+
+def is_supported() -> bool:
+    """The zygote needs `os.fork`, i.e. a POSIX system."""
+    return hasattr(os, "fork")
+
+
+# --- Manager side ---
+
+class ZygoteProcess:
+    """
+    A service forked by the zygote, behind the subset of the `subprocess.Popen`
+    interface used by the manager. Its exit code is reported by the zygote.
+    """
+
+    def __init__(self, pid: int, zygote: "Zygote"):
+        self.pid = pid
+        self.returncode: int | None = None
+        self._zygote = zygote
+        self._exited = threading.Event()
+
+    def _set_returncode(self, returncode: int):
+        self.returncode = returncode
+        self._exited.set()
+
+    def poll(self) -> int | None:
+        if self.returncode is None and not self._zygote.available:
+            # Nobody reports the exit of the service anymore, check it directly
+            try:
+                os.kill(self.pid, 0)
+            except ProcessLookupError:
+                self._set_returncode(-1)
+        return self.returncode
+
+    def terminate(self):
+        self._signal(signal.SIGTERM)
+
+    def kill(self):
+        self._signal(signal.SIGKILL)
+
+    def _signal(self, sig: int):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def wait(self, timeout: float | None = None) -> int:
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(str(self.pid), timeout)
+        return self.returncode
+
+
+class Zygote:
+    """Starts the zygote process and forks services through it."""
+
+    def __init__(self, preload: list[str], logger: logging.Logger):
+        self.preload = PRELOAD_MODULES + preload
+        self.logger = logger
+        self.process: subprocess.Popen | None = None
+        self._request_fd: int | None = None
+        self._write_lock = threading.Lock()
+        self._next_id = 0
+        self._pending: dict[int, Future] = {}
+        self._children: dict[int, ZygoteProcess] = {}
+        self._reader: threading.Thread | None = None
+
+    @property
+    def available(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        request_read, request_write = os.pipe()
+        reply_read, reply_write = os.pipe()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__),
+             "--request-fd", str(request_read), "--reply-fd", str(reply_write), *self.preload],
+            pass_fds=(request_read, reply_write),
+        )
+        os.close(request_read)
+        os.close(reply_write)
+        self._request_fd = request_write
+        self._reader = threading.Thread(target=self._read_replies, args=(reply_read,), name="zygote_reader", daemon=True)
+        self._reader.start()
+        self.logger.info(f"Zygote started with PID {self.process.pid}, preloading {len(self.preload)} modules.")
+
+    def stop(self):
+        """Closes the request pipe, which makes the zygote exit. Running services are not stopped."""
+        if self._request_fd is not None:
+            os.close(self._request_fd)
+            self._request_fd = None
+        if self.process:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def _read_replies(self, fd: int):
+        with os.fdopen(fd, "rb") as replies:
+            for line in replies:
+                try:
+                    reply = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "preloaded" in reply:
+                    self.logger.info(f"Zygote preloaded {reply['preloaded']} modules in {reply['ms']:.0f} ms.")
+                elif "exit" in reply:
+                    child = self._children.pop(reply["exit"], None)
+                    if child:
+                        child._set_returncode(reply["returncode"])
+                elif "id" in reply:
+                    future = self._pending.pop(reply["id"], None)
+                    if future is None:
+                        continue
+                    if "pid" in reply:
+                        # Registered here, so that the exit of the child can't be processed before
+                        child = ZygoteProcess(reply["pid"], self)
+                        self._children[child.pid] = child
+                        future.set_result(child)
+                    else:
+                        future.set_exception(RuntimeError(reply.get("error", "unknown zygote error")))
+        # The zygote is gone
+        for future in self._pending.values():
+            future.set_exception(RuntimeError("The zygote exited"))
+        self._pending.clear()
+
+    async def spawn(self, service_name: str, timeout: float = 60.0) -> ZygoteProcess:
+        """Forks a service from the zygote. The first spawns wait for the preloading to end."""
+        if not self.available:
+            raise RuntimeError("The zygote is not running")
+        future = Future()
+        with self._write_lock:
+            self._next_id += 1
+            request_id = self._next_id
+            self._pending[request_id] = future
+            os.write(self._request_fd, json.dumps({"id": request_id, "service": service_name}).encode() + b"\n")
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+
+
+# --- Zygote side ---
+
+def _write(fd: int, reply: dict):
+    os.write(fd, json.dumps(reply).encode() + b"\n")
+
+
+def _run_service(service_name: str) -> int:
+    """Runs a service in a freshly forked child, like its main.py would."""
+    from services.manager.in_process import load_service_class
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    random.seed()
+    service = load_service_class(service_name)()
+    asyncio.run(service.run())
+    return 0
+
+
+def _fork_service(service_name: str, request_fd: int, reply_fd: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    code = 1
+    try:
+        os.close(request_fd)
+        os.close(reply_fd)
+        code = _run_service(service_name)
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        from common.logging_setup import stop_logging
+        stop_logging()
+        logging.shutdown()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def _reap_children(reply_fd: int):
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        _write(reply_fd, {"exit": pid, "returncode": os.waitstatus_to_exitcode(status)})
+
+
+def serve(request_fd: int, reply_fd: int, preload: list[str]):
+    # Ctrl+C is handled by the manager, which stops the services and then this process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import importlib
+    start = time.perf_counter()
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"zygote: could not preload {module}: {e}", file=sys.stderr)
+    _write(reply_fd, {"preloaded": len(preload), "ms": (time.perf_counter() - start) * 1000})
+
+    buffer = b""
+    while True:
+        readable, _, _ = select.select([request_fd], [], [], 0.2)
+        _reap_children(reply_fd)
+        if not readable:
+            continue
+        chunk = os.read(request_fd, 65536)
+        if not chunk:
+            break
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            request = json.loads(line)
+            try:
+                pid = _fork_service(request["service"], request_fd, reply_fd)
+                _write(reply_fd, {"id": request["id"], "pid": pid})
+            except OSError as e:
+                _write(reply_fd, {"id": request["id"], "error": str(e)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-forked service launcher, started by the manager.")
+    parser.add_argument("--request-fd", type=int, required=True)
+    parser.add_argument("--reply-fd", type=int, required=True)
+    parser.add_argument("preload", nargs="*", help="Modules to import before forking the services")
+    args = parser.parse_args()
+    serve(args.request_fd, args.reply_fd, args.preload)
@@ -84,7 +84,7 @@ class OwaService(Microservice):
             except Exception as e:
                 self.logger.error(f"Error during OWA hardware initialization: {e}", exc_info=True)
                 self.status = "error"
-                return
+                return False
         else:
             self.logger.info("Running on a generic platform. Skipping OWA hardware initialization.")
             self.status = "ready"
@@ -0,0 +1,2 @@
+# Services this service needs to be ready before it is started by the manager.
+DEPENDENCIES = []
@@ -60,7 +60,7 @@ class SettingsService(Microservice):
 
         if reply:
             await self.messaging_client.publish(reply, response_json.encode())
-            self.logger.debug(f"Sent settings for '{service_key}' to {reply}")
+            self.logger.debug("Sent settings for '%s' to %s", service_key, reply)
 
     def _get_nested_dict_val(self, dict: dict, keys: list):
         for key in keys:
@@ -16,6 +16,7 @@ import base64
 # Add the project root to the Python path to allow for absolute imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from common.microservice import Microservice
+from common.logging_setup import log_directory
 
 # --- Absolute Path Setup ---
 # This ensures that file paths are correct regardless of the working directory
@@ -24,7 +25,7 @@ STATIC_DIR = os.path.join(APP_DIR, "frontend", "static")
 TEMPLATES_DIR = os.path.join(APP_DIR, "frontend", "templates")
 # Use an absolute path for the main log directory as well
 CONFIG_DIR = os.path.abspath("config")
-LOGS_DIR = os.path.abspath("logs")
+LOGS_DIR = log_directory()
 CAN_LOGS_DIR = os.path.abspath("can_logs")
 APP_LOGS_DIR = os.path.abspath("app_logs")
 FAVICON_PATH = os.path.join(APP_DIR, "frontend", "static", "images", "favicon.ico")
@@ -165,6 +166,12 @@ class FileToConvert(BaseModel):
     name: str
     folder: str
 
+@router.get("/api/metrics")
+async def get_metrics(request: Request):
+    """Latest message metrics published by each service, including this one."""
+    service = get_service(request)
+    return {**service.service_metrics, service.service_name: service.get_metrics()}
+
 @router.get("/api/settings/export")
 async def export_settings():
     settings_path = os.path.join(CONFIG_DIR, "settings.json")
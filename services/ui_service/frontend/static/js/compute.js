@@ -4,29 +4,45 @@ import ConnectionManager from './connection_manager.js';
 let stateSub;
 let statusSub;
 let domElements = {};
+// Version of the state shown, null until a snapshot is received
+let stateVersion = null;
+// Run of the compute_service the version belongs to: the versions restart with the service
+let stateEpoch = null;
+// Deltas received while waiting for a snapshot, at most MAX_PENDING_DELTAS (the oldest are dropped)
+let pendingDeltas = [];
+const MAX_PENDING_DELTAS = 100;
+// Snapshot request in progress, and retry of a failed one (e.g. compute_service not started yet)
+let snapshotInFlight = false;
+let snapshotRetryTimer = null;
+let snapshotRetryDelay = 1000;
+const MAX_SNAPSHOT_RETRY_DELAY = 30000;
 
 /**
- * Handles incoming state messages from the compute.state.full subject.
+ * Shows a state of the compute_service.
  * @param {object} state - The full state object from the compute_service.
+ * @param {string[]|null} changedKeys - The signals that changed since the last
+ *     call, or null to refresh all of them.
  */
-function updateUI(state) {
+function updateUI(state, changedKeys = null) {
     if (!state || !domElements.computedTableBody || !domElements.sourceTablesContainer) return;
     domElements.lastState = state;
 
-    const allSignalKeys = new Set(Object.keys(state.computation_state || {}));
+    const computationState = state.computation_state || {};
     const computedSignalsMap = new Map((state.computations || []).map(c => [c.output_name, c]));
 
     // Prune cache of signals that no longer exist
     for (const signalName in domElements.cellCache) {
-        if (!allSignalKeys.has(signalName)) {
+        if (!(signalName in computationState)) {
             domElements.cellCache[signalName].row.remove();
             delete domElements.cellCache[signalName];
         }
     }
 
     // Update triggers and tables
-    updateTriggersList(state.triggers || [], state.computation_state || {});
-    for (const [key, value] of Object.entries(state.computation_state || {})) {
+    updateTriggersList(state.triggers || [], computationState);
+    for (const key of changedKeys ?? Object.keys(computationState)) {
+        if (!(key in computationState)) continue;
+        const value = computationState[key];
         const isComputed = computedSignalsMap.has(key);
         if (domElements.cellCache[key]) {
             // Update existing cell
@@ -61,6 +77,81 @@ function updateUI(state) {
     }
 }
 
+/**
+ * Requests a full snapshot of the state, then applies the deltas received
+ * meanwhile. A failed request is retried with an exponential backoff, or as
+ * soon as a delta shows that the service is up.
+ */
+async function requestStateSnapshot() {
+    if (snapshotInFlight) return;
+    clearTimeout(snapshotRetryTimer);
+    snapshotRetryTimer = null;
+    snapshotInFlight = true;
+    stateVersion = null;
+    try {
+        const response = await ConnectionManager.request('commands.compute_service', { command: 'get_state' });
+        const snapshot = ConnectionManager.jsonCodec.decode(response.data);
+        snapshotInFlight = false;
+        snapshotRetryDelay = 1000;
+        stateVersion = snapshot.version;
+        stateEpoch = snapshot.epoch;
+        updateUI(snapshot);
+        // The deltas of a previous run of the service don't apply to the snapshot
+        const deltas = pendingDeltas.filter(delta => delta.epoch === stateEpoch);
+        pendingDeltas = [];
+        deltas.forEach(handleStateDelta);
+    } catch (err) {
+        snapshotInFlight = false;
+        console.error(`Error requesting the compute state, retrying in ${snapshotRetryDelay / 1000}s:`, err);
+        snapshotRetryTimer = setTimeout(requestStateSnapshot, snapshotRetryDelay);
+        snapshotRetryDelay = Math.min(snapshotRetryDelay * 2, MAX_SNAPSHOT_RETRY_DELAY);
+    }
+}
+
+/**
+ * Starts a new synchronization from a snapshot, keeping only the delta that revealed the need for it.
+ */
+function resynchronize(delta) {
+    pendingDeltas = [delta];
+    requestStateSnapshot();
+}
+
+/**
+ * Applies a message of the compute.state.delta subject: the signals that
+ * changed since the previous version. A missed version, or a delta of a new
+ * run of the service (restarted), triggers a new snapshot.
+ * @param {object} delta - {epoch, version, changed, removed, [triggers], [computations]}
+ */
+function handleStateDelta(delta) {
+    if (stateVersion === null) {
+        pendingDeltas.push(delta);
+        if (pendingDeltas.length > MAX_PENDING_DELTAS) pendingDeltas.shift();
+        // The service publishes again: no need to wait for the retry of a failed snapshot request
+        if (snapshotRetryTimer !== null) requestStateSnapshot();
+        return;
+    }
+    if (delta.epoch !== stateEpoch) {
+        console.warn("The compute_service restarted, resynchronizing.");
+        resynchronize(delta);
+        return;
+    }
+    if (delta.version <= stateVersion) return; // Already in the snapshot
+    if (delta.version !== stateVersion + 1) {
+        console.warn(`Missed compute state versions ${stateVersion + 1} to ${delta.version - 1}, resynchronizing.`);
+        resynchronize(delta);
+        return;
+    }
+    stateVersion = delta.version;
+
+    const state = domElements.lastState;
+    Object.assign(state.computation_state, delta.changed);
+    (delta.removed || []).forEach(name => delete state.computation_state[name]);
+    if (delta.triggers) state.triggers = delta.triggers;
+    if (delta.computations) state.computations = delta.computations;
+    // New computation definitions can move signals to the computed table, refresh all of them
+    updateUI(state, delta.computations ? null : Object.keys(delta.changed));
+}
+
 function getSignalGroup(signalName) {
     // Split the signalName string at the first '.'
     const parts = signalName.split('.');
@@ -129,12 +220,16 @@ function updateTriggersList(triggers, computationState) {
 
             const body = document.createElement('div');
             body.className = 'trigger-body';
-            const conditions = trigger.conditions.map(c => {
+            const conditions = (trigger.conditions || []).map(c => {
                 const currentValue = computationState[c.name];
                 const formattedValue = typeof currentValue === 'number' ? currentValue.toFixed(2) : 'N/A';
                 return `${c.name} ${c.operator} ${c.value} (current: ${formattedValue})`;
-            }).join(', ');
-            body.innerHTML = `<p><strong>Conditions:</strong> ${conditions}</p>
+            });
+            // Condition expression, e.g. "pressure > 200 for 2s"
+            if (trigger.condition) {
+                conditions.unshift(trigger.condition);
+            }
+            body.innerHTML = `<p><strong>Conditions:</strong> ${conditions.join(', ')}</p>
                               <p><strong>Last Event:</strong> ${trigger.last_event_timestamp ? new Date(trigger.last_event_timestamp).toLocaleTimeString() : 'None'}</p>`;
 
             triggerDiv.appendChild(header);
@@ -285,12 +380,15 @@ function initComputePage() {
         return;
     }
 
-    // 2. Subscribe to the full state topic
-    ConnectionManager.subscribe('compute.state.full', (m) => {
-        const state = ConnectionManager.jsonCodec.decode(m.data);
-        updateUI(state);
+    // 2. Subscribe to the state deltas, then get the snapshot they apply to
+    stateVersion = null;
+    pendingDeltas = [];
+    snapshotRetryDelay = 1000;
+    ConnectionManager.subscribe('compute.state.delta', (m) => {
+        handleStateDelta(ConnectionManager.jsonCodec.decode(m.data));
     }).then(sub => {
         stateSub = sub;
+        requestStateSnapshot();
     });
 
     // 3. Subscribe to the service status topic
@@ -441,6 +539,20 @@ async function handleRegisterComputation(event) {
     event.preventDefault();
     const formData = new FormData(event.target);
     const formProps = Object.fromEntries(formData.entries());
+    // Parameters of the computation, e.g. {"window": 10} (seconds) or {"alpha": 0.1},
+    // and options of its output, e.g. {"max_rate_hz": 10}
+    for (const field of ['params', 'output']) {
+        if (formProps[field]) {
+            try {
+                formProps[field] = JSON.parse(formProps[field]);
+            } catch (err) {
+                console.error(`Invalid computation ${field}:`, err);
+                return;
+            }
+        } else {
+            delete formProps[field];
+        }
+    }
     const payload = {
         command: 'register_computation',
         ...formProps // Unpack form properties into the top level of the payload
@@ -475,6 +587,9 @@ function cleanupComputePage() {
         statusSub.unsubscribe();
         statusSub = null;
     }
+    clearTimeout(snapshotRetryTimer);
+    snapshotRetryTimer = null;
+    pendingDeltas = [];
 
     // 2. Remove event listeners
     if (domElements.formRegisterComp) {
@@ -31,11 +31,20 @@ class UiService(Microservice):
 
         self.app.include_router(api_router)
         self.app.state.service = self
+        # Latest metrics published by each service on `<service>.metrics`
+        self.service_metrics: dict[str, dict] = {}
 
     async def _handle_ping_command(self, message: str = "pong"):
         self.logger.info(f"Received ping command! Replying with: {message}")
         await asyncio.sleep(1)
 
+    async def _handle_service_metrics(self, msg: Msg):
+        try:
+            metrics = json.loads(msg.data)
+        except json.JSONDecodeError:
+            return
+        self.service_metrics[metrics.get("service", msg.subject.split(".")[0])] = metrics
+
     async def _start_logic(self):
         self.logger.info("Waiting for settings...")
         await self.get_settings()
@@ -45,6 +54,7 @@ class UiService(Microservice):
 
         self.command_handler.register_command("ping", self._handle_ping_command)
         await self._subscribe_to_commands()
+        await self.messaging_client.subscribe("*.metrics", cb=self._handle_service_metrics)
 
         self.logger.info("Starting FastAPI server...")
 
@@ -0,0 +1,68 @@
+import argparse
+import os
+import random
+import sys
+import timeit
+
+import cantools
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.can_bus_service.decoder import DecoderCache
+
+
+def build_frames(db, frames_per_message: int, unknown_ratio: float) -> list[tuple[int, bytes]]:
+    """Builds a shuffled list of random frames for the messages of the DBC, plus unknown IDs."""
+    known_ids = {message.frame_id for message in db.messages}
+    frames = []
+    for message in db.messages:
+        for _ in range(frames_per_message):
+            frames.append((message.frame_id, random.randbytes(message.length)))
+
+    unknown_count = int(len(frames) * unknown_ratio)
+    while unknown_count > 0:
+        arbitration_id = random.randint(0, 0x7FF)
+        if arbitration_id not in known_ids:
+            frames.append((arbitration_id, random.randbytes(8)))
+            unknown_count -= 1
+
+    random.shuffle(frames)
+    return frames
+
+
+def decode_with_cantools(db, frames):
+    for arbitration_id, data in frames:
+        try:
+            db.decode_message(arbitration_id, data)
+        except KeyError:
+            pass
+
+
+def decode_with_cache(cache, frames):
+    for arbitration_id, data in frames:
+        cache.decode(arbitration_id, data)
+
+
+def main(args):
+    db = cantools.database.load_file(args.dbc_file)
+    cache = DecoderCache(db)
+    frames = build_frames(db, args.frames_per_message, args.unknown_ratio)
+    print(f"Decoding {len(frames)} frames ({len(db.messages)} messages, {args.unknown_ratio:.0%} unknown IDs), best of {args.repeat}...")
+
+    results = {
+        "cantools": min(timeit.repeat(lambda: decode_with_cantools(db, frames), number=1, repeat=args.repeat)),
+        "decoder cache": min(timeit.repeat(lambda: decode_with_cache(cache, frames), number=1, repeat=args.repeat)),
+    }
+    for name, duration in results.items():
+        print(f"{name:>14}: {duration * 1000:8.2f} ms  ({len(frames) / duration:10.0f} frames/s)")
+    print(f"Speedup: {results['cantools'] / results['decoder cache']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmark of the CAN decoder cache against raw cantools decoding.")
+    parser.add_argument("--dbc-file", default="config/db-full.dbc", help="DBC file to decode with")
+    parser.add_argument("--frames-per-message", type=int, default=500, help="Number of random frames per DBC message")
+    parser.add_argument("--unknown-ratio", type=float, default=0.2, help="Ratio of frames with IDs unknown to the DBC")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timing runs")
+    main(parser.parse_args())
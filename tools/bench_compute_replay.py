@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+import can
+import cantools
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.loopback import LoopbackMessagingClient
+from services.compute_service import replay
+from services.compute_service.service import ComputeService
+
+COMPUTATIONS = [
+    {"source_signal": "can.data.RPM", "computation_type": "RunningAverage", "output_name": "rpm_avg"},
+    {"source_signal": "can.data.RPM", "computation_type": "Differentiator", "output_name": "rpm_rate"},
+    {"source_signal": "can.data.RPM", "computation_type": "MovingStdDev", "output_name": "rpm_std",
+     "params": {"window": 1.0}},
+    {"source_signal": "can.data.Temperature", "computation_type": "MovingAverage", "output_name": "temp_avg",
+     "params": {"window": 5.0}},
+    {"source_signal": "can.data.Temperature", "computation_type": "Integrator", "output_name": "temp_dose"},
+    {"source_signal": "temp_avg", "computation_type": "RateOfChange", "output_name": "temp_trend",
+     "params": {"window": 2.0}},
+    {"computation_type": "Expression", "output_name": "load",
+     "params": {"expression": "can.data.RPM * max(can.data.Temperature, 0) / 1000"}},
+]
+
+TRIGGERS = [
+    {"name": "overspeed", "conditions": [{"name": "can.data.RPM", "operator": ">", "value": 6000}], "action": {}},
+    {"name": "overheat", "condition": "temp_avg > 90 for 500ms", "action": {}},
+]
+
+
+def write_log(path: str, db, seconds: float, rate_hz: float):
+    """A recording of the MotorInfo frame of the sample DBC, with slowly varying signals."""
+    message = db.get_message_by_name("MotorInfo")
+    with can.BLFWriter(path) as writer:
+        for i in range(int(seconds * rate_hz)):
+            timestamp = 1_700_000_000 + i / rate_hz
+            data = message.encode({
+                "Temperature": 80 + 30 * math.sin(i / rate_hz / 20) + random.uniform(-1, 1),
+                "RPM": 4000 + 3000 * math.sin(i / rate_hz / 7) + random.uniform(-50, 50),
+            })
+            writer.on_message_received(can.Message(timestamp=timestamp, arbitration_id=message.frame_id,
+                                                   data=data, is_extended_id=False))
+
+
+async def replay_live(signals: dict[str, tuple]) -> float:
+    """The samples through the live processing of the service, in time order, without the bus."""
+    service = ComputeService()
+    service.logger.setLevel(logging.WARNING)
+    service.messaging_client = LoopbackMessagingClient()
+    for definition in COMPUTATIONS:
+        await service._handle_register_computation(**definition)
+    for trigger in TRIGGERS:
+        await service._handle_register_trigger(trigger=trigger)
+    updates = sorted((timestamp, name, value) for name, (timestamps, values) in signals.items()
+                     for timestamp, value in zip(timestamps.tolist(), values.tolist()))
+    start = time.perf_counter()
+    for timestamp, name, value in updates:
+        await service._process_data(name, value, timestamp)
+    return time.perf_counter() - start
+
+
+async def run(args):
+    random.seed(args.seed)
+    db = cantools.database.load_file(os.path.join(os.path.dirname(__file__), '..', 'config', 'sample.dbc'))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "motor.blf")
+        write_log(path, db, args.seconds, args.rate)
+
+        start = time.perf_counter()
+        signals = replay.load_signals(path, db)
+        loaded = time.perf_counter()
+    result = replay.VectorizedReplay(COMPUTATIONS, TRIGGERS).run(signals)
+    replayed = time.perf_counter()
+
+    live = await replay_live(signals)
+    samples = sum(len(timestamps) for timestamps, _ in signals.values())
+    vectorized = replayed - start
+    print(f"Offline replay of {args.seconds:.0f} s of MotorInfo at {args.rate:.0f} Hz ({samples} samples), "
+          f"{len(COMPUTATIONS)} computations and {len(TRIGGERS)} triggers:")
+    print(f"{'real time':>22}: {args.seconds * 1000:9.1f} ms")
+    print(f"{'live processing':>22}: {live * 1000:9.1f} ms  (without the bus nor decoding)")
+    print(f"{'vectorized, decoding':>22}: {(loaded - start) * 1000:9.1f} ms")
+    print(f"{'vectorized, computing':>22}: {(replayed - loaded) * 1000:9.1f} ms")
+    print(f"Speedup: {args.seconds / vectorized:.0f}x real time, {live / vectorized:.1f}x live processing "
+          f"({live / (replayed - loaded):.1f}x on the computations alone)")
+    for name, timeline in result.timelines.items():
+        print(f"  trigger {name}: {sum(1 for _, active in timeline if active)} activations")
+
+
+if __name__ == "__main__":
+    if replay.np is None:
+        sys.exit("The vectorized replay requires the numpy package.")
+    parser = argparse.ArgumentParser(description="Offline replay of the compute_service over a recorded CAN log.")
+    parser.add_argument("--seconds", type=float, default=600, help="Duration of the recording")
+    parser.add_argument("--rate", type=float, default=100, help="Rate of the recorded frame, in Hz")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random signal noise")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.loopback import LoopbackMessagingClient
+from services.compute_service.expressions import Expression
+from services.compute_service.service import ComputeService
+
+
+def make_service() -> ComputeService:
+    service = ComputeService()
+    service.logger.setLevel(logging.WARNING)
+    # Nobody subscribes to the private bus of the client, publishing costs almost nothing
+    service.messaging_client = LoopbackMessagingClient()
+    return service
+
+
+def make_updates(signals: list[str], count: int) -> list[tuple[str, float, float]]:
+    return [(random.choice(signals), random.uniform(0, 100), i * 0.001) for i in range(count)]
+
+
+async def register_triggers(service: ComputeService, signals: list[str], count: int):
+    for i in range(count):
+        await service._handle_register_trigger(trigger={
+            "name": f"trigger_{i}",
+            "conditions": [{"name": name, "operator": ">", "value": 50} for name in random.sample(signals, 2)],
+            "action": {"on_become_active": {"type": "publish", "subject": f"bench.trigger_{i}.active"}},
+        })
+
+
+async def process(service: ComputeService, updates) -> float:
+    start = time.perf_counter()
+    for signal_name, value, timestamp in updates:
+        await service._process_data(signal_name, value, timestamp)
+    return time.perf_counter() - start
+
+
+async def bench_trigger_index(args):
+    signals = [f"can.data.Signal{i}" for i in range(args.signals)]
+    updates = make_updates(signals, args.updates)
+    results = {}
+    for name, full_scan in (("full scan", True), ("signal index", False)):
+        service = make_service()
+        await register_triggers(service, signals, args.triggers)
+        if full_scan:
+            # Behavior before the index: every trigger after every update
+            service._triggers_to_evaluate = lambda signal_names: service.triggers
+        results[name] = await process(service, updates)
+
+    print(f"Trigger evaluation, {args.triggers} triggers over {args.signals} signals, {args.updates} updates:")
+    for name, duration in results.items():
+        print(f"{name:>14}: {duration * 1000:9.1f} ms  ({args.updates / duration:10.0f} updates/s)")
+    print(f"Speedup: {results['full scan'] / results['signal index']:.1f}x")
+
+
+async def bench_computation_chains(args):
+    signals = [f"can.data.Signal{i}" for i in range(args.signals)]
+    updates = make_updates(signals, args.updates)
+    service = make_service()
+    # A chain of `--chain-depth` computations on each of the first `--chained-signals` signals
+    chained = signals[:args.chained_signals]
+    for signal_name in chained:
+        source = signal_name
+        for depth in range(args.chain_depth):
+            output_name = f"{signal_name}.level{depth}"
+            await service._handle_register_computation(
+                source_signal=source, computation_type=("RunningAverage", "Integrator", "Differentiator")[depth % 3],
+                output_name=output_name)
+            source = output_name
+
+    chained_set = set(chained)
+    chained_updates = [update for update in updates if update[0] in chained_set]
+    duration = await process(service, chained_updates)
+    computations = len(chained_updates) * args.chain_depth
+    print(f"Computation chains of depth {args.chain_depth} on {len(chained)} signals, {len(chained_updates)} updates:")
+    print(f"{'DAG plans':>14}: {duration * 1000:9.1f} ms  ({computations / duration:10.0f} computations/s)")
+
+
+def persisted_configuration(signals: list[str], args) -> dict:
+    """Settings of the service with the chains of `bench_computation_chains` and `--triggers` triggers."""
+    computations = []
+    for signal_name in signals[:args.chained_signals]:
+        source = signal_name
+        for depth in range(args.chain_depth):
+            output_name = f"{signal_name}.level{depth}"
+            computations.append({"source_signal": source, "output_name": output_name,
+                                 "computation_type": ("RunningAverage", "Integrator", "Differentiator")[depth % 3]})
+            source = output_name
+    triggers = [{
+        "name": f"trigger_{i}",
+        "conditions": [{"name": name, "operator": ">", "value": 50} for name in random.sample(signals, 2)],
+        "action": {"on_become_active": {"type": "publish", "subject": f"bench.trigger_{i}.active"}},
+    } for i in range(args.triggers)]
+    return {"computations": computations, "triggers": triggers}
+
+
+async def restore_saving_each(service: ComputeService):
+    """Behavior before the debounce: every restored registration saved the whole configuration."""
+    for comp_def in service.settings["computations"]:
+        await service._handle_register_computation(**comp_def)
+        await service._save_configuration()
+    for trigger_def in service.settings["triggers"]:
+        await service._handle_register_trigger(trigger=trigger_def)
+        await service._save_configuration()
+
+
+async def bench_restore(args):
+    signals = [f"can.data.Signal{i}" for i in range(args.signals)]
+    settings = persisted_configuration(signals, args)
+    results = {}
+    for name, restore in (("save each", restore_saving_each), ("no write-back", ComputeService._restore_configuration)):
+        service = make_service()
+        service.settings = settings
+        start = time.perf_counter()
+        await restore(service)
+        duration = time.perf_counter() - start
+        results[name] = (duration, service.messaging_client.metrics.stats_for("commands.settings_service").published)
+
+    print(f"Restore of {len(settings['computations'])} computations and {len(settings['triggers'])} triggers:")
+    for name, (duration, save_commands) in results.items():
+        print(f"{name:>14}: {duration * 1000:9.1f} ms  ({save_commands} save commands)")
+    print(f"Speedup: {results['save each'][0] / results['no write-back'][0]:.1f}x")
+
+
+async def bench_output_policies(args):
+    # A 1 kHz signal feeding three computations
+    updates = [("can.data.EngineSpeed", random.uniform(1000, 1010), i * 0.001) for i in range(args.updates)]
+    policies = {
+        "every result": {},
+        "max 10 Hz": {"max_rate_hz": 10},
+        "decimation 10": {"decimation": 10},
+        "deadband 1": {"deadband": 1},
+        "batch 10 Hz": {"max_rate_hz": 10, "batch": True},
+    }
+    print(f"Output policies, 3 computations on a 1 kHz signal, {args.updates} updates:")
+    for name, output in policies.items():
+        service = make_service()
+        for computation_type in ("RunningAverage", "MovingMax", "Differentiator"):
+            await service._handle_register_computation(
+                source_signal="can.data.EngineSpeed", computation_type=computation_type,
+                output_name=f"EngineSpeed_{computation_type}", output=output)
+        start = time.perf_counter()
+        for i, (signal_name, value, timestamp) in enumerate(updates):
+            await service._process_data(signal_name, value, timestamp)
+            if i % 100 == 99:
+                # Every `result_batch_interval` of 0.1 s
+                await service._publish_pending_results()
+        duration = time.perf_counter() - start
+        stats = service.messaging_client.metrics.snapshot()["subjects"]
+        messages = sum(stats.get(family, {}).get("published", 0) for family in ("compute.result", "compute.results"))
+        print(f"{name:>14}: {duration * 1000:9.1f} ms  ({messages:6d} messages, {messages / (args.updates / 1000):8.0f} messages/s)")
+
+
+BENCH_EXPRESSIONS = (
+    "can.data.Signal1 > 50",
+    "can.data.Signal1 * 3.6 + can.data.Signal2 / 2",
+    "can.data.Signal1 > 50 and can.data.Signal2 < 20 or not can.data.Signal3 >= 10",
+    "sqrt(can.data.Signal1 ** 2 + can.data.Signal2 ** 2) > 70",
+    "hysteresis(can.data.Signal1, 40, 60)",
+    "can.data.Signal1 > 50 for 2s",
+)
+
+
+async def bench_expressions(args):
+    state = {f"can.data.Signal{i}": random.uniform(0, 100) for i in range(4)}
+    evaluations = args.updates * 10
+    print(f"Compiled expressions, {evaluations} evaluations each:")
+    for source in BENCH_EXPRESSIONS:
+        expression = Expression(source)
+        evaluate = expression.evaluate
+        start = time.perf_counter()
+        for i in range(evaluations):
+            evaluate(state, i * 0.001)
+        duration = time.perf_counter() - start
+        print(f"{evaluations / duration:12.0f} expressions/s  {source}")
+
+    # The same triggers as `bench_trigger_index`, with conditions lists and with expressions
+    signals = [f"can.data.Signal{i}" for i in range(args.signals)]
+    updates = make_updates(signals, args.updates)
+    results = {}
+    for name in ("conditions", "expressions"):
+        random.seed(args.seed)
+        service = make_service()
+        await register_triggers(service, signals, args.triggers)
+        if name == "expressions":
+            for trigger in list(service.triggers):
+                condition = " and ".join(f"{c['name']} {c['operator']} {c['value']}" for c in trigger.pop("conditions"))
+                await service._handle_register_trigger(trigger={**trigger, "condition": condition})
+        results[name] = await process(service, updates)
+    print(f"Triggers on two signals, {args.triggers} triggers over {args.signals} signals, {args.updates} updates:")
+    for name, duration in results.items():
+        print(f"{name:>14}: {duration * 1000:9.1f} ms  ({args.updates / duration:10.0f} updates/s)")
+
+
+async def bench_snapshot(args):
+    signals = [f"can.data.Signal{i}" for i in range(args.signals)]
+    settings = persisted_configuration(signals, args)
+    # Windowed computations hold the most state: one per chained signal, with full windows
+    settings["computations"] += [{"source_signal": signal_name, "computation_type": "MovingAverage",
+                                  "output_name": f"{signal_name}.avg", "params": {"window": 1000}}
+                                 for signal_name in signals[:args.chained_signals]]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        settings["snapshot_path"] = os.path.join(tmp_dir, "compute_service.pickle")
+        service = make_service()
+        service.settings = settings
+        await service._restore_configuration()
+        await process(service, make_updates(signals[:args.chained_signals], args.updates))
+
+        start = time.perf_counter()
+        data = service._snapshot()
+        pickled = time.perf_counter()
+        await asyncio.to_thread(service._write_snapshot, settings["snapshot_path"], data)
+        written = time.perf_counter()
+
+        restarted = make_service()
+        restarted.settings = settings
+        await restarted._restore_configuration()
+        restore_start = time.perf_counter()
+        await restarted._restore_snapshot()
+        restored = time.perf_counter()
+
+    print(f"Snapshot of {len(settings['computations'])} computations and {len(settings['triggers'])} triggers "
+          f"after {args.updates} updates ({len(data) / 1024:.0f} KiB):")
+    print(f"{'pickle (loop)':>14}: {(pickled - start) * 1000:9.1f} ms")
+    print(f"{'write (thread)':>14}: {(written - pickled) * 1000:9.1f} ms")
+    print(f"{'restore':>14}: {(restored - restore_start) * 1000:9.1f} ms")
+
+
+async def run(args):
+    random.seed(args.seed)
+    await bench_trigger_index(args)
+    await bench_computation_chains(args)
+    await bench_restore(args)
+    await bench_output_policies(args)
+    await bench_expressions(args)
+    await bench_snapshot(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of the compute_service data processing.")
+    parser.add_argument("--signals", type=int, default=2000, help="Number of distinct input signals")
+    parser.add_argument("--triggers", type=int, default=500, help="Number of triggers, each on two random signals")
+    parser.add_argument("--updates", type=int, default=20000, help="Number of data points processed")
+    parser.add_argument("--chained-signals", type=int, default=200, help="Number of signals with a computation chain")
+    parser.add_argument("--chain-depth", type=int, default=3, help="Number of chained computations per signal")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random signals and values")
+    asyncio.run(run(parser.parse_args()))
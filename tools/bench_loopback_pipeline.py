@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import can
+import cantools
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.can_frames import signal_subject
+from common.loopback import LoopbackBus, LoopbackMessagingClient
+from services.can_bus_service.service import CanBusService
+from services.compute_service.service import ComputeService
+
+TRIGGER_SUBJECT = "bench.trigger.active"
+
+
+def pick_signal(db):
+    """Returns a message and one of its signals whose value differs between an all-zeros and an all-ones frame."""
+    for message in db.messages:
+        low_frame, high_frame = bytes(message.length), b"\xff" * message.length
+        low, high = db.decode_message(message.frame_id, low_frame), db.decode_message(message.frame_id, high_frame)
+        for signal in message.signals:
+            low_value, high_value = low.get(signal.name), high.get(signal.name)
+            if isinstance(low_value, (int, float)) and isinstance(high_value, (int, float)) and low_value != high_value:
+                return message, signal.name, low_frame, high_frame, low_value, high_value
+    raise ValueError("No suitable signal in the DBC file")
+
+
+async def run(args):
+    db = cantools.database.load_file(args.dbc_file)
+    message, signal_name, low_frame, high_frame, low_value, high_value = pick_signal(db)
+    channel = f"bench_pipeline_{os.getpid()}"
+
+    all_settings = {
+        "global": {},
+        "can_bus_service": {"interface": "virtual", "channel": channel, "dbc_file": args.dbc_file,
+                            "log_dir": tempfile.mkdtemp(prefix="bench_pipeline_")},
+        "compute_service": {"ui_publish_interval": 60, "computations": [], "triggers": []},
+    }
+    if args.quiet:
+        logging.disable(logging.INFO)
+
+    bus = LoopbackBus()
+    client = LoopbackMessagingClient(bus)
+    await client.connect("loopback")
+
+    async def on_settings_request(msg):
+        await msg.respond(json.dumps(all_settings).encode())
+
+    ready = asyncio.Queue()
+
+    async def on_ready(msg):
+        await ready.put(msg.subject)
+
+    await client.subscribe("settings.get.all", cb=on_settings_request)
+    await client.subscribe("service.ready.*", cb=on_ready)
+
+    services = [CanBusService(), ComputeService()]
+    for service in services:
+        service.messaging_client = LoopbackMessagingClient(bus)
+    tasks = [asyncio.create_task(service.run(install_signal_handlers=False)) for service in services]
+    for _ in services:
+        await asyncio.wait_for(ready.get(), timeout=30)
+
+    # The trigger becomes active on every high frame and inactive on every low frame
+    threshold = (low_value + high_value) / 2
+    trigger = {
+        "name": "BenchPipeline",
+        "conditions": [{"name": signal_subject(signal_name), "operator": ">" if high_value > low_value else "<", "value": threshold}],
+        "action": {"on_become_active": {"type": "publish", "subject": TRIGGER_SUBJECT}},
+    }
+    await client.request("commands.compute_service", json.dumps({"command": "register_trigger", "trigger": trigger}).encode())
+
+    fired = asyncio.Queue()
+
+    async def on_trigger(msg):
+        await fired.put(time.perf_counter())
+
+    await client.subscribe(TRIGGER_SUBJECT, cb=on_trigger)
+
+    print(f"Sending {args.frames} frames of {message.name} (0x{message.frame_id:X}), trigger on {signal_name}...")
+    sender = can.Bus(interface="virtual", channel=channel)
+    latencies = []
+    try:
+        for _ in range(args.frames):
+            sender.send(can.Message(arbitration_id=message.frame_id, data=low_frame, is_extended_id=message.is_extended_frame))
+            await asyncio.sleep(args.interval)
+            sent = time.perf_counter()
+            sender.send(can.Message(arbitration_id=message.frame_id, data=high_frame, is_extended_id=message.is_extended_frame))
+            latencies.append(await asyncio.wait_for(fired.get(), timeout=5) - sent)
+            await asyncio.sleep(args.interval)
+    finally:
+        sender.shutdown()
+        for service in services:
+            await service.stop()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies.sort()
+    print(f"CAN frame -> decode -> compute trigger -> publish, {len(latencies)} samples:")
+    print(f"  median {statistics.median(latencies) * 1e6:8.0f} us")
+    print(f"  p95    {latencies[int(len(latencies) * 0.95) - 1] * 1e6:8.0f} us")
+    print(f"  max    {latencies[-1] * 1e6:8.0f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end latency from a CAN frame to a compute trigger, on the in-process loopback bus.")
+    parser.add_argument("--dbc-file", default="config/db-full.dbc", help="DBC file used to decode the frames")
+    parser.add_argument("--frames", type=int, default=200, help="Number of frames activating the trigger")
+    parser.add_argument("--interval", type=float, default=0.005, help="Delay between two frames, in seconds")
+    parser.add_argument("--quiet", action="store_true", help="Hide the INFO logs of the services")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.messaging import NatsMessagingClient
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def process_tree(pid: int) -> list[int]:
+    """Returns a process and all its descendants (Linux /proc)."""
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name can contain spaces, the parent PID follows its closing parenthesis
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+async def measure(mode: str, url: str, timeout: float) -> dict:
+    """Starts the application in a mode and waits for the cold boot reported by the manager."""
+    client = NatsMessagingClient()
+    await client.connect(url)
+    booted = asyncio.get_running_loop().create_future()
+
+    async def on_status(msg):
+        status = json.loads(msg.data)
+        if status.get("cold_boot_ms") is not None and not booted.done():
+            booted.set_result(status)
+
+    await client.subscribe("manager.status", cb=on_status)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "main.py", "--mode", mode], cwd=PROJECT_ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        status = await asyncio.wait_for(booted, timeout=timeout)
+        elapsed = time.perf_counter() - start
+        # Let the services settle before sampling their memory
+        await asyncio.sleep(2)
+        pids = process_tree(process.pid)
+        return {
+            "mode": mode,
+            "time_to_ready_s": elapsed,
+            "cold_boot_ms": status["cold_boot_ms"],
+            "not_ready": [s["name"] for s in status["services"] if not s.get("ready")],
+            "processes": len(pids),
+            "rss_mb": sum(rss_kb(pid) for pid in pids) / 1024,
+        }
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.to_thread(process.wait, timeout=20)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await client.disconnect()
+
+
+async def run(args):
+    results = []
+    for mode in args.modes:
+        print(f"Starting the application in {mode} mode...")
+        results.append(await measure(mode, args.url, args.timeout))
+        await asyncio.sleep(1)
+
+    print(f"{'mode':>10} {'ready (s)':>10} {'cold boot (ms)':>15} {'processes':>10} {'RSS (MB)':>10}")
+    for result in results:
+        print(f"{result['mode']:>10} {result['time_to_ready_s']:>10.2f} {result['cold_boot_ms']:>15.0f} "
+              f"{result['processes']:>10} {result['rss_mb']:>10.1f}")
+        if result["not_ready"]:
+            print(f"{'':>10} services not ready: {', '.join(result['not_ready'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the startup time and memory of the process and monolith manager modes.")
+    parser.add_argument("--url", default="nats://127.0.0.1:4222", help="URL of the NATS server used by the application")
+    parser.add_argument("--modes", nargs="+", default=["process", "monolith"], help="Manager modes to compare")
+    parser.add_argument("--timeout", type=float, default=120, help="Maximum time to wait for a cold boot, in seconds")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.messaging import NatsMessagingClient, PublishBatch, CodecRegistry
+
+
+def build_messages(count: int, subjects: int) -> list[tuple[str, float, float]]:
+    """Builds (subject, value, timestamp) data points spread over a number of subjects."""
+    return [(f"bench.data.Signal{i % subjects}", float(i), time.time()) for i in range(count)]
+
+
+async def publish_per_message(client, codecs, messages):
+    for subject, value, timestamp in messages:
+        payload, headers = codecs.encode_value(subject, value, timestamp)
+        await client.publish(subject, payload, headers=headers)
+
+
+async def publish_batched(client, codecs, messages, max_bytes):
+    async with PublishBatch(client, codecs, max_bytes=max_bytes) as batch:
+        for subject, value, timestamp in messages:
+            await batch.publish_value(subject, value, timestamp)
+
+
+async def run(args):
+    options = {"pending_size": args.pending_size}
+    publisher = NatsMessagingClient()
+    receiver = NatsMessagingClient()
+    await publisher.connect(args.url, **options)
+    await receiver.connect(args.url)
+
+    received = 0
+
+    async def on_message(msg):
+        nonlocal received
+        received += 1
+
+    await receiver.subscribe("bench.data.>", cb=on_message)
+    await receiver.flush()
+
+    codecs = CodecRegistry({"bench.data": args.codec})
+    messages = build_messages(args.messages, args.subjects)
+    print(f"Publishing {len(messages)} messages on {args.subjects} subjects to {args.url}, best of {args.repeat}...")
+
+    modes = {
+        "per message": lambda: publish_per_message(publisher, codecs, messages),
+        "batched": lambda: publish_batched(publisher, codecs, messages, args.batch_bytes),
+    }
+    results = {}
+    for name, publish in modes.items():
+        durations = []
+        for _ in range(args.repeat):
+            received = 0
+            start = time.perf_counter()
+            await publish()
+            # The round trip guarantees the server got everything that was written
+            await publisher.flush(timeout=10)
+            durations.append(time.perf_counter() - start)
+            for _ in range(500):
+                if received >= len(messages):
+                    break
+                await asyncio.sleep(0.01)
+            if received < len(messages):
+                print(f"Warning: the subscriber only received {received}/{len(messages)} messages ({name})")
+        results[name] = min(durations)
+
+    for name, duration in results.items():
+        print(f"{name:>12}: {duration * 1000:8.2f} ms  ({len(messages) / duration:10.0f} msgs/s)")
+    print(f"Speedup: {results['per message'] / results['batched']:.2f}x")
+
+    await publisher.disconnect()
+    await receiver.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of per-message and batched publishing to a NATS server.")
+    parser.add_argument("--url", default="nats://127.0.0.1:4222", help="URL of the NATS server")
+    parser.add_argument("--messages", type=int, default=100000, help="Number of messages per run")
+    parser.add_argument("--subjects", type=int, default=100, help="Number of distinct subjects")
+    parser.add_argument("--codec", default="json", help="Codec of the published data points")
+    parser.add_argument("--batch-bytes", type=int, default=65536, help="Payload bytes after which a batch is flushed")
+    parser.add_argument("--pending-size", type=int, default=2 * 1024 * 1024, help="Size of the nats-py pending buffer")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timing runs")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.messaging import NatsMessagingClient
+from services.manager.zygote import Zygote, is_supported
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+async def restart_latencies(launch, ready: asyncio.Queue, restarts: int, timeout: float) -> list[float]:
+    """Starts a service `restarts` times and returns the delays until it announced it was ready."""
+    latencies = []
+    for _ in range(restarts):
+        start = time.perf_counter()
+        process = await launch()
+        await asyncio.wait_for(ready.get(), timeout=timeout)
+        latencies.append(time.perf_counter() - start)
+        process.terminate()
+        try:
+            await asyncio.to_thread(process.wait, timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return latencies
+
+
+async def run(args):
+    with open(args.settings_file) as f:
+        all_settings = json.load(f)
+    all_settings.setdefault("global", {})["nats_url"] = args.url
+    settings = json.dumps(all_settings).encode()
+
+    client = NatsMessagingClient()
+    await client.connect(args.url)
+    ready = asyncio.Queue()
+
+    async def on_settings_request(msg):
+        await client.publish(msg.reply, settings)
+
+    async def on_ready(msg):
+        await ready.put(msg.subject)
+
+    # Serve the settings, so that no settings_service is needed
+    await client.subscribe("settings.get.all", cb=on_settings_request)
+    await client.subscribe(f"service.ready.{args.service}", cb=on_ready)
+    await client.flush()
+
+    service_main = os.path.join(PROJECT_ROOT, "services", args.service, "main.py")
+
+    async def launch_process():
+        return subprocess.Popen([sys.executable, service_main], cwd=PROJECT_ROOT,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    results = {"popen": await restart_latencies(launch_process, ready, args.restarts, args.timeout)}
+
+    if is_supported():
+        logger = logging.getLogger("bench_restart_latency")
+        zygote = Zygote([f"services.{args.service}.service"], logger)
+        zygote.start()
+        try:
+            launch_fork = lambda: zygote.spawn(args.service)
+            # The first spawn waits for the zygote to preload the modules
+            await restart_latencies(launch_fork, ready, 1, args.timeout)
+            results["zygote"] = await restart_latencies(launch_fork, ready, args.restarts, args.timeout)
+        finally:
+            zygote.stop()
+    else:
+        print("os.fork is not available, skipping the zygote launcher.")
+
+    print(f"Restart latency of {args.service} until it is ready, {args.restarts} restarts:")
+    for name, latencies in results.items():
+        print(f"{name:>8}: median {statistics.median(latencies) * 1000:8.1f} ms, "
+              f"min {min(latencies) * 1000:8.1f} ms, max {max(latencies) * 1000:8.1f} ms")
+    if "zygote" in results:
+        print(f"Speedup: {statistics.median(results['popen']) / statistics.median(results['zygote']):.1f}x")
+    await client.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Restart latency of a service started with Popen or forked from the zygote.")
+    parser.add_argument("--url", default="nats://127.0.0.1:4222", help="URL of the NATS server")
+    parser.add_argument("--service", default="can_bus_service", help="Service to restart")
+    parser.add_argument("--settings-file", default="config/settings.json", help="Settings served to the service")
+    parser.add_argument("--restarts", type=int, default=5, help="Number of restarts per launcher")
+    parser.add_argument("--timeout", type=float, default=60, help="Maximum time to wait for the service to be ready")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.messaging import NatsMessagingClient
+from common.microservice import Microservice
+
+
+class BenchService(Microservice):
+    async def _start_logic(self):
+        pass
+
+    async def _stop_logic(self):
+        pass
+
+
+async def bootstrap_shared(name: str, url: str) -> tuple[float, Microservice]:
+    """Bootstraps a service with `Microservice.get_settings`, on a single connection."""
+    service = BenchService(name)
+    service.logger.setLevel(logging.WARNING)
+    service.nats_url = url
+    start = time.perf_counter()
+    await service.get_settings()
+    return time.perf_counter() - start, service
+
+
+async def bootstrap_separate(name: str, url: str) -> tuple[float, Microservice]:
+    """The previous bootstrap: a temporary connection for the settings request, then the main one."""
+    service = BenchService(name)
+    service.logger.setLevel(logging.WARNING)
+    start = time.perf_counter()
+    settings_client = NatsMessagingClient()
+    await settings_client.connect(url)
+    response = await settings_client.request("settings.get.all", b'', timeout=2.0)
+    await settings_client.disconnect()
+    service.all_settings = json.loads(response.data)
+    await service.messaging_client.connect(url)
+    return time.perf_counter() - start, service
+
+
+async def run(args):
+    with open(args.settings_file) as f:
+        all_settings = json.load(f)
+    all_settings.setdefault("global", {})["nats_url"] = args.url
+    settings = json.dumps(all_settings).encode()
+    services = [name for name, block in all_settings.items() if name != "global" and isinstance(block, dict)]
+    services = (services * (args.services // max(len(services), 1) + 1))[:args.services]
+
+    responder = NatsMessagingClient()
+    await responder.connect(args.url)
+
+    async def on_request(msg):
+        await responder.publish(msg.reply, settings)
+
+    await responder.subscribe("settings.get.all", cb=on_request)
+    await responder.flush()
+    print(f"Bootstrapping {len(services)} services against {args.url}, best of {args.repeat}...")
+
+    modes = {"separate connections": bootstrap_separate, "shared connection": bootstrap_shared}
+    results = {}
+    for mode, bootstrap in modes.items():
+        runs = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(*(bootstrap(name, args.url) for name in services))
+            total = time.perf_counter() - start
+            runs.append((total, statistics.mean(duration for duration, _ in outcomes)))
+            for _, service in outcomes:
+                await service.messaging_client.disconnect()
+        results[mode] = min(runs)
+
+    for mode, (total, mean) in results.items():
+        print(f"{mode:>20}: all ready in {total * 1000:7.1f} ms, mean time-to-ready {mean * 1000:6.1f} ms")
+    print(f"Reduction: {(1 - results['shared connection'][0] / results['separate connections'][0]):.0%}")
+    await responder.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-ready of the services settings bootstrap against a NATS server.")
+    parser.add_argument("--url", default="nats://127.0.0.1:4222", help="URL of the NATS server")
+    parser.add_argument("--settings-file", default="config/settings.json", help="Settings served to the services")
+    parser.add_argument("--services", type=int, default=10, help="Number of services started at the same time")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timing runs")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,16 @@
+"""
+    Setup of the test session: the services created by the tests, in this
+    process or in the processes they start, log to a temporary directory
+    instead of `logs/`.
+"""
+import os
+import sys
+import tempfile
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.logging_setup import LOG_DIR_ENV
+
+_log_dir = tempfile.TemporaryDirectory(prefix="test_logs_")
+os.environ.setdefault(LOG_DIR_ENV, _log_dir.name)
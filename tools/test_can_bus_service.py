@@ -0,0 +1,367 @@
+import unittest
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from unittest.mock import AsyncMock, patch
+
+import os
+import sys
+
+import can
+import cantools
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.can_bus_service.service import CanBusService
+from services.can_bus_service.decoder import DecoderCache
+from services.can_bus_service.deadband import DeadbandFilter
+from services.can_bus_service.decode_worker import DecodeListener
+from services.can_bus_service.filters import build_acceptance_filters
+from services.can_bus_service.ring_buffer import PretriggerBuffer
+from common.can_frames import fan_out_frame
+
+DBC_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'config', 'db-light.dbc'))
+
+
+def make_frame(arbitration_id=650, data=bytes(range(8)), timestamp=1.0):
+    return can.Message(arbitration_id=arbitration_id, data=data, timestamp=timestamp, is_extended_id=False)
+
+
+class TestCanFramePublishing(unittest.TestCase):
+
+    def setUp(self):
+        self.service = CanBusService()
+        self.service.logger.disabled = True
+        self.service.messaging_client = AsyncMock()
+        self.service.db = cantools.db.load_file(DBC_FILE)
+        self.service.decoder = DecoderCache(self.service.db)
+
+    def test_signal_mode(self):
+        """Each decoded signal is published on its own subject."""
+        publications = self.service._encode_frame(make_frame())
+        subjects = [subject for subject, _, _ in publications]
+        self.assertEqual(len(publications), 4)
+        self.assertIn("can.data.A1_BOOM_HP_b", subjects)
+        payload = json.loads(publications[0][1])
+        self.assertEqual(payload["ts"], 1.0)
+
+    def test_frame_mode(self):
+        """A whole frame is published as a single message."""
+        self.service.publish_mode = "frame"
+        publications = self.service._encode_frame(make_frame())
+        self.assertEqual(len(publications), 1)
+        subject, payload, headers = publications[0]
+        self.assertEqual(subject, "can.frame.AIN1_4")
+        self.assertIsNone(headers)
+
+        # The per-signal view is derived by the fan-out helper
+        expected = {s: json.loads(p) for s, p, _ in CanBusService._encode_frame(self._signal_service(), make_frame())}
+        for signal_subject, value, ts in fan_out_frame(payload):
+            self.assertEqual(expected[signal_subject], {"value": value, "ts": ts})
+
+    def test_window_mode(self):
+        """Frames are accumulated until the window publisher flushes them."""
+        self.service.publish_mode = "window"
+        self.service.publish_window = 0.01
+        self.assertEqual(self.service._encode_frame(make_frame(timestamp=1.0)), [])
+        self.assertEqual(self.service._encode_frame(make_frame(data=bytes(8), timestamp=2.0)), [])
+
+        async def run_test():
+            task = asyncio.create_task(self.service._window_publisher())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(run_test())
+        self.service.messaging_client.publish_many.assert_called_once()
+        [(subject, payload, headers)] = self.service.messaging_client.publish_many.call_args.args[0]
+        self.assertEqual(subject, "can.frame.AIN1_4")
+        self.assertEqual(json.loads(payload)["ts"], 2.0)
+
+    def test_unknown_id(self):
+        self.assertEqual(self.service._encode_frame(make_frame(arbitration_id=0x7FF)), [])
+        self.assertEqual(self.service.decoder.unknown_ids, {0x7FF})
+
+    def _signal_service(self):
+        service = CanBusService()
+        service.logger.disabled = True
+        service.db = self.service.db
+        service.decoder = self.service.decoder
+        return service
+
+
+class TestDecoderCache(unittest.TestCase):
+
+    def test_matches_cantools(self):
+        """The compiled decoders give the same values as the generic cantools decoder."""
+        db = cantools.db.load_file(os.path.join(os.path.dirname(DBC_FILE), 'db-full.dbc'))
+        cache = DecoderCache(db)
+        payloads = [bytes(8), bytes([0xFF] * 8), bytes(range(8)), bytes([0x80, 0x7F] * 4)]
+        for message in db.messages:
+            for data in payloads:
+                expected = db.decode_message(message.frame_id, data[:message.length], decode_choices=False)
+                name, signals = cache.decode(message.frame_id, data[:message.length])
+                self.assertEqual(name, message.name)
+                for signal_name, value in expected.items():
+                    self.assertAlmostEqual(signals[signal_name], value, places=9)
+
+    def test_big_endian_and_unknown(self):
+        db = cantools.database.can.Database()
+        db.add_dbc_string(
+            'BO_ 100 BigEndian: 8 Vector__XXX\n'
+            ' SG_ Speed : 7|16@0+ (0.5,10) [0|0] "" Vector__XXX\n'
+            ' SG_ Temp : 23|12@0- (1,-40) [0|0] "" Vector__XXX\n'
+        )
+        cache = DecoderCache(db)
+        for data in (bytes(8), bytes([0xFF] * 8), bytes([0x12, 0x34, 0x56, 0x78, 0x9A, 0xBC, 0xDE, 0xF0])):
+            expected = db.decode_message(100, data)
+            _, signals = cache.decode(100, data)
+            self.assertEqual(signals, {k: float(v) for k, v in expected.items()})
+
+        self.assertIsNone(cache.decode(101, bytes(8)))
+        self.assertEqual(cache.unknown_frames, 1)
+
+
+class TestDeadbandFilter(unittest.TestCase):
+
+    def test_deadband_and_heartbeat(self):
+        deadband = DeadbandFilter({
+            "default": {"deadband": 1.0, "heartbeat_ms": 1000},
+            "signals": {"Pressure": {"deadband": 10.0, "min_interval_ms": 100}}
+        })
+        self.assertTrue(deadband.accept("Angle", 0.0, 0.0))    # First value
+        self.assertFalse(deadband.accept("Angle", 0.5, 0.1))   # Within the deadband
+        self.assertTrue(deadband.accept("Angle", 1.5, 0.2))    # Changed by more than 1.0
+        self.assertFalse(deadband.accept("Angle", 1.5, 1.1))
+        self.assertTrue(deadband.accept("Angle", 1.5, 1.2))    # Heartbeat
+
+        self.assertTrue(deadband.accept("Pressure", 0.0, 0.0))
+        self.assertFalse(deadband.accept("Pressure", 20.0, 0.05))  # Minimum interval not elapsed
+        self.assertTrue(deadband.accept("Pressure", 20.0, 0.1))
+        self.assertEqual((deadband.published, deadband.suppressed), (5, 3))
+
+    def test_suppressed_frames(self):
+        service = CanBusService()
+        service.logger.disabled = True
+        service.decoder = DecoderCache(cantools.db.load_file(DBC_FILE))
+        service.deadband = DeadbandFilter({"default": {"heartbeat_ms": 0}})
+
+        self.assertEqual(len(service._encode_frame(make_frame(timestamp=1.0))), 4)
+        self.assertEqual(service._encode_frame(make_frame(timestamp=2.0)), [])
+        self.assertEqual(service._get_stats()["frames_suppressed"], 1)
+        self.assertEqual(service._get_stats()["signals_suppressed"], 4)
+
+
+class TestDecodeListener(unittest.TestCase):
+
+    def _run_overflow(self, overflow):
+        async def run_test():
+            def encode(msg):
+                return [(f"can.data.{msg.arbitration_id}", bytes(msg.data))]
+
+            listener = DecodeListener(encode, asyncio.get_running_loop(), max_queue=3, overflow=overflow)
+            # Frames are received in the notifier thread
+            await asyncio.to_thread(lambda: [listener.on_message_received(make_frame(arbitration_id=i)) for i in range(5)])
+            batch = await listener.get_batch()
+            return [subject for subject, _ in batch], listener.get_stats()
+
+        return asyncio.run(run_test())
+
+    def test_drop_oldest(self):
+        subjects, stats = self._run_overflow("drop_oldest")
+        self.assertEqual(subjects, ["can.data.2", "can.data.3", "can.data.4"])
+        self.assertEqual((stats["queue_enqueued"], stats["queue_dropped"], stats["queue_depth"]), (5, 2, 0))
+
+    def test_drop_newest(self):
+        subjects, stats = self._run_overflow("drop_newest")
+        self.assertEqual(subjects, ["can.data.0", "can.data.1", "can.data.2"])
+        self.assertEqual((stats["queue_enqueued"], stats["queue_dropped"]), (3, 2))
+
+    def test_threaded_service(self):
+        """In thread mode, frames received on the bus are published from the event loop."""
+        service = CanBusService()
+        service.logger.disabled = True
+        service.messaging_client = AsyncMock()
+        service.decoder = DecoderCache(cantools.db.load_file(DBC_FILE))
+        service.decode_mode = "thread"
+
+        def published():
+            calls = service.messaging_client.publish_many.call_args_list
+            return [message for call in calls for message in call.args[0]]
+
+        async def run_test():
+            service.can_bus = can.interface.Bus(channel="test_threaded_service", interface="virtual")
+            sender = can.interface.Bus(channel="test_threaded_service", interface="virtual")
+            task = asyncio.create_task(service._message_listener())
+            await asyncio.sleep(0.05)
+            sender.send(make_frame())
+            for _ in range(100):
+                if len(published()) >= 4:
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            sender.shutdown()
+            service.can_bus.shutdown()
+
+        asyncio.run(run_test())
+        self.assertEqual(len(published()), 4)
+        self.assertEqual(service._get_stats()["queue_enqueued"], 4)
+
+    def test_unknown_overflow_policy(self):
+        """An unknown overflow policy falls back to drop_oldest instead of killing the listener task."""
+        service = CanBusService()
+        service.logger.disabled = True
+        service.messaging_client = AsyncMock()
+        service.get_settings = AsyncMock()
+        service.settings = {"interface": "virtual", "channel": "test_unknown_overflow_policy",
+                            "decode_mode": "thread", "decode_queue_overflow": "drop_everything"}
+
+        async def run_test():
+            with patch("services.can_bus_service.service.S3Uploader") as uploader:
+                uploader.return_value.start = AsyncMock()
+                uploader.return_value.stop = AsyncMock()
+                await service._start_logic()
+                await asyncio.sleep(0.05)
+                self.assertFalse(service.listener_task.done())
+                await service._stop_logic()
+                await asyncio.gather(service.listener_task, return_exceptions=True)
+
+        asyncio.run(run_test())
+        self.assertEqual(service.decode_listener.overflow, "drop_oldest")
+
+
+class TestAcceptanceFilters(unittest.TestCase):
+
+    def test_exact_filters(self):
+        filters = build_acceptance_filters([(0x28A, False), (0x18FEF100, True), (0x28A, False)])
+        self.assertEqual(filters, [
+            {"can_id": 0x28A, "can_mask": 0x7FF, "extended": False},
+            {"can_id": 0x18FEF100, "can_mask": 0x1FFFFFFF, "extended": True},
+        ])
+
+    def test_merged_filters(self):
+        """Over the driver limit, only as many IDs as needed are merged into filters matching their common bits."""
+        frame_ids = [(0x290, False), (0x292, False), (0x296, False), (0x500, False)]
+        filters = build_acceptance_filters(frame_ids, max_filters=2)
+        self.assertEqual(filters, [
+            {"can_id": 0x290, "can_mask": 0x7F9, "extended": False},
+            {"can_id": 0x500, "can_mask": 0x7FF, "extended": False},
+        ])
+        self.assertNotEqual(0x28A & 0x7F9, 0x290)
+
+    def test_merged_filters_of_both_kinds(self):
+        """Standard and extended filters both count against the driver limit."""
+        frame_ids = [(0x290, False), (0x292, False), (0x18FEF100, True), (0x18FEF200, True)]
+        filters = build_acceptance_filters(frame_ids, max_filters=3)
+        self.assertEqual(len(filters), 3)
+        self.assertEqual(sum(1 for can_filter in filters if can_filter["extended"]), 2)
+
+        filters = build_acceptance_filters(frame_ids, max_filters=1)
+        self.assertEqual(len(filters), 1)
+        self.assertNotIn("extended", filters[0])
+        with can.interface.Bus(channel="test_merged_filters", interface="virtual", can_filters=filters) as bus, \
+                can.interface.Bus(channel="test_merged_filters", interface="virtual") as sender:
+            for can_id, extended in frame_ids:
+                sender.send(can.Message(arbitration_id=can_id, is_extended_id=extended, data=[0]))
+            received = [bus.recv(timeout=0.1) for _ in frame_ids]
+        self.assertEqual([(msg.arbitration_id, msg.is_extended_id) for msg in received if msg], frame_ids)
+
+    def test_service_filters(self):
+        """Frames unknown to the DBC and the allow-list never reach the service."""
+        service = CanBusService()
+        service.logger.disabled = True
+        service.db = cantools.db.load_file(DBC_FILE)
+        service.settings = {"filter_allow_ids": ["0x7E0"]}
+        can_filters = service._build_can_filters()
+        self.assertEqual(len(can_filters), len(service.db.messages) + 1)
+
+        with can.interface.Bus(channel="test_service_filters", interface="virtual", can_filters=can_filters) as bus, \
+                can.interface.Bus(channel="test_service_filters", interface="virtual") as sender:
+            for arbitration_id in (0x123, 650, 0x7E0):
+                sender.send(make_frame(arbitration_id=arbitration_id))
+            received = [bus.recv(timeout=0.1) for _ in range(3)]
+        self.assertEqual([msg.arbitration_id for msg in received if msg], [650, 0x7E0])
+
+
+class TestPretriggerBuffer(unittest.TestCase):
+
+    def test_window_and_wrap_around(self):
+        # Room for 4 classic CAN frames
+        buffer = PretriggerBuffer(window=2.0, max_bytes=4 * 22)
+        self.assertEqual(buffer.capacity, 4)
+        for i in range(6):
+            buffer.on_message_received(make_frame(arbitration_id=i, data=bytes([i] * (i + 1)), timestamp=float(i)))
+
+        recorded = []
+        listener = can.BufferedReader()
+        # Frame 2 is out of the 2 second window before t=5
+        self.assertEqual(buffer.attach(listener, now=5.0), 3)
+        while (msg := listener.get_message(timeout=0)) is not None:
+            recorded.append(msg)
+        # Frames 0 and 1 were overwritten
+        self.assertEqual([msg.arbitration_id for msg in recorded], [3, 4, 5])
+        self.assertEqual(recorded[-1].data, bytes([5] * 6))
+        self.assertEqual(recorded[-1].timestamp, 5.0)
+        self.assertFalse(recorded[-1].is_extended_id)
+
+        # Live frames are forwarded until the target is detached
+        buffer.on_message_received(make_frame(arbitration_id=6, timestamp=6.0))
+        buffer.detach()
+        buffer.on_message_received(make_frame(arbitration_id=7, timestamp=7.0))
+        self.assertEqual(listener.get_message(timeout=0).arbitration_id, 6)
+        self.assertIsNone(listener.get_message(timeout=0))
+
+        # After an idle period, the old frames are not pre-trigger frames
+        self.assertEqual(buffer.attach(listener, now=60.0), 0)
+        buffer.detach()
+
+    def test_frames_received_during_the_flush_are_queued(self):
+        buffer = PretriggerBuffer(window=10.0)
+        for i in range(3):
+            buffer.on_message_received(make_frame(arbitration_id=i, timestamp=float(i)))
+
+        class SlowWriter(can.Listener):
+            """A target receiving a live frame from the notifier thread during the flush."""
+            def __init__(self):
+                self.ids = []
+
+            def on_message_received(self, msg):
+                if msg.arbitration_id == 0:
+                    # Doesn't block: the lock isn't held while flushing
+                    thread = threading.Thread(target=buffer.on_message_received,
+                                              args=(make_frame(arbitration_id=10, timestamp=3.0),))
+                    thread.start()
+                    thread.join(timeout=1)
+                    self.blocked = thread.is_alive()
+                self.ids.append(msg.arbitration_id)
+
+        writer = SlowWriter()
+        self.assertEqual(buffer.attach(writer, now=3.0), 3)
+        self.assertFalse(writer.blocked)
+        buffer.on_message_received(make_frame(arbitration_id=11, timestamp=4.0))
+        self.assertEqual(writer.ids, [0, 1, 2, 10, 11])
+
+    def test_recording_includes_pretrigger_frames(self):
+        service = CanBusService()
+        service.logger.disabled = True
+        service.pretrigger_buffer = PretriggerBuffer(window=1.0)
+        # Attached at the current time, the first frame is out of the window
+        now = time.time()
+        for age in (2.5, 0.5, 0.2):
+            service.pretrigger_buffer.on_message_received(make_frame(timestamp=now - age))
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            service.settings = {"log_dir": log_dir, "log_file_format": ".asc"}
+            asyncio.run(service._handle_start_recording(filename="pretrigger"))
+            service.pretrigger_buffer.detach()
+            service.can_logger.stop()
+            with can.LogReader(os.path.join(log_dir, "pretrigger.asc")) as reader:
+                self.assertEqual(len(list(reader)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
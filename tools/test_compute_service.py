@@ -1,5 +1,7 @@
 import unittest
 import asyncio
+import json
+import tempfile
 from unittest.mock import AsyncMock, patch
 
 import os
@@ -9,7 +11,13 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from services.compute_service.service import ComputeService
-from services.compute_service.computations import RunningAverage, Integrator, Differentiator
+from services.compute_service.computations import (
+    RunningAverage, Integrator, Differentiator, ExponentialMovingAverage, MovingAverage, MovingMin, MovingMax,
+    MovingStdDev, MovingRMS, RateOfChange, Percentile, CumulativePercentile,
+)
+from services.compute_service.expressions import Expression, ExpressionError
+from services.compute_service.output_policy import OutputPolicy
+from services.compute_service import replay
 
 class TestGenericComputations(unittest.TestCase):
     def test_running_average(self):
@@ -30,6 +38,147 @@ class TestGenericComputations(unittest.TestCase):
         self.assertEqual(diff.update(20, 1), 10.0) # (20-10)/(1-0)
         self.assertEqual(diff.update(15, 3), -2.5) # (15-20)/(3-1)
 
+    def test_exponential_moving_average(self):
+        ema = ExponentialMovingAverage(alpha=0.5)
+        self.assertEqual(ema.update(10, 0), 10.0) # First point initializes
+        self.assertEqual(ema.update(20, 1), 15.0)
+        self.assertEqual(ema.update(15, 2), 15.0)
+        with self.assertRaises(ValueError):
+            ExponentialMovingAverage(alpha=0)
+
+    def test_windowed_computations(self):
+        values = [5, 3, 4, 6, 7, 1, 2]
+        avg, low, high = MovingAverage(window=3), MovingMin(window=3), MovingMax(window=3)
+        results = [(avg.update(v, t), low.update(v, t), high.update(v, t)) for t, v in enumerate(values)]
+        # The window of t=6 holds the samples of t=3..6
+        self.assertEqual(results[-1], (4.0, 1, 7))
+        self.assertEqual(results[3], (4.5, 3, 6))
+
+        std, rms = MovingStdDev(window=1), MovingRMS(window=1)
+        for t, v in enumerate([100, 2, 4]):
+            last = (std.update(v, t), rms.update(v, t))
+        self.assertAlmostEqual(last[0], 1.0)
+        self.assertAlmostEqual(last[1], (10.0) ** 0.5)
+
+        rate = RateOfChange(window=2)
+        self.assertEqual(rate.update(0, 0), 0.0)
+        self.assertEqual(rate.update(10, 1), 10.0)
+        self.assertEqual(rate.update(40, 4), 0.0) # Alone in its window
+        self.assertEqual(rate.update(50, 5), 10.0)
+
+    def test_window_memory_is_bounded(self):
+        avg, low = MovingAverage(window=1000, max_samples=10), MovingMin(window=1000, max_samples=10)
+        for t in range(100):
+            avg.update(t, t)
+            low.update(t, t)
+        self.assertEqual(len(avg.samples), 10)
+        self.assertEqual(avg.update(100, 100), 95.5)
+        self.assertEqual(low.update(100, 100), 91)
+
+    def test_percentile(self):
+        median, p90 = Percentile(50, window=5), Percentile(90, window=5, max_samples=4)
+        for t, value in enumerate([9, 1, 8, 2, 7, 3, 6]):
+            results = (median.update(value, t), p90.update(value, t))
+        # The window of t=6 holds the samples of t=1..6, the last 4 of them for the 90th percentile
+        self.assertEqual(results, (6, 7))
+        self.assertEqual((median.lower.size, median.upper.size), (4, 2))
+        # The percentile follows the recent samples
+        for t in range(7, 20):
+            result = median.update(100 + t, t)
+        self.assertEqual(result, 117)
+        with self.assertRaises(ValueError):
+            Percentile(100)
+
+    def test_percentile_matches_the_sorted_window(self):
+        percentiles = [Percentile(p, window=50, max_samples=40) for p in (5, 50, 95)]
+        samples = []
+        for t in range(2000):
+            value = (t * 7919) % 101 # shuffled, with duplicates
+            samples = [(s, v) for s, v in samples + [(t, value)] if s >= t - 50][-40:]
+            expected = sorted(v for _, v in samples)
+            for percentile in percentiles:
+                rank = min(int(len(expected) * percentile.percentile / 100), len(expected) - 1)
+                self.assertEqual(percentile.update(value, t), expected[rank])
+        # The expired samples left in the heaps stay bounded
+        self.assertLess(len(percentiles[1].upper.items), 2 * 40 + 16)
+
+    def test_cumulative_percentile(self):
+        median, p90 = CumulativePercentile(50), CumulativePercentile(90)
+        for i in range(1001):
+            value = (i * 7919) % 1001 # 0..1000 shuffled
+            median.update(value, i)
+            p90.update(value, i)
+        self.assertAlmostEqual(median.heights[2], 500, delta=10)
+        self.assertAlmostEqual(p90.heights[2], 900, delta=10)
+
+class TestOutputPolicy(unittest.TestCase):
+    def published(self, policy, samples):
+        return [(value, t) for value, t in samples if policy.should_publish(value, t)]
+
+    def test_max_rate(self):
+        # 100 Hz limited to 10 Hz
+        samples = [(i, i * 0.01) for i in range(50)]
+        self.assertEqual([v for v, _ in self.published(OutputPolicy(max_rate_hz=10), samples)], [0, 10, 20, 30, 40])
+
+    def test_decimation(self):
+        samples = [(i, i) for i in range(10)]
+        self.assertEqual([v for v, _ in self.published(OutputPolicy(decimation=4), samples)], [0, 4, 8])
+
+    def test_deadband(self):
+        samples = list(zip([10, 10.4, 10.6, 10.9, 11.2, 11.2, 9], range(7)))
+        self.assertEqual([v for v, _ in self.published(OutputPolicy(deadband=0.5), samples)], [10, 10.6, 11.2, 9])
+        # 0 publishes on change, also for non-numeric values
+        samples = list(zip(["on", "on", "off", "off", "on"], range(5)))
+        self.assertEqual([v for v, _ in self.published(OutputPolicy(deadband=0), samples)], ["on", "off", "on"])
+
+    def test_invalid_options(self):
+        for options in ({"max_rate_hz": -1}, {"decimation": 0}, {"decimation": 1.5}, {"deadband": -1}):
+            with self.assertRaises(ValueError):
+                OutputPolicy(**options)
+        with self.assertRaises(TypeError):
+            OutputPolicy(rate=10)
+
+
+class TestExpressions(unittest.TestCase):
+    def test_arithmetic_and_logic(self):
+        state = {"can.data.Speed": 20, "gps.vx": 3, "gps.vy": 4, "sensor-1": "on"}
+        cases = {
+            "can.data.Speed * 3.6 + 1": 73.0,
+            "-gps.vx ** 2 + 10 % 3": -8,
+            "sqrt(gps.vx ** 2 + gps.vy ** 2)": 5.0,
+            "max(gps.vx, gps.vy, 1) - abs(-gps.vx)": 1,
+            "0 < gps.vx < gps.vy && !(can.data.Speed == 10)": True,
+            "gps.vx > 5 or `sensor-1` == 'on'": True,
+            "not (gps.vx != 3) and false": False,
+        }
+        for source, expected in cases.items():
+            expression = Expression(source)
+            self.assertEqual(expression.evaluate(state, 0), expected, source)
+        self.assertEqual(Expression("gps.vx + `sensor-1` == 'x'").signals, {"gps.vx", "sensor-1"})
+        with self.assertRaises(KeyError):
+            Expression("unknown > 1").evaluate(state, 0)
+
+    def test_duration(self):
+        expression = Expression("pressure > 200 for 2s and valve == 'open'")
+        samples = [(250, 0), (250, 1.5), (250, 2), (100, 2.5), (300, 3), (300, 4.9), (300, 5)]
+        results = [expression.evaluate({"pressure": p, "valve": "open"}, t) for p, t in samples]
+        self.assertEqual(results, [False, False, True, False, False, False, True])
+        # The duration is followed even when the other operand is false
+        expression = Expression("valve == 'open' and pressure > 200 for 500ms")
+        expression.evaluate({"pressure": 250, "valve": "closed"}, 0)
+        self.assertTrue(expression.evaluate({"pressure": 250, "valve": "open"}, 0.5))
+
+    def test_hysteresis(self):
+        expression = Expression("hysteresis(temp, 90, 100)")
+        results = [expression.evaluate({"temp": t}, 0) for t in (95, 101, 95, 91, 89, 95)]
+        self.assertEqual(results, [False, True, True, True, False, False])
+
+    def test_invalid_expressions(self):
+        for source in ("", "a >", "(a", "a b", "1 + 2", "a for x", "foo(a)", "hysteresis(a, 1)", "a $ b", "for > 1"):
+            with self.assertRaises(ExpressionError, msg=source):
+                Expression(source)
+
+
 class TestComputeServiceIntegration(unittest.TestCase):
 
     def setUp(self):
@@ -94,6 +243,172 @@ class TestComputeServiceIntegration(unittest.TestCase):
 
         asyncio.run(run_test())
 
+    def test_register_computation_with_params(self):
+        async def run_test():
+            await self.service._handle_register_computation(
+                source_signal="can.speed", computation_type="MovingAverage", output_name="speed_avg_2s",
+                params={"window": 2}, reply="r1")
+            await self.service._handle_register_computation(
+                source_signal="can.speed", computation_type="MovingAverage", output_name="bad",
+                params={"window": -1}, reply="r2")
+            await self.service._handle_register_computation(
+                source_signal="can.speed", computation_type="ExponentialMovingAverage", output_name="bad",
+                params={"window": 2}, reply="r3")
+
+            replies = {call.args[0]: json.loads(call.args[1]) for call in self.service.messaging_client.publish.call_args_list
+                       if call.args[0].startswith("r")}
+            self.assertEqual([replies[r]["status"] for r in ("r1", "r2", "r3")], ["ok", "error", "error"])
+            self.assertEqual(self.service.active_computations["can.speed"][0]["instance"].window, 2.0)
+            self.assertEqual(self.service._computation_definitions(), [{
+                "source_signal": "can.speed", "computation_type": "MovingAverage",
+                "output_name": "speed_avg_2s", "params": {"window": 2},
+            }])
+
+        asyncio.run(run_test())
+
+    def test_output_policies(self):
+        async def run_test():
+            await self.service._handle_register_computation(
+                source_signal="can.speed", computation_type="RunningAverage", output_name="speed_avg",
+                output={"max_rate_hz": 10})
+            await self.service._handle_register_computation(
+                source_signal="speed_avg", computation_type="Integrator", output_name="distance",
+                output={"decimation": 5, "batch": True})
+            await self.service._handle_register_computation(
+                source_signal="can.speed", computation_type="Differentiator", output_name="bad", output={"rate": 1},
+                reply="r1")
+            self.assertEqual(json.loads(self.service.messaging_client.publish.call_args.args[1])["status"], "error")
+            self.service.messaging_client.publish.reset_mock()
+
+            # 100 Hz during 1 s
+            for i in range(100):
+                await self.service._process_data("can.speed", 10, i * 0.01)
+            # The state is updated at full rate
+            self.assertAlmostEqual(self.service.computation_state["distance"], 9.9)
+
+            subjects = [c.args[0] for c in self.service.messaging_client.publish.call_args_list]
+            self.assertEqual(subjects, ["compute.result.speed_avg"] * 10)
+            self.assertEqual(len(self.service.pending_results), 1)
+
+            self.service.messaging_client.publish.reset_mock()
+            await self.service._publish_pending_results()
+            await self.service._publish_pending_results()
+            self.service.messaging_client.publish.assert_called_once()
+            subject, payload = self.service.messaging_client.publish.call_args.args
+            self.assertEqual(subject, "compute.results")
+            # The latest result, of the 96th update (one out of 5)
+            frame = json.loads(payload)
+            self.assertEqual(list(frame["signals"]), ["distance"])
+            self.assertAlmostEqual(frame["ts"], 0.95)
+            self.assertAlmostEqual(frame["signals"]["distance"], 9.5)
+
+            definitions = {d["output_name"]: d for d in self.service._computation_definitions()}
+            self.assertEqual(definitions["distance"]["output"], {"decimation": 5, "batch": True})
+
+        asyncio.run(run_test())
+
+    def test_expression_computations(self):
+        async def run_test():
+            register = self.service._handle_register_computation
+            await register(source_signal="can.speed", computation_type="RunningAverage", output_name="speed_avg")
+            # Depends on the speed directly and through its average
+            await register(computation_type="Expression", output_name="speed_delta",
+                           params={"expression": "can.speed - speed_avg"}, reply="r1")
+            await register(computation_type="Expression", output_name="power", output={"decimation": 2},
+                           params={"expression": "speed_delta * can.torque"}, reply="r2")
+            await register(computation_type="Expression", output_name="bad", params={"expression": "speed +"}, reply="r3")
+            await register(source_signal="power", computation_type="Integrator", output_name="can.torque", reply="r4")
+            replies = [json.loads(call.args[1])["status"] for call in self.service.messaging_client.publish.call_args_list
+                       if call.args[0].startswith("r")]
+            self.assertEqual(replies, ["ok", "ok", "error", "error"])
+            self.service.messaging_client.publish.reset_mock()
+
+            await self.service._process_data("can.speed", 10, 0)
+            await self.service._process_data("can.speed", 20, 1)
+            self.assertEqual(self.service.computation_state["speed_delta"], 5.0)
+            # No torque yet: no power
+            self.assertNotIn("power", self.service.computation_state)
+            await self.service._process_data("can.torque", 2, 1)
+            self.assertEqual(self.service.computation_state["power"], 10.0)
+
+            # Each computation ran once per update, after its inputs
+            subjects = [c.args[0] for c in self.service.messaging_client.publish.call_args_list]
+            self.assertEqual(subjects, ["compute.result.speed_avg", "compute.result.speed_delta"] * 2
+                             + ["compute.result.power"])
+
+            self.assertEqual(self.service._computation_definitions()[1:], [
+                {"computation_type": "Expression", "output_name": "speed_delta",
+                 "params": {"expression": "can.speed - speed_avg"}},
+                {"computation_type": "Expression", "output_name": "power",
+                 "params": {"expression": "speed_delta * can.torque"}, "output": {"decimation": 2}},
+            ])
+
+            await self.service._handle_unregister_computation(output_name="power")
+            self.assertFalse(any(c["output_name"] == "power" for computations in
+                                 self.service.active_computations.values() for c in computations))
+
+        asyncio.run(run_test())
+
+    def test_expression_triggers(self):
+        async def run_test():
+            await self.service._handle_register_trigger(reply="r1", trigger={
+                "name": "overpressure",
+                "condition": "pressure > 200 for 2s",
+                "action": {"on_become_active": {"type": "publish", "subject": "pressure.alert"}},
+            })
+            await self.service._handle_register_trigger(reply="r2", trigger={
+                "name": "invalid", "condition": "pressure >", "action": {},
+            })
+            replies = [json.loads(call.args[1])["status"] for call in self.service.messaging_client.publish.call_args_list]
+            self.assertEqual(replies, ["ok", "error"])
+            self.assertEqual(self.service.triggers_by_signal["pressure"][0]["name"], "overpressure")
+            self.service.messaging_client.publish.reset_mock()
+
+            for timestamp in (0, 1, 2):
+                await self.service._process_data("pressure", 250, timestamp)
+            self.service.messaging_client.publish.assert_called_once_with("pressure.alert", unittest.mock.ANY)
+            self.assertTrue(self.service.triggers[0]["is_currently_active"])
+
+            await self.service._handle_unregister_trigger(name="overpressure")
+            self.assertEqual(self.service.trigger_expressions, {})
+
+        asyncio.run(run_test())
+
+    def test_cycles_and_duplicate_outputs_are_rejected(self):
+        async def run_test():
+            register = self.service._handle_register_computation
+            await register(source_signal="a", computation_type="RunningAverage", output_name="b", reply="r")
+            await register(source_signal="b", computation_type="Integrator", output_name="c", reply="r")
+            await register(source_signal="c", computation_type="Differentiator", output_name="a", reply="r")
+            await register(source_signal="x", computation_type="RunningAverage", output_name="x", reply="r")
+            await register(source_signal="x", computation_type="RunningAverage", output_name="c", reply="r")
+
+            replies = [json.loads(call.args[1])["status"] for call in self.service.messaging_client.publish.call_args_list
+                       if call.args[0] == "r"]
+            self.assertEqual(replies, ["ok", "ok", "error", "error", "error"])
+            self.assertEqual([inputs for inputs, _ in self.service._evaluation_plan("a")], [("a",), ("b",)])
+
+        asyncio.run(run_test())
+
+    def test_downstream_triggers_are_evaluated_once(self):
+        async def run_test():
+            await self.service._handle_register_computation(
+                source_signal="can.speed", computation_type="RunningAverage", output_name="speed_avg"
+            )
+            await self.service._handle_register_trigger(trigger={
+                "name": "both",
+                "conditions": [{"name": "can.speed", "operator": ">", "value": 50},
+                               {"name": "speed_avg", "operator": ">", "value": 50}],
+                "action": {"on_is_inactive": {"type": "publish", "subject": "both.inactive"}}
+            })
+            self.service.messaging_client.publish.reset_mock()
+
+            await self.service._process_data("can.speed", 10, 0)
+            subjects = [call.args[0] for call in self.service.messaging_client.publish.call_args_list]
+            self.assertEqual(subjects, ["compute.result.speed_avg", "both.inactive"])
+
+        asyncio.run(run_test())
+
     def test_trigger_state_logic(self):
         """Test stateful trigger logic (on_become_active, on_become_inactive)."""
         trigger_def = {
@@ -129,6 +444,70 @@ class TestComputeServiceIntegration(unittest.TestCase):
 
         asyncio.run(run_test())
 
+    def test_only_triggers_referencing_the_signal_are_evaluated(self):
+        async def run_test():
+            await self.service._handle_register_trigger(trigger={
+                "name": "speed_trigger",
+                "conditions": [{"name": "speed", "operator": ">", "value": 50}],
+                "action": {"on_is_inactive": {"type": "publish", "subject": "speed.inactive"}}
+            })
+            await self.service._handle_register_trigger(trigger={
+                "name": "always", "conditions": [],
+                "action": {"on_is_active": {"type": "publish", "subject": "always.active"}}
+            })
+            self.assertEqual(self.service.triggers_by_signal["speed"][0]["name"], "speed_trigger")
+            self.service.messaging_client.publish.reset_mock()
+
+            # The trigger on the speed is not evaluated, the one without conditions becomes active
+            await self.service._process_data("temperature", 20, 0)
+            self.service.messaging_client.publish.assert_not_called()
+            self.assertTrue(self.service.unconditional_triggers[0]["is_currently_active"])
+
+            await self.service._process_data("speed", 20, 1)
+            subjects = [call.args[0] for call in self.service.messaging_client.publish.call_args_list]
+            self.assertEqual(subjects, ["speed.inactive", "always.active"])
+
+            await self.service._handle_unregister_trigger(name="speed_trigger")
+            self.assertNotIn("speed", self.service.triggers_by_signal)
+
+        asyncio.run(run_test())
+
+    def test_state_deltas(self):
+        async def run_test():
+            await self.service._handle_register_computation(
+                source_signal="can.speed", computation_type="RunningAverage", output_name="speed_avg"
+            )
+            await self.service._process_data("can.speed", 10, 0)
+            await self.service._process_data("can.temp", 80, 0)
+            first = self.service._take_state_delta()
+            self.assertEqual(first["epoch"], self.service.state_epoch)
+            self.assertEqual(first["version"], 1)
+            self.assertEqual(first["changed"], {"can.speed": 10, "speed_avg": 10.0, "can.temp": 80})
+            self.assertEqual(first["computations"][0]["output_name"], "speed_avg")
+            self.assertNotIn("triggers", first)
+
+            # Nothing changed, nothing to publish
+            self.assertIsNone(self.service._take_state_delta())
+
+            await self.service._process_data("can.temp", 85, 1)
+            await self.service._handle_unregister_computation(output_name="speed_avg")
+            second = self.service._take_state_delta()
+            self.assertEqual(second["version"], 2)
+            self.assertEqual(second["changed"], {"can.temp": 85})
+            self.assertEqual(second["removed"], ["speed_avg"])
+
+            await self.service._handle_get_state_request(reply="snapshot")
+            snapshot = json.loads(self.service.messaging_client.publish.call_args.args[1])
+            self.assertEqual((snapshot["epoch"], snapshot["version"]), (self.service.state_epoch, 2))
+            self.assertEqual(snapshot["computation_state"], {"can.speed": 10, "can.temp": 85})
+
+            # After a restart, the versions start again in another epoch
+            restarted = ComputeService()
+            self.assertEqual(restarted.state_version, 0)
+            self.assertNotEqual(restarted.state_epoch, self.service.state_epoch)
+
+        asyncio.run(run_test())
+
     def test_unregister_functionality(self):
         """Test unregistering computations and triggers."""
         async def run_test():
@@ -162,6 +541,122 @@ class TestComputeServiceIntegration(unittest.TestCase):
 
         asyncio.run(run_test())
 
+    def test_configuration_saves_are_debounced(self):
+        async def run_test():
+            self.service.settings = {"config_save_delay": 0.05}
+            for i in range(3):
+                await self.service._handle_register_computation(
+                    source_signal="can.speed", computation_type="RunningAverage", output_name=f"speed_avg_{i}"
+                )
+            await self.service._handle_unregister_computation(output_name="speed_avg_0")
+            self.service.messaging_client.publish.assert_not_called()
+
+            await asyncio.sleep(0.1)
+            saves = [c for c in self.service.messaging_client.publish.call_args_list
+                     if c.args[0] == "commands.settings_service"]
+            # One save of the computations and one of the triggers, after the last change
+            self.assertEqual(len(saves), 2)
+            saved = json.loads(saves[0].args[1])["value"]
+            self.assertEqual([c["output_name"] for c in saved], ["speed_avg_1", "speed_avg_2"])
+
+            # Pending changes are saved at shutdown
+            self.service.messaging_client.publish.reset_mock()
+            self.service.settings["config_save_delay"] = 60
+            await self.service._handle_unregister_computation(output_name="speed_avg_1")
+            await self.service._stop_logic()
+            topics = [c.args[0] for c in self.service.messaging_client.publish.call_args_list]
+            self.assertEqual(topics.count("commands.settings_service"), 2)
+            self.assertIsNone(self.service.save_task)
+
+        asyncio.run(run_test())
+
+    def test_restore_does_not_save(self):
+        async def run_test():
+            self.service.settings = {
+                "config_save_delay": 0,
+                "computations": [
+                    {"source_signal": "can.pressure", "computation_type": "Integrator", "output_name": "pressure_total"}
+                ],
+                "triggers": [{"name": "pressure_trigger", "conditions": [], "action": {}}],
+            }
+            await self.service._restore_configuration()
+            await asyncio.sleep(0)
+
+            self.assertEqual(self.service.active_computations["can.pressure"][0]["output_name"], "pressure_total")
+            self.assertEqual(self.service.triggers[0]["name"], "pressure_trigger")
+            self.assertFalse(self.service.configuration_dirty)
+            self.assertIsNone(self.service.save_task)
+            self.service.messaging_client.publish.assert_not_called()
+
+        asyncio.run(run_test())
+
+    def test_snapshot_warm_restart(self):
+        async def run_test():
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                settings = {
+                    "snapshot_path": os.path.join(tmp_dir, "state", "compute_service.pickle"),
+                    "computations": [
+                        {"source_signal": "can.flow", "computation_type": "Integrator", "output_name": "volume"},
+                        {"source_signal": "can.flow", "computation_type": "MovingMax", "output_name": "flow_max",
+                         "params": {"window": 10}},
+                        {"computation_type": "Expression", "output_name": "high_flow",
+                         "params": {"expression": "can.flow > 5 for 2s"}},
+                    ],
+                    "triggers": [{"name": "flowing", "condition": "can.flow > 1", "action": {}}],
+                }
+                self.service.settings = settings
+                await self.service._restore_configuration()
+                for t in range(4):
+                    await self.service._process_data("can.flow", 10, t)
+                self.assertEqual(self.service.computation_state["volume"], 30.0)
+                await self.service._save_snapshot()
+
+                # A new process, where the window of the max became 5 s
+                settings["computations"][1]["params"] = {"window": 5}
+                restarted = ComputeService()
+                restarted.logger.disabled = True
+                restarted.messaging_client = AsyncMock()
+                restarted.settings = settings
+                await restarted._restore_configuration()
+                await restarted._restore_snapshot()
+
+                self.assertEqual(restarted.computation_state["volume"], 30.0)
+                # The inputs and the values of the computations that start again are not restored
+                self.assertEqual(set(restarted.computation_state), {"volume", "high_flow"})
+                self.assertTrue(restarted.triggers[0]["is_currently_active"])
+                # One hour later: the downtime is neither integrated nor counted in the duration
+                await restarted._process_data("can.flow", 0, 3600)
+                self.assertEqual(restarted.computation_state["volume"], 30.0)
+                self.assertFalse(restarted.computation_state["high_flow"])
+                # The max with another window starts again
+                self.assertEqual(restarted.computation_state["flow_max"], 0)
+                for t in (3601, 3602, 3603):
+                    await restarted._process_data("can.flow", 10, t)
+                # The integration continues from the total of the previous run
+                self.assertEqual(restarted.computation_state["volume"], 55.0)
+                self.assertTrue(restarted.computation_state["high_flow"])
+
+                # The snapshot is only accessible to the user of the service
+                self.assertEqual(os.stat(settings["snapshot_path"]).st_mode & 0o777, 0o600)
+
+                # A snapshot other users can write to is not loaded
+                os.chmod(settings["snapshot_path"], 0o666)
+                with self.assertRaises(PermissionError):
+                    ComputeService._read_snapshot(settings["snapshot_path"])
+
+                # An unreadable snapshot is ignored
+                os.chmod(settings["snapshot_path"], 0o600)
+                with open(settings["snapshot_path"], "wb") as f:
+                    f.write(b"truncated")
+                fresh = ComputeService()
+                fresh.logger.disabled = True
+                fresh.settings = settings
+                await fresh._restore_configuration()
+                await fresh._restore_snapshot()
+                self.assertEqual(fresh.computation_state, {})
+
+        asyncio.run(run_test())
+
     def test_startup_loading(self):
         """Test that the service loads persisted configurations at startup."""
         # Mock the settings that would be loaded from the settings_service
@@ -205,5 +700,115 @@ class TestComputeServiceIntegration(unittest.TestCase):
         asyncio.run(run_test())
 
 
+class TestReplayWithoutNumpy(unittest.TestCase):
+
+    def test_numpy_is_required(self):
+        with patch.object(replay, "np", None):
+            with self.assertRaises(ImportError):
+                replay.VectorizedReplay([], [])
+            with self.assertRaises(ImportError):
+                replay.load_signals("missing.blf", None)
+
+
+@unittest.skipIf(replay.np is None, "The vectorized replay requires numpy")
+class TestVectorizedReplay(unittest.TestCase):
+
+    def test_computations_match_the_live_ones(self):
+        np = replay.np
+        rng = np.random.default_rng(1)
+        # Irregular timestamps, repeated ones included
+        timestamps = np.sort(np.round(rng.uniform(0, 100, 2000), 1))
+        values = rng.normal(50, 10, 2000)
+        definitions = [
+            ("RunningAverage", {}), ("Integrator", {}), ("Differentiator", {}),
+            ("MovingAverage", {"window": 5}), ("MovingAverage", {"window": 1000, "max_samples": 10}),
+            ("MovingStdDev", {"window": 3}), ("MovingRMS", {"window": 3}), ("RateOfChange", {"window": 2}),
+            ("ExponentialMovingAverage", {"alpha": 0.2}), ("MovingMax", {"window": 4}),
+        ]
+        vectorized = replay.VectorizedReplay([
+            {"source_signal": "x", "computation_type": computation_type, "output_name": f"out{i}", "params": params}
+            for i, (computation_type, params) in enumerate(definitions)], []).run({"x": (timestamps, values)})
+        for i, (computation_type, params) in enumerate(definitions):
+            computation = globals()[computation_type](**params)
+            expected = [computation.update(v, t) for t, v in zip(timestamps.tolist(), values.tolist())]
+            np.testing.assert_allclose(vectorized.series[f"out{i}"][1], expected, rtol=1e-9, atol=1e-9,
+                                       err_msg=computation_type)
+
+    def test_expressions_and_triggers_match_the_live_ones(self):
+        np = replay.np
+        rng = np.random.default_rng(2)
+        updates = [("can.speed" if rng.random() < 0.7 else "can.torque", float(rng.uniform(0, 100)), t * 0.1)
+                   for t in range(500)]
+        computations = [
+            {"source_signal": "can.speed", "computation_type": "MovingAverage", "output_name": "speed_avg",
+             "params": {"window": 2}},
+            {"computation_type": "Expression", "output_name": "power",
+             "params": {"expression": "speed_avg * can.torque"}},
+        ]
+        triggers = [
+            {"name": "fast", "conditions": [{"name": "speed_avg", "operator": ">", "value": 55}], "action": {}},
+            {"name": "loaded", "condition": "power > 2500 for 300ms",
+             "conditions": [{"name": "can.torque", "operator": ">=", "value": 20}], "action": {}},
+            {"name": "hot", "conditions": [{"name": "can.temperature", "operator": ">", "value": 90}], "action": {}},
+        ]
+
+        async def run_live():
+            service = ComputeService()
+            service.logger.disabled = True
+            service.messaging_client = AsyncMock()
+            for definition in computations:
+                await service._handle_register_computation(**definition)
+            for trigger in triggers:
+                await service._handle_register_trigger(trigger=dict(trigger))
+            timelines = {trigger["name"]: [] for trigger in triggers}
+            for signal_name, value, timestamp in updates:
+                await service._process_data(signal_name, value, timestamp)
+                for trigger in service.triggers:
+                    timeline = timelines[trigger["name"]]
+                    if trigger["is_currently_active"] != (timeline[-1][1] if timeline else False):
+                        timeline.append((timestamp, trigger["is_currently_active"]))
+            return service.computation_state, timelines
+
+        state, timelines = asyncio.run(run_live())
+        signals = {}
+        for name in ("can.speed", "can.torque"):
+            signals[name] = (np.array([t for n, _, t in updates if n == name]),
+                             np.array([v for n, v, _ in updates if n == name]))
+        result = replay.VectorizedReplay(computations, triggers).run(signals)
+
+        self.assertAlmostEqual(result.series["power"][1][-1], state["power"])
+        self.assertGreater(len(timelines["fast"]), 2)
+        self.assertEqual(result.timelines, timelines)
+        self.assertEqual(result.timelines["hot"], [])
+
+    def test_load_signals_from_a_log(self):
+        import can
+        import cantools
+        db = cantools.database.load_file(os.path.join(os.path.dirname(__file__), '..', 'config', 'sample.dbc'))
+        message = db.get_message_by_name("MotorInfo")
+        # The BLF format stores dates
+        START = 1_700_000_000.0
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "motor.blf")
+            with can.BLFWriter(path) as writer:
+                for i in range(10):
+                    writer.on_message_received(can.Message(
+                        timestamp=START + i, arbitration_id=message.frame_id, is_extended_id=False,
+                        data=message.encode({"Temperature": 20 + i, "RPM": 500 * i})))
+                # Unknown frame and truncated frame, skipped
+                writer.on_message_received(can.Message(timestamp=START + 10, arbitration_id=0x7FF, data=b"\x01"))
+                writer.on_message_received(can.Message(timestamp=START + 11, arbitration_id=message.frame_id, data=b"\x01"))
+            signals = replay.load_signals(path, db)
+
+        self.assertEqual(sorted(signals), ["can.data.RPM", "can.data.Temperature"])
+        timestamps, values = signals["can.data.RPM"]
+        self.assertEqual(timestamps.tolist(), [START + i for i in range(10)])
+        self.assertEqual(values.tolist(), [500.0 * i for i in range(10)])
+        result = replay.VectorizedReplay(
+            [{"source_signal": "can.data.RPM", "computation_type": "Integrator", "output_name": "revolutions"}],
+            []).run(signals)
+        self.assertEqual(result.series["revolutions"][1][-1], 20250.0)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import asyncio
+import os
+import sys
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from nats.errors import NoRespondersError, TimeoutError as NatsTimeoutError
+
+from common.loopback import LoopbackBus, LoopbackMessagingClient, subject_matches
+
+
+class TestSubjectMatches(unittest.TestCase):
+
+    def test_wildcards(self):
+        self.assertTrue(subject_matches("can.data.EngineSpeed", "can.data.EngineSpeed"))
+        self.assertTrue(subject_matches("can.data.*", "can.data.EngineSpeed"))
+        self.assertFalse(subject_matches("can.data.*", "can.data"))
+        self.assertFalse(subject_matches("can.data.*", "can.data.A.B"))
+        self.assertTrue(subject_matches("can.>", "can.data.A.B"))
+        self.assertFalse(subject_matches("can.>", "can"))
+        self.assertTrue(subject_matches("*.data.>", "gps.data.Speed"))
+        self.assertFalse(subject_matches("gps.data", "gps.data.Speed"))
+
+
+class TestLoopbackMessagingClient(unittest.TestCase):
+
+    def test_publish_subscribe(self):
+        async def run_test():
+            bus = LoopbackBus()
+            publisher, subscriber = LoopbackMessagingClient(bus), LoopbackMessagingClient(bus)
+            received = []
+
+            async def on_message(msg):
+                received.append((msg.subject, msg.data, msg.headers))
+
+            await subscriber.subscribe("can.data.*", cb=on_message)
+            await subscriber.subscribe("can.>", cb=on_message)
+            await publisher.publish("can.data.A", b"1", headers={"Content-Type": "application/x-f64-value"})
+            await publisher.publish("can.frame.B", b"2")
+            await publisher.publish("gps.data.Speed", b"3")
+            await bus.wait_idle()
+
+            self.assertCountEqual(received, [
+                ("can.data.A", b"1", {"Content-Type": "application/x-f64-value"}),
+                ("can.data.A", b"1", {"Content-Type": "application/x-f64-value"}),
+                ("can.frame.B", b"2", None),
+            ])
+
+            await subscriber.disconnect()
+            await publisher.publish("can.data.A", b"4")
+            await bus.wait_idle()
+            self.assertEqual(len(received), 3)
+
+        asyncio.run(run_test())
+
+    def test_queue_group_delivers_to_one_member(self):
+        async def run_test():
+            bus = LoopbackBus()
+            client = LoopbackMessagingClient(bus)
+            received = {"a": [], "b": [], "all": []}
+
+            def collect(key):
+                async def on_message(msg):
+                    received[key].append(msg.data)
+                return on_message
+
+            await client.subscribe("jobs", cb=collect("a"), queue="workers")
+            await client.subscribe("jobs", cb=collect("b"), queue="workers")
+            await client.subscribe("jobs", cb=collect("all"))
+            for i in range(4):
+                await client.publish("jobs", str(i).encode())
+            await bus.wait_idle()
+
+            self.assertEqual(received["a"], [b"0", b"2"])
+            self.assertEqual(received["b"], [b"1", b"3"])
+            self.assertEqual(len(received["all"]), 4)
+
+        asyncio.run(run_test())
+
+    def test_request_reply(self):
+        async def run_test():
+            bus = LoopbackBus()
+            server, client = LoopbackMessagingClient(bus), LoopbackMessagingClient(bus)
+
+            async def on_request(msg):
+                await msg.respond(msg.data.upper())
+
+            await server.subscribe("settings.get.all", cb=on_request)
+            response = await client.request("settings.get.all", b"hello")
+            self.assertEqual(response.data, b"HELLO")
+
+            with self.assertRaises(NoRespondersError):
+                await client.request("nobody.listens", b"")
+
+            async def never_respond(msg):
+                pass
+
+            await server.subscribe("slow", cb=never_respond)
+            with self.assertRaises(NatsTimeoutError):
+                await client.request("slow", b"", timeout=0.05)
+            await bus.wait_idle()
+
+        asyncio.run(run_test())
+
+    def test_callback_errors_do_not_stop_the_subscription(self):
+        async def run_test():
+            bus = LoopbackBus()
+            client = LoopbackMessagingClient(bus)
+            received = []
+
+            async def on_message(msg):
+                if msg.data == b"bad":
+                    raise ValueError("bad message")
+                received.append(msg.data)
+
+            await client.subscribe("x", cb=on_message)
+            await client.publish("x", b"bad")
+            await client.publish("x", b"good")
+            await bus.wait_idle()
+
+            self.assertEqual(received, [b"good"])
+            self.assertEqual(len(bus.errors), 1)
+
+        asyncio.run(run_test())
+
+
+if __name__ == '__main__':
+    unittest.main()
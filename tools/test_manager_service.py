@@ -0,0 +1,196 @@
+import unittest
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import ANY, AsyncMock, patch
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.microservice import Microservice
+from services.manager.in_process import ServiceTask, load_service_class
+from services.manager.service import ManagerService
+from services.manager.zygote import Zygote, is_supported
+
+STARTUP_DELAY = 0.05
+
+
+class FakeProcess:
+    """Stand-in for a service process, announcing its readiness after a delay."""
+
+    def __init__(self, manager, service_name, events):
+        self.pid = 1000 + len(events)
+        events.append(("start", service_name))
+
+        async def announce_ready():
+            await asyncio.sleep(STARTUP_DELAY)
+            events.append(("ready", service_name))
+            await manager._handle_service_ready(SimpleNamespace(subject=f"service.ready.{service_name}"))
+
+        asyncio.get_running_loop().create_task(announce_ready())
+
+    def poll(self):
+        return None
+
+
+class TestDependencyAwareStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = ManagerService()
+        self.manager.logger.disabled = True
+        self.manager.messaging_client = AsyncMock()
+        self.events = []
+
+    def start_all(self):
+        def popen(args):
+            service_name = os.path.basename(os.path.dirname(args[1]))
+            return FakeProcess(self.manager, service_name, self.events)
+
+        with patch("services.manager.service.subprocess.Popen", side_effect=popen):
+            asyncio.run(self.manager.start_all_command())
+
+    def test_declared_dependencies(self):
+        services = self.manager.managed_services
+        self.assertEqual(services["settings_service"]["dependencies"], [])
+        self.assertEqual(services["gps_service"]["dependencies"], ["settings_service", "owa_service"])
+        self.assertEqual(services["can_bus_service"]["dependencies"], ["settings_service"])
+
+    def test_dependents_start_when_dependencies_are_ready(self):
+        self.start_all()
+        self.assertEqual(self.events[0], ("start", "settings_service"))
+        self.assertEqual(self.events[1], ("ready", "settings_service"))
+        self.assertLess(self.events.index(("ready", "owa_service")), self.events.index(("start", "gps_service")))
+        self.assertTrue(all(info["ready"] for info in self.manager.managed_services.values()))
+
+    def test_independent_services_start_in_parallel(self):
+        self.start_all()
+        # settings_service, then every other service at once, then gps_service
+        self.assertLess(self.manager.cold_boot_ms, 5 * STARTUP_DELAY * 1000)
+        self.assertEqual(self.manager.get_status_payload()["cold_boot_ms"], self.manager.cold_boot_ms)
+
+    def test_dependency_cycle_is_broken(self):
+        services = self.manager.managed_services
+        services["owa_service"]["dependencies"] = ["gps_service"]
+        self.manager._check_dependencies()
+        self.assertEqual(services["owa_service"]["dependencies"], [])
+        self.assertEqual(services["gps_service"]["dependencies"], [])
+
+
+class FakeService(Microservice):
+    crash = False
+
+    def __init__(self):
+        super().__init__("fake_service")
+        self.logger.disabled = True
+        self.messaging_client = AsyncMock()
+
+    async def _start_logic(self):
+        if self.crash:
+            raise RuntimeError("boom")
+
+    async def _stop_logic(self):
+        pass
+
+
+class CrashingService(FakeService):
+    crash = True
+
+
+class TestMonolithMode(unittest.TestCase):
+
+    def test_load_service_class(self):
+        self.assertEqual(load_service_class("dummy_service").__name__, "DummyService")
+
+    def test_service_task_lifecycle(self):
+        async def run_test():
+            task = ServiceTask(FakeService())
+            await asyncio.sleep(0.01)
+            self.assertIsNone(task.poll())
+            task.terminate()
+            self.assertEqual(await task.wait(timeout=1), 0)
+            return task
+
+        task = asyncio.run(run_test())
+        task.service.messaging_client.publish.assert_any_call("service.ready.fake_service", ANY)
+
+    def test_crash_is_isolated(self):
+        async def run_test():
+            healthy, crashing = ServiceTask(FakeService()), ServiceTask(CrashingService())
+            await asyncio.sleep(0.01)
+            self.assertIsNotNone(crashing.poll())
+            self.assertIsNone(healthy.poll())
+            healthy.terminate()
+            await healthy.wait(timeout=1)
+
+        asyncio.run(run_test())
+
+    def test_manager_starts_and_stops_tasks(self):
+        manager = ManagerService(mode="monolith")
+        manager.logger.disabled = True
+        manager.messaging_client = AsyncMock()
+
+        async def run_test():
+            with patch("services.manager.service.load_service_class", return_value=FakeService):
+                self.assertTrue(await manager.start_service("dummy_service"))
+            process = manager.managed_services["dummy_service"]["process"]
+            self.assertIsInstance(process, ServiceTask)
+            await asyncio.sleep(0.01)
+            await manager.stop_service("dummy_service")
+            return process
+
+        process = asyncio.run(run_test())
+        self.assertEqual(process.poll(), 0)
+        self.assertEqual(manager.managed_services["dummy_service"]["status"], "stopped")
+
+    def test_loopback_bus(self):
+        manager = ManagerService(mode="monolith", bus="loopback")
+        manager.logger.disabled = True
+
+        class DummyService(FakeService):
+            def __init__(self):
+                super().__init__()
+                self.service_name = "dummy_service"
+
+        async def run_test():
+            await manager.messaging_client.subscribe("service.ready.*", cb=manager._handle_service_ready)
+            with patch("services.manager.service.load_service_class", return_value=DummyService):
+                self.assertTrue(await manager.start_service("dummy_service"))
+            process = manager.managed_services["dummy_service"]["process"]
+            # The service announces its readiness on the bus shared with the manager
+            self.assertIs(process.service.messaging_client.bus, manager.loopback_bus)
+            self.assertTrue(await manager.wait_until_ready("dummy_service", timeout=1))
+            await manager.stop_service("dummy_service")
+
+        asyncio.run(run_test())
+
+        with self.assertRaises(ValueError):
+            ManagerService(mode="process", bus="loopback")
+
+
+@unittest.skipUnless(is_supported(), "The zygote requires os.fork")
+class TestZygote(unittest.TestCase):
+
+    def test_spawn_and_exit_codes(self):
+        logger = ManagerService().logger
+        logger.disabled = True
+        zygote = Zygote(["services.dummy_service.service"], logger)
+
+        async def run_test():
+            zygote.start()
+            try:
+                children = [await zygote.spawn("dummy_service") for _ in range(2)]
+                self.assertNotEqual(children[0].pid, children[1].pid)
+                self.assertIsNone(children[0].poll())
+                for child in children:
+                    child.kill()
+                return [await asyncio.to_thread(child.wait, 5) for child in children]
+            finally:
+                zygote.stop()
+
+        self.assertEqual(asyncio.run(run_test()), [-9, -9])
+        self.assertFalse(zygote.available)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common import messaging
+from common.messaging import CodecRegistry, CODEC_HEADER, PublishBatch, decode_payload, decode_value
+from common.metrics import LATENCY_BUCKETS_MS, MessageMetrics, subject_family
+
+
+def make_msg(subject, payload, headers=None):
+    return SimpleNamespace(subject=subject, data=payload, headers=headers)
+
+
+class TestCodecs(unittest.TestCase):
+
+    def setUp(self):
+        self.codecs = CodecRegistry({"can.data": "f64", "can.data.Text": "json"})
+
+    def test_codec_per_subject_family(self):
+        self.assertEqual(self.codecs.codec_for("can.data.EngineSpeed").name, "f64")
+        self.assertEqual(self.codecs.codec_for("can.data.Text").name, "json")
+        self.assertEqual(self.codecs.codec_for("gps.data.Speed").name, "json")
+
+    def test_f64_round_trip(self):
+        payload, headers = self.codecs.encode_value("can.data.EngineSpeed", 2500.5, 12.25)
+        self.assertEqual(len(payload), 16)
+        self.assertEqual(headers, {CODEC_HEADER: "application/x-f64-value"})
+        self.assertEqual(decode_value(make_msg("can.data.EngineSpeed", payload, headers)), (2500.5, 12.25))
+
+    def test_non_numeric_values_fall_back_to_json(self):
+        payload, headers = self.codecs.encode_value("can.data.EngineSpeed", "n/a", 1.0)
+        self.assertIsNone(headers)
+        self.assertEqual(decode_value(make_msg("can.data.EngineSpeed", payload)), ("n/a", 1.0))
+
+    @unittest.skipIf(messaging.msgpack is None, "The msgpack codec requires msgpack")
+    def test_msgpack_round_trip(self):
+        codecs = CodecRegistry({"can.frame": "msgpack"})
+        frame = {"ts": 1.5, "signals": {"A": 1.0, "B": -2.5}}
+        payload, headers = codecs.encode("can.frame.AIN1_4", frame)
+        self.assertEqual(decode_payload(make_msg("can.frame.AIN1_4", payload, headers)), frame)
+
+    def test_msgpack_is_optional(self):
+        with patch.object(messaging, "msgpack", None):
+            # The other codecs work, the msgpack one is refused when configured and received
+            self.assertEqual(CodecRegistry({"can.data": "f64"}).codec_for("can.data.A").name, "f64")
+            with self.assertRaises(ValueError):
+                CodecRegistry({"can.frame": "msgpack"})
+            with self.assertRaises(ValueError):
+                decode_payload(make_msg("can.frame.A", b"\x80", {CODEC_HEADER: "application/msgpack"}))
+
+    def test_json_without_header(self):
+        self.assertEqual(decode_value(make_msg("dummy.data", b'{"value": 3, "ts": 2.0}')), (3, 2.0))
+        self.assertEqual(decode_value(make_msg("dummy.data", b'42.5')), (42.5, None))
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            CodecRegistry({"can.data": "protobuf"})
+
+
+class TestPublishBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.client = AsyncMock()
+
+    def published(self):
+        return [message for call in self.client.publish_many.call_args_list for message in call.args[0]]
+
+    def test_flushed_on_exit(self):
+        async def run_test():
+            async with PublishBatch(self.client, CodecRegistry({"can.data": "f64"})) as batch:
+                await batch.publish("a.b", b"1")
+                await batch.publish_value("can.data.EngineSpeed", 1500.0, 2.0)
+                self.client.publish_many.assert_not_called()
+
+        asyncio.run(run_test())
+        self.client.publish_many.assert_called_once()
+        (first, second) = self.published()
+        self.assertEqual(first, ("a.b", b"1", None))
+        self.assertEqual(second[2], {CODEC_HEADER: "application/x-f64-value"})
+
+    def test_flushed_at_max_bytes(self):
+        async def run_test():
+            async with PublishBatch(self.client, max_bytes=10) as batch:
+                for i in range(5):
+                    await batch.publish(f"a.{i}", b"12345")
+
+        asyncio.run(run_test())
+        self.assertEqual([len(call.args[0]) for call in self.client.publish_many.call_args_list], [2, 2, 1])
+
+    def test_flushed_periodically(self):
+        async def run_test():
+            async with PublishBatch(self.client, flush_interval=0.01) as batch:
+                await batch.publish("a.b", b"1")
+                await asyncio.sleep(0.05)
+                self.assertEqual(len(self.published()), 1)
+
+        asyncio.run(run_test())
+        self.client.publish_many.assert_called_once()
+
+    def test_not_flushed_on_error(self):
+        async def run_test():
+            async with PublishBatch(self.client) as batch:
+                await batch.publish("a.b", b"1")
+                raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(run_test())
+        self.client.publish_many.assert_not_called()
+
+
+class TestMessageMetrics(unittest.TestCase):
+
+    def test_counts_per_subject_family(self):
+        metrics = MessageMetrics()
+        metrics.record_publish("can.data.EngineSpeed", 16)
+        metrics.record_publish("can.data.Throttle", 16)
+        metrics.record_publish("gps.data.Speed", 30)
+        subjects = metrics.snapshot()["subjects"]
+        self.assertEqual(set(subjects), {"can.data", "gps.data"})
+        self.assertEqual(subjects["can.data"]["published"], 2)
+        self.assertEqual(subjects["can.data"]["published_bytes"], 32)
+        self.assertEqual(subject_family("commands"), "commands")
+
+    def test_instrumented_handler(self):
+        metrics = MessageMetrics()
+
+        async def handler(msg):
+            if msg.data == b"bad":
+                raise ValueError("bad message")
+
+        async def run_test():
+            instrumented = metrics.instrument(handler)
+            await instrumented(make_msg("can.frame.A", b"1234"))
+            with self.assertRaises(ValueError):
+                await instrumented(make_msg("can.frame.A", b"bad"))
+
+        asyncio.run(run_test())
+        stats = metrics.snapshot()["subjects"]["can.frame"]
+        self.assertEqual(stats["received"], 2)
+        self.assertEqual(stats["received_bytes"], 7)
+        self.assertEqual(stats["errors"], 1)
+        self.assertEqual(sum(stats["handler_histogram"]), 2)
+        self.assertEqual(len(stats["handler_histogram"]), len(LATENCY_BUCKETS_MS) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import asyncio
+import json
+import logging
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common import logging_setup
+from common.logging_setup import setup_logging
+from common.loopback import LoopbackMessagingClient
+from common.microservice import Microservice
+
+
+class DummyService(Microservice):
+    async def _start_logic(self):
+        pass
+
+    async def _stop_logic(self):
+        pass
+
+
+class FailingService(DummyService):
+    async def _start_logic(self):
+        # E.g. the hardware failed to initialize
+        return False
+
+
+class TestReadiness(unittest.TestCase):
+
+    def run_service(self, service):
+        service.logger.disabled = True
+        service.messaging_client = AsyncMock()
+
+        async def run_test():
+            task = asyncio.create_task(service.run(install_signal_handlers=False))
+            await asyncio.sleep(0.05)
+            await service.stop()
+            await task
+
+        asyncio.run(run_test())
+        return [call.args[0] for call in service.messaging_client.publish.call_args_list]
+
+    def test_ready_after_start(self):
+        self.assertIn("service.ready.dummy_service", self.run_service(DummyService("dummy_service")))
+
+    def test_not_ready_when_start_fails(self):
+        self.assertNotIn("service.ready.dummy_service", self.run_service(FailingService("dummy_service")))
+
+
+class TestSettingsBootstrap(unittest.TestCase):
+
+    def setUp(self):
+        self.service = DummyService("dummy_service")
+        self.service.logger.disabled = True
+        self.service.messaging_client = AsyncMock()
+
+    def bootstrap(self, global_settings, responses=None):
+        settings = {"global": global_settings, "dummy_service": {"update_interval": 1}}
+        reply = SimpleNamespace(data=json.dumps(settings).encode())
+        self.service.messaging_client.request.side_effect = responses or [reply]
+        asyncio.run(self.service.get_settings(retry_interval=0.01))
+
+    def test_reuses_the_bootstrap_connection(self):
+        self.bootstrap({"nats_url": "nats://127.0.0.1:4222"})
+        self.assertEqual(self.service.settings, {"update_interval": 1})
+        self.service.messaging_client.disconnect.assert_not_called()
+        for call in self.service.messaging_client.connect.call_args_list:
+            self.assertEqual(call.args, ("nats://127.0.0.1:4222",))
+
+    def test_reconnects_with_settings_options(self):
+        self.bootstrap({"nats_url": "nats://10.0.0.1:4222", "nats_client": {"max_reconnect_attempts": -1, "unknown": 1}})
+        self.service.messaging_client.disconnect.assert_called_once()
+        self.service.messaging_client.connect.assert_called_with("nats://10.0.0.1:4222", max_reconnect_attempts=-1)
+
+    def test_retries_until_settings_service_answers(self):
+        reply = SimpleNamespace(data=json.dumps({"global": {}}).encode())
+        self.bootstrap({}, responses=[TimeoutError(), TimeoutError(), reply])
+        self.assertEqual(self.service.messaging_client.request.call_count, 3)
+
+
+class TestLogging(unittest.TestCase):
+
+    def test_records_are_written_by_the_listener_and_files_rotated(self):
+        name = "test_logging_setup"
+        log_path = os.path.join(logging_setup.log_directory(), f"{name}.log")
+        os.makedirs(logging_setup.log_directory(), exist_ok=True)
+        with open(log_path, "w") as f:
+            f.write("previous run\n")
+        self.addCleanup(lambda: [os.remove(path) for path in (log_path, log_path + ".1") if os.path.exists(path)])
+
+        logger = setup_logging(name)
+        logger.info("value=%d", 42)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+        logging_setup._listeners.pop(name).stop()
+
+        with open(log_path) as f:
+            content = f.read()
+        self.assertIn("INFO - value=42", content)
+        self.assertIn("ValueError: boom", content)
+        with open(log_path + ".1") as f:
+            self.assertEqual(f.read(), "previous run\n")
+
+    def test_set_log_level_command(self):
+        service = DummyService("dummy_service")
+        service.messaging_client = AsyncMock()
+        asyncio.run(service.command_handler.handle_message(json.dumps({"command": "set_log_level", "level": "debug"}).encode(), "reply"))
+        self.assertEqual(service.logger.level, logging.DEBUG)
+        service.messaging_client.publish.assert_called_once_with("reply", json.dumps({"status": "ok", "level": "DEBUG"}).encode())
+
+        asyncio.run(service._handle_set_log_level_command("LOUD", reply="reply"))
+        self.assertEqual(service.logger.level, logging.DEBUG)
+        service.logger.setLevel(logging.INFO)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_metrics_command_replies_with_the_client_metrics(self):
+        service = DummyService("dummy_service")
+        service.logger.disabled = True
+        service.messaging_client = LoopbackMessagingClient()
+
+        async def run_test():
+            await service.messaging_client.subscribe("dummy.data.>", cb=AsyncMock())
+            await service.messaging_client.publish("dummy.data.A", b"42")
+            await service.messaging_client.bus.wait_idle()
+            await service._subscribe_to_commands()
+            return await service.messaging_client.request("commands.dummy_service", json.dumps({"command": "metrics"}).encode())
+
+        metrics = json.loads(asyncio.run(run_test()).data)
+        self.assertEqual(metrics["service"], "dummy_service")
+        self.assertEqual(metrics["subjects"]["dummy.data"]["published"], 1)
+        self.assertEqual(metrics["subjects"]["dummy.data"]["received"], 1)
+        self.assertEqual(metrics["subjects"]["commands.dummy_service"]["published"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
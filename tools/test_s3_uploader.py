@@ -0,0 +1,132 @@
+import unittest
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.s3_uploader import S3Uploader
+
+
+class FakeS3Client:
+    """Stand-in for the boto3 S3 client, failing the first `failures` uploads."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.objects = {}
+        self.threads = set()
+
+    def upload_file(self, filename, bucket, key, Config=None):
+        self.threads.add(threading.current_thread().name)
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("S3 endpoint unreachable")
+        with open(filename, 'rb') as f:
+            self.objects[(bucket, key)] = f.read()
+
+
+class TestS3Uploader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.queue_path = os.path.join(self.tmp_dir.name, ".upload_queue.json")
+        self.global_settings = {"s3_bucket": "test-bucket", "s3_upload": {"retry_backoff_s": 0.01}}
+        self.logger = logging.getLogger("test_s3_uploader")
+        self.logger.disabled = True
+        self.files = []
+        for i in range(3):
+            path = os.path.join(self.tmp_dir.name, f"can_log_{i}.blf")
+            with open(path, 'wb') as f:
+                f.write(bytes([i]) * 100)
+            self.files.append(path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def _wait_until_empty(self, uploader, timeout=2.0):
+        for _ in range(int(timeout / 0.01)):
+            if not uploader.pending:
+                return
+            await asyncio.sleep(0.01)
+        self.fail("Uploads did not complete in time")
+
+    def test_uploads_in_thread_pool_with_retries(self):
+        client = FakeS3Client(failures=2)
+
+        async def run_test():
+            uploader = S3Uploader(self.global_settings, self.queue_path, self.logger, client_factory=lambda: client)
+            await uploader.start()
+            await uploader.enqueue(self.files)
+            await self._wait_until_empty(uploader)
+            await uploader.stop()
+            return uploader
+
+        uploader = asyncio.run(run_test())
+        self.assertEqual(set(client.objects), {("test-bucket", os.path.basename(f)) for f in self.files})
+        self.assertEqual(uploader.uploaded, 3)
+        self.assertTrue(all(name.startswith("s3_upload") for name in client.threads))
+
+    def test_client_is_created_once(self):
+        created = []
+
+        def slow_factory():
+            # Leaves time for the other workers to race on the creation
+            created.append(FakeS3Client())
+            time.sleep(0.05)
+            return created[-1]
+
+        async def run_test():
+            settings = {**self.global_settings, "s3_upload": {"max_workers": 3}}
+            uploader = S3Uploader(settings, self.queue_path, self.logger, client_factory=slow_factory)
+            await uploader.start()
+            await uploader.enqueue(self.files)
+            await self._wait_until_empty(uploader)
+            await uploader.stop()
+
+        asyncio.run(run_test())
+        self.assertEqual(len(created), 1)
+        self.assertEqual(len(created[0].objects), 3)
+
+    def test_queue_survives_restart(self):
+        async def run_test():
+            # The endpoint is unreachable while the first uploader runs
+            offline = S3Uploader(self.global_settings, self.queue_path, self.logger,
+                                 client_factory=lambda: FakeS3Client(failures=100))
+            await offline.start()
+            await offline.enqueue(self.files[:2])
+            await asyncio.sleep(0.05)
+            await offline.stop()
+            self.assertEqual(offline.pending, 2)
+
+            client = FakeS3Client()
+            uploader = S3Uploader(self.global_settings, self.queue_path, self.logger, client_factory=lambda: client)
+            await uploader.start()
+            await self._wait_until_empty(uploader)
+            await uploader.stop()
+            return client
+
+        client = asyncio.run(run_test())
+        self.assertEqual(len(client.objects), 2)
+
+    def test_gives_up_after_max_retries(self):
+        self.global_settings["s3_upload"]["max_retries"] = 2
+
+        async def run_test():
+            uploader = S3Uploader(self.global_settings, self.queue_path, self.logger,
+                                  client_factory=lambda: FakeS3Client(failures=100))
+            await uploader.start()
+            await uploader.enqueue(self.files[:1])
+            await self._wait_until_empty(uploader)
+            await uploader.stop()
+            return uploader
+
+        self.assertEqual(asyncio.run(run_test()).failed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()